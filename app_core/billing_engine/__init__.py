@@ -0,0 +1,88 @@
+"""Motor de faturamento sem dependência do Streamlit.
+
+Pode ser importado por páginas, workers em subprocesso, jobs de linha de comando e benchmarks.
+"""
+from .batch import (
+    ReportResult,
+    available_cpus,
+    bill_report,
+    bill_reports,
+    client_pdfs,
+    client_prices,
+    zip_client_pdfs,
+)
+from .calculation import (
+    TOTALS_COLUMNS,
+    build_totals,
+    calculate_billing,
+    compute_totals,
+    proportional_categories,
+    split_categories,
+    totals_dict,
+)
+from .frames import CATEGORICAL_COLUMNS, compact_billing_frame, concat_billing_frames, frame_digest, frame_memory_mb
+from .inventory import InventoryIndex, prepare_inventory
+from .parse_cache import ParseCache, cached_prepare_report, file_digest
+from .parsing import (
+    COLUMN_ALIASES,
+    MESES_PT,
+    REQUIRED_COLUMNS,
+    canonical_key,
+    extract_report_date,
+    find_header_row,
+    money_br,
+    normalize_columns,
+    normalize_equipment,
+    normalize_tipo,
+    prepare_report_dataframe,
+    read_raw_report,
+    safe_float,
+    sanitize_id,
+    strip_accents,
+)
+from .reports import clean_export_df, create_pdf_report, to_excel_named_sheets
+
+__all__ = [
+    "CATEGORICAL_COLUMNS",
+    "COLUMN_ALIASES",
+    "InventoryIndex",
+    "MESES_PT",
+    "ParseCache",
+    "REQUIRED_COLUMNS",
+    "TOTALS_COLUMNS",
+    "ReportResult",
+    "available_cpus",
+    "bill_report",
+    "bill_reports",
+    "build_totals",
+    "cached_prepare_report",
+    "calculate_billing",
+    "canonical_key",
+    "client_pdfs",
+    "client_prices",
+    "clean_export_df",
+    "compact_billing_frame",
+    "compute_totals",
+    "concat_billing_frames",
+    "create_pdf_report",
+    "extract_report_date",
+    "file_digest",
+    "find_header_row",
+    "frame_digest",
+    "frame_memory_mb",
+    "money_br",
+    "normalize_columns",
+    "normalize_equipment",
+    "normalize_tipo",
+    "prepare_inventory",
+    "prepare_report_dataframe",
+    "proportional_categories",
+    "read_raw_report",
+    "safe_float",
+    "sanitize_id",
+    "split_categories",
+    "strip_accents",
+    "to_excel_named_sheets",
+    "totals_dict",
+    "zip_client_pdfs",
+]
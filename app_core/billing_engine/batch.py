@@ -0,0 +1,212 @@
+"""Faturamento de vários relatórios, em paralelo em processos separados."""
+from __future__ import annotations
+
+import io
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .calculation import calculate_billing, compute_totals, split_categories, totals_dict
+from .inventory import InventoryIndex, inventory_index
+from .parse_cache import cached_prepare_report
+from .parsing import sanitize_id
+from .reports import create_pdf_report
+
+# Limite de memória estimada para os arquivos em processamento simultâneo.
+MEMORY_CAP_MB = int(os.environ.get("FINANCEIRO_BILLING_MEMORY_MB", "2048"))
+# Memória residente de um worker vazio (interpretador + pandas).
+WORKER_BASELINE_MB = 150
+# Quanto um arquivo cresce ao virar DataFrame (planilhas compactadas, colunas object).
+MEMORY_PER_INPUT_BYTE = 20
+# Abaixo disso subir os processos (spawn importa pandas e fpdf) custa mais que gerar os PDFs.
+PDF_POOL_MIN_CLIENTS = 16
+# PDFs encomendados por worker de uma vez: mantém os núcleos ocupados sem enfileirar o lote todo.
+PDF_TASKS_PER_WORKER = 4
+
+_worker_state: Dict[str, object] = {}
+
+
+@dataclass(slots=True)
+class ReportResult:
+    index: int
+    file_name: str
+    periodo: Optional[str] = None
+    frame: Optional[pd.DataFrame] = None
+    not_found: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def client_prices(contracts: Dict[str, Dict[str, float]], cliente: str) -> Dict[str, float]:
+    return contracts.get(cliente) or contracts.get(sanitize_id(cliente)) or {}
+
+
+def bill_report(
+    file_bytes: bytes,
+    file_name: str,
+    inventory: Union[InventoryIndex, pd.DataFrame],
+    contracts: Dict[str, Dict[str, float]],
+    digest: Optional[str] = None,
+) -> Tuple[Optional[str], pd.DataFrame, List[str]]:
+    """Lê um relatório (ou o reaproveita do cache em disco) e fatura todos os clientes com o preço de cada contrato."""
+    df, report_date = cached_prepare_report(file_bytes, file_name, digest)
+    if df.empty:
+        return None, pd.DataFrame(), []
+    prices_by_client = {
+        cliente: client_prices(contracts, cliente)
+        for cliente in (str(value).strip() for value in df["Cliente"].dropna().unique())
+    }
+    # A ordenação estável mantém a ordem cliente a cliente do faturamento por grupo.
+    df = df.sort_values("Cliente", kind="mergesort")
+    return calculate_billing(df, inventory, report_date, prices_by_client=prices_by_client)
+
+
+def _bill_one(index: int, file_name: str, file_bytes: bytes, digest, inventory, contracts) -> ReportResult:
+    try:
+        periodo, frame, not_found = bill_report(file_bytes, file_name, inventory, contracts, digest)
+    except Exception as exc:
+        return ReportResult(index, file_name, error=str(exc))
+    return ReportResult(index, file_name, periodo, frame, not_found)
+
+
+def _init_worker(inventory: InventoryIndex, contracts: Dict[str, Dict[str, float]]) -> None:
+    # Estoque e contratos são enviados uma vez por processo, não a cada arquivo.
+    _worker_state["inventory"] = inventory
+    _worker_state["contracts"] = contracts
+
+
+def _bill_in_worker(index: int, file_name: str, file_bytes: bytes, digest: Optional[str]) -> ReportResult:
+    return _bill_one(index, file_name, file_bytes, digest, _worker_state["inventory"], _worker_state["contracts"])
+
+
+def bill_reports(
+    files: Iterable[Tuple[str, bytes]],
+    inventory: Union[InventoryIndex, pd.DataFrame],
+    contracts: Dict[str, Dict[str, float]],
+    *,
+    max_workers: Optional[int] = None,
+    memory_cap_mb: int = MEMORY_CAP_MB,
+    digests: Optional[Sequence[str]] = None,
+) -> Iterator[ReportResult]:
+    """Fatura `(nome, bytes)` em paralelo e devolve cada resultado assim que termina.
+
+    `digests` traz o SHA-256 de cada arquivo, se já calculado, para consultar o cache de leitura.
+
+    Os workers são limitados pelos núcleos disponíveis e por `memory_cap_mb`; um arquivo só é
+    enviado quando a memória estimada dos que estão em processamento cabe no limite.
+    """
+    files = list(files)
+    inventory = inventory_index(inventory)
+    digests = list(digests) if digests is not None else [None] * len(files)
+    cap_bytes = memory_cap_mb * 1024 * 1024
+    workers = min(
+        max_workers or available_cpus(),
+        len(files),
+        max(1, memory_cap_mb // WORKER_BASELINE_MB),
+    )
+    if workers <= 1:
+        for index, (file_name, file_bytes) in enumerate(files):
+            yield _bill_one(index, file_name, file_bytes, digests[index], inventory, contracts)
+        return
+
+    pending = deque(enumerate(files))
+    running = {}
+    in_flight = 0
+    # spawn: o processo do Streamlit tem threads (Mongo, logs) que não devem ser copiadas por fork.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(inventory, contracts),
+    ) as pool:
+        while pending or running:
+            while pending and len(running) < workers:
+                index, (file_name, file_bytes) = pending[0]
+                estimate = len(file_bytes) * MEMORY_PER_INPUT_BYTE
+                if running and in_flight + estimate > cap_bytes:
+                    break
+                pending.popleft()
+                future = pool.submit(_bill_in_worker, index, file_name, file_bytes, digests[index])
+                running[future] = (index, file_name, estimate)
+                in_flight += estimate
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, file_name, estimate = running.pop(future)
+                in_flight -= estimate
+                try:
+                    yield future.result()
+                except Exception as exc:
+                    yield ReportResult(index, file_name, error=str(exc))
+
+
+def _client_pdf(cliente: str, periodo: str, totais: dict, df_cliente: pd.DataFrame) -> Tuple[str, bytes]:
+    df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados = split_categories(df_cliente)
+    pdf_bytes = create_pdf_report(cliente, periodo, totais, df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados)
+    return cliente, pdf_bytes
+
+
+def client_pdfs(
+    df_aprovado: pd.DataFrame,
+    periodo: str,
+    *,
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[str, bytes]]:
+    """Gera o PDF de cada cliente em processos separados e devolve `(cliente, pdf)` na ordem dos clientes.
+
+    Os totais saem de um único `compute_totals`; cada worker recebe só as linhas do seu cliente.
+    A saída segue a ordem de envio (alfabética, do groupby), independente de qual PDF termina antes.
+    """
+    totals = compute_totals(df_aprovado)
+    tasks = deque(
+        (cliente, periodo, totals_dict(totals.loc[cliente]), df_cliente)
+        for cliente, df_cliente in df_aprovado.groupby("Cliente", observed=True)
+    )
+    workers = min(max_workers or available_cpus(), len(tasks))
+    if workers <= 1 or len(tasks) < PDF_POOL_MIN_CLIENTS:
+        while tasks:
+            yield _client_pdf(*tasks.popleft())
+        return
+
+    running: deque = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        while tasks or running:
+            while tasks and len(running) < workers * PDF_TASKS_PER_WORKER:
+                running.append(pool.submit(_client_pdf, *tasks.popleft()))
+            # Espera o mais antigo: os demais seguem rodando e a ordem do ZIP não varia.
+            yield running.popleft().result()
+
+
+def zip_client_pdfs(
+    df_aprovado: pd.DataFrame,
+    periodo: str,
+    *,
+    max_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int, str], None]] = None,
+) -> bytes:
+    """ZIP com um PDF por cliente, gravado à medida que os PDFs chegam de `client_pdfs`.
+
+    `on_progress(feitos, total, cliente)` é chamado a cada PDF gravado.
+    """
+    total = int(df_aprovado["Cliente"].nunique())
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for done, (cliente, pdf_bytes) in enumerate(client_pdfs(df_aprovado, periodo, max_workers=max_workers), start=1):
+            safe_cliente = re.sub(r"[^A-Za-z0-9]+", "_", str(cliente)).strip("_") or "Cliente"
+            zip_file.writestr(f"Faturamento_{safe_cliente}.pdf", pdf_bytes)
+            if on_progress is not None:
+                on_progress(done, total, str(cliente))
+    return zip_buffer.getvalue()
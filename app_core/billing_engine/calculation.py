@@ -0,0 +1,191 @@
+"""Cálculo do faturamento: categorias, dias ativos e valores por terminal."""
+from __future__ import annotations
+
+import calendar
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app_core.normalizers import canonical_key_series, normalize_tipo, normalize_tipo_series, safe_float
+
+from .frames import compact_billing_frame
+from .inventory import InventoryIndex, inventory_index
+from .parsing import MESES_PT
+
+
+def _normalize_prices(prices_by_type: Optional[Dict[str, float]]) -> Dict[str, float]:
+    return {normalize_tipo(k): safe_float(v) for k, v in (prices_by_type or {}).items()}
+
+
+def _client_unit_prices(df_merged: pd.DataFrame, prices_by_client: Dict[str, Dict[str, float]]) -> pd.Series:
+    """Preço unitário de cada linha por junção única em (Cliente, Tipo)."""
+    entries = {
+        (cliente, tipo): price
+        for cliente, prices in prices_by_client.items()
+        for tipo, price in _normalize_prices(prices).items()
+    }
+    if not entries:
+        return pd.Series(0.0, index=df_merged.index)
+    price_table = pd.Series(entries, dtype=float)
+    keys = pd.MultiIndex.from_arrays([df_merged["Cliente"].astype(str), df_merged["Tipo"]])
+    return pd.Series(price_table.reindex(keys).to_numpy(), index=df_merged.index)
+
+
+def calculate_billing(
+    df: pd.DataFrame,
+    inventory: Union[InventoryIndex, pd.DataFrame],
+    report_date: pd.Timestamp,
+    prices_by_type: Optional[Dict[str, float]] = None,
+    *,
+    prices_by_client: Optional[Dict[str, Dict[str, float]]] = None,
+) -> Tuple[str, pd.DataFrame, List[str]]:
+    """Calcula categorias, dias e valores de todas as linhas em uma única passada.
+
+    `inventory` é o índice do estoque (ou o DataFrame de `prepare_inventory`, indexado na hora).
+    Com `prices_by_client`, o preço vem do contrato de cada cliente; caso contrário,
+    `prices_by_type` vale para todas as linhas.
+    """
+    report_month = int(report_date.month)
+    report_year = int(report_date.year)
+    dias_no_mes = calendar.monthrange(report_year, report_month)[1]
+    month_start = pd.Timestamp(year=report_year, month=report_month, day=1)
+    month_end = pd.Timestamp(year=report_year, month=report_month, day=dias_no_mes)
+    periodo_relatorio = f"{MESES_PT[report_month]} de {report_year}"
+
+    # Consulta ao índice em vez de merge: mesma ordem e colunas do merge à esquerda.
+    df_merged = df.reset_index(drop=True)
+    models, types = inventory_index(inventory).lookup(df_merged["Nº Equipamento"])
+    for col, values in (("Modelo", models), ("Tipo", types)):
+        df_merged[f"{col}_Estoque" if col in df.columns else col] = values
+    if "Modelo_Estoque" in df_merged.columns:
+        df_merged["Modelo"] = df_merged["Modelo"].where(df_merged["Modelo"].notna() & (df_merged["Modelo"].astype(str).str.strip() != ""), df_merged["Modelo_Estoque"])
+        df_merged = df_merged.drop(columns=["Modelo_Estoque"])
+
+    df_merged["Tipo"] = normalize_tipo_series(df_merged["Tipo"])
+    not_found = sorted([x for x in df_merged.loc[df_merged["Tipo"].eq(""), "Nº Equipamento"].dropna().unique().tolist() if str(x).strip()])
+
+    if prices_by_client is not None:
+        unit_prices = _client_unit_prices(df_merged, prices_by_client)
+    else:
+        unit_prices = df_merged["Tipo"].map(_normalize_prices(prices_by_type))
+    df_merged["Valor Unitario"] = unit_prices.fillna(0.0).astype(float)
+
+    ativacao = df_merged["Data Ativação"]
+    desativacao = df_merged["Data Desativação"]
+    condicao = canonical_key_series(df_merged["Condição"])
+
+    ativado_no_mes = ativacao.notna() & (ativacao.dt.month == report_month) & (ativacao.dt.year == report_year)
+    desativado_no_mes = desativacao.notna() & (desativacao.dt.month == report_month) & (desativacao.dt.year == report_year)
+    suspenso = condicao.str.contains("suspenso", na=False) | (df_merged["Suspenso Dias Mes"] > 0)
+
+    df_merged["Categoria"] = np.select(
+        [ativado_no_mes & desativado_no_mes, desativado_no_mes, ativado_no_mes, suspenso],
+        ["Ativado e Desativado no Mês", "Desativado", "Ativado no Mês", "Suspenso"],
+        default="Cheio",
+    )
+
+    active_start = ativacao.where(ativacao.notna() & (ativacao > month_start), month_start)
+    active_end = desativacao.where(desativacao.notna() & (desativacao < month_end), month_end)
+
+    # Casos fora do mês não devem faturar dias negativos.
+    active_days = (active_end - active_start).dt.days + 1
+    active_days = active_days.where(ativacao.isna() | (ativacao <= month_end), 0)
+    active_days = active_days.where(desativacao.isna() | (desativacao >= month_start), 0)
+    active_days = pd.to_numeric(active_days, errors="coerce").fillna(0).clip(lower=0, upper=dias_no_mes)
+
+    suspended_days = pd.to_numeric(df_merged["Suspenso Dias Mes"], errors="coerce").fillna(0).clip(lower=0, upper=dias_no_mes)
+    df_merged["Dias Ativos Calculado"] = active_days.astype(int)
+    df_merged["Dias a Faturar"] = (active_days - suspended_days).clip(lower=0, upper=dias_no_mes).round(0).astype(int)
+    df_merged["Valor a Faturar"] = ((df_merged["Valor Unitario"] / dias_no_mes) * df_merged["Dias a Faturar"]).round(2)
+
+    # Itens sem tipo/preço devem aparecer para conferência, mas com faturamento zerado para evitar cobrança indevida.
+    df_merged.loc[df_merged["Tipo"].eq(""), "Valor a Faturar"] = 0.0
+
+    return periodo_relatorio, compact_billing_frame(df_merged), not_found
+
+
+CATEGORIES = ["Cheio", "Ativado no Mês", "Desativado", "Suspenso", "Ativado e Desativado no Mês"]
+TOTALS_COLUMNS = [
+    "cheio",
+    "proporcional",
+    "geral",
+    "terminais",
+    "terminais_cheio",
+    "terminais_proporcional",
+    "terminais_suspensos",
+    "terminais_gprs",
+    "terminais_satelitais",
+    "valor_unitario",
+    "valor_unitario_gprs",
+    "valor_unitario_satelital",
+]
+_COUNT_COLUMNS = [col for col in TOTALS_COLUMNS if col.startswith("terminais")]
+
+
+def split_categories(df_aprovado: pd.DataFrame):
+    # Um único groupby em vez de um filtro por categoria; os chamadores só leem os frames.
+    groups = dict(iter(df_aprovado.groupby("Categoria", observed=True, sort=False)))
+    empty = df_aprovado.iloc[:0]
+    df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados = (
+        groups.get(categoria, empty) for categoria in CATEGORIES
+    )
+    return df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados
+
+
+def proportional_categories() -> List[str]:
+    return ["Ativado no Mês", "Desativado", "Ativado e Desativado no Mês", "Suspenso"]
+
+
+def compute_totals(df_aprovado: pd.DataFrame, by: Optional[Sequence[str]] = ("Cliente",)) -> pd.DataFrame:
+    """Totais de faturamento de todos os grupos de `by` num único `groupby().agg()`.
+
+    Uma linha por grupo (nulos em `by` ficam de fora), com as colunas de `TOTALS_COLUMNS`;
+    sem `by`, uma linha só com o frame inteiro. `valor_unitario*` é o maior preço do grupo.
+    """
+    categoria = df_aprovado["Categoria"]
+    tipo = df_aprovado["Tipo"]
+    valor = df_aprovado["Valor a Faturar"].astype(float)
+    unitario = df_aprovado["Valor Unitario"].astype(float)
+    cheio = categoria.eq("Cheio").to_numpy(dtype=bool)
+    proporcional = categoria.isin(proportional_categories()).to_numpy(dtype=bool)
+    gprs = tipo.eq("GPRS").to_numpy(dtype=bool)
+    satelite = tipo.eq("SATELITE").to_numpy(dtype=bool)
+    parts = pd.DataFrame(
+        {
+            "cheio": valor.where(cheio, 0.0),
+            "proporcional": valor.where(proporcional, 0.0),
+            "terminais": 1,
+            "terminais_cheio": cheio,
+            "terminais_proporcional": proporcional & ~categoria.eq("Suspenso").to_numpy(dtype=bool),
+            "terminais_suspensos": categoria.eq("Suspenso").to_numpy(dtype=bool),
+            "terminais_gprs": gprs,
+            "terminais_satelitais": satelite,
+            "valor_unitario": unitario,
+            "valor_unitario_gprs": unitario.where(gprs),
+            "valor_unitario_satelital": unitario.where(satelite),
+        },
+        index=df_aprovado.index,
+    )
+    aggregations = {col: "max" if col.startswith("valor_unitario") else "sum" for col in parts.columns}
+    if by:
+        totals = parts.groupby([df_aprovado[col] for col in by], observed=True).agg(aggregations)
+    else:
+        totals = parts.agg(aggregations).to_frame().T
+    totals[_COUNT_COLUMNS] = totals[_COUNT_COLUMNS].astype(int)
+    # Os valores por linha já têm duas casas; o arredondamento tira o ruído da soma em float.
+    totals[["cheio", "proporcional"]] = totals[["cheio", "proporcional"]].astype(float).round(2)
+    totals["geral"] = (totals["cheio"] + totals["proporcional"]).round(2)
+    # Grupos sem o tipo (ou frame vazio) têm preço 0, como antes.
+    price_columns = ["valor_unitario", "valor_unitario_gprs", "valor_unitario_satelital"]
+    totals[price_columns] = totals[price_columns].astype(float).fillna(0.0)
+    return totals[TOTALS_COLUMNS]
+
+
+def totals_dict(row: pd.Series) -> dict:
+    """Uma linha de `compute_totals` como dicionário de tipos nativos (PDF, MongoDB)."""
+    return {col: int(row[col]) if col in _COUNT_COLUMNS else float(row[col]) for col in TOTALS_COLUMNS}
+
+
+def build_totals(df_aprovado: pd.DataFrame) -> dict:
+    return totals_dict(compute_totals(df_aprovado, by=None).iloc[0])
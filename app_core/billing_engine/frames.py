@@ -0,0 +1,54 @@
+"""Tipos compactos dos frames de faturamento guardados na sessão."""
+from __future__ import annotations
+
+import hashlib
+from typing import List
+
+import pandas as pd
+
+# Poucos valores distintos repetidos em todas as linhas: category guarda só um código por linha.
+CATEGORICAL_COLUMNS = ["Cliente", "Tipo", "Modelo", "Categoria", "Condição"]
+# Dias do mês (0 a 31) cabem em int8.
+DAY_COLUMNS = ["Dias Ativos Mês", "Suspenso Dias Mes", "Dias Ativos Calculado", "Dias a Faturar"]
+
+
+def compact_billing_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte, no próprio frame, as colunas repetitivas em category e os dias inteiros em int8."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col in DAY_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col].dtype):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+
+def concat_billing_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """`pd.concat` que mantém as colunas category: com categorias diferentes o pandas volta para object.
+
+    As categorias unidas ficam ordenadas, como as de `astype("category")`, para que um
+    `groupby` percorra os clientes em ordem alfabética qualquer que seja a ordem dos arquivos.
+    Os frames recebidos não são alterados.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    frames = [frame.copy(deep=False) for frame in frames]
+    for col in CATEGORICAL_COLUMNS:
+        columns = [frame[col] for frame in frames if col in frame.columns]
+        if len(columns) != len(frames) or not all(isinstance(c.dtype, pd.CategoricalDtype) for c in columns):
+            continue
+        categories = columns[0].cat.categories.append([c.cat.categories for c in columns[1:]]).unique().sort_values()
+        for frame in frames:
+            frame[col] = frame[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    return float(df.memory_usage(deep=True).sum()) / (1024 * 1024)
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """SHA-256 das colunas e valores do frame (sem o índice), para chavear exportações em cache."""
+    digest = hashlib.sha256("\x1f".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
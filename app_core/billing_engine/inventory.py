@@ -0,0 +1,70 @@
+"""Índice do estoque de rastreadores: Nº Equipamento → Modelo/Tipo, montado uma vez por versão."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Hashable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app_core.normalizers import normalize_equipment_series, normalize_tipo_series
+
+from .parsing import normalize_columns
+
+
+def prepare_inventory(tracker_inventory: List[dict]) -> pd.DataFrame:
+    df_inventory = pd.DataFrame(tracker_inventory or [])
+    if df_inventory.empty:
+        raise ValueError("Nenhum dado de estoque de rastreadores encontrado.")
+    df_inventory = normalize_columns(df_inventory)
+    if "Nº Equipamento" not in df_inventory.columns:
+        raise ValueError("O estoque de rastreadores não possui a coluna 'Nº Equipamento'.")
+    if "Tipo" not in df_inventory.columns:
+        raise ValueError("O estoque de rastreadores não possui a coluna 'Tipo'.")
+    if "Modelo" not in df_inventory.columns:
+        df_inventory["Modelo"] = ""
+    df_inventory["Nº Equipamento"] = normalize_equipment_series(df_inventory["Nº Equipamento"])
+    df_inventory["Tipo"] = normalize_tipo_series(df_inventory["Tipo"])
+    df_inventory = df_inventory.drop_duplicates(subset=["Nº Equipamento"], keep="last")
+    return df_inventory
+
+
+@dataclass(frozen=True, slots=True)
+class InventoryIndex:
+    """Estoque pronto para consulta; `version` identifica o estoque em chaves de cache.
+
+    Modelos e tipos ficam como categóricos alinhados a `equipment`, que já vem normalizado
+    e sem duplicatas; consultar um relatório é um `get_indexer` sobre os números dele.
+    """
+
+    version: Hashable
+    equipment: pd.Index
+    models: pd.Categorical
+    types: pd.Categorical
+
+    @classmethod
+    def from_frame(cls, df_inventory: pd.DataFrame, version: Hashable = None) -> "InventoryIndex":
+        return cls(
+            version,
+            pd.Index(df_inventory["Nº Equipamento"].to_numpy(dtype=object)),
+            pd.Categorical(df_inventory["Modelo"].to_numpy(dtype=object)),
+            pd.Categorical(df_inventory["Tipo"].to_numpy(dtype=object)),
+        )
+
+    @classmethod
+    def from_records(cls, tracker_inventory: List[dict], version: Hashable = None) -> "InventoryIndex":
+        return cls.from_frame(prepare_inventory(tracker_inventory), version)
+
+    def __len__(self) -> int:
+        return len(self.equipment)
+
+    def lookup(self, equipment: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Modelo e Tipo de cada número (NaN quando não está no estoque), na ordem recebida."""
+        positions = self.equipment.get_indexer(equipment)
+        models = self.models.take(positions, allow_fill=True)
+        types = self.types.take(positions, allow_fill=True)
+        return np.asarray(models, dtype=object), np.asarray(types, dtype=object)
+
+
+def inventory_index(inventory: Union[InventoryIndex, pd.DataFrame]) -> InventoryIndex:
+    return inventory if isinstance(inventory, InventoryIndex) else InventoryIndex.from_frame(inventory)
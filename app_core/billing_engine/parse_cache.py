@@ -0,0 +1,141 @@
+"""Cache em disco dos relatórios já lidos, endereçado pelo SHA-256 do arquivo.
+
+O DataFrame normalizado fica em Parquet num diretório local compartilhado por todas as
+sessões e processos do host; reenviar o mesmo arquivo pula a leitura da planilha.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .parsing import prepare_report_dataframe
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende do ambiente
+    pa = pq = None
+
+log = logging.getLogger("financeiro_verdio.parse_cache")
+
+PARSE_CACHE_DIR = Path(
+    os.environ.get("FINANCEIRO_PARSE_CACHE_DIR") or Path(tempfile.gettempdir()) / "financeiro_verdio" / "parse_cache"
+)
+PARSE_CACHE_MAX_MB = int(os.environ.get("FINANCEIRO_PARSE_CACHE_MB", "512"))
+# Mude ao alterar a leitura/normalização para ignorar os arquivos gravados antes.
+PARSE_CACHE_VERSION = 2
+
+_REPORT_DATE_KEY = b"financeiro_verdio.report_date"
+
+
+def file_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _uniform_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Colunas de texto com números no meio (placa, frota, observações) viram texto: o Parquet
+    # exige um tipo por coluna e o relatório deve ser igual com ou sem cache.
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+class ParseCache:
+    """Arquivos `<sha256>.parquet` com a data do relatório nos metadados e limite de tamanho."""
+
+    def __init__(self, directory: Path = PARSE_CACHE_DIR, max_mb: int = PARSE_CACHE_MAX_MB) -> None:
+        self.directory = Path(directory) / f"v{PARSE_CACHE_VERSION}"
+        self.max_bytes = max(0, int(max_mb)) * 1024 * 1024
+
+    @property
+    def enabled(self) -> bool:
+        return pq is not None and self.max_bytes > 0
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / f"{digest}.parquet"
+
+    def get(self, digest: str) -> Optional[Tuple[pd.DataFrame, pd.Timestamp]]:
+        if not self.enabled:
+            return None
+        path = self._path(digest)
+        try:
+            table = pq.read_table(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            log.warning("Cache de leitura corrompido em %s; relendo o relatório.", path, exc_info=True)
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            # mtime marca o último uso para a remoção por tamanho.
+            os.utime(path)
+        except OSError:
+            pass
+        report_date = pd.Timestamp(table.schema.metadata[_REPORT_DATE_KEY].decode())
+        df = table.to_pandas()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].where(df[col].notna(), np.nan)
+        return df, report_date
+
+    def put(self, digest: str, df: pd.DataFrame, report_date: pd.Timestamp) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[_REPORT_DATE_KEY] = pd.Timestamp(report_date).isoformat().encode()
+            # Grava num temporário e renomeia: outra sessão nunca lê um arquivo pela metade.
+            temp_path = self.directory / f".{digest}.{uuid.uuid4().hex}.tmp"
+            pq.write_table(table.replace_schema_metadata(metadata), temp_path)
+            os.replace(temp_path, self._path(digest))
+        except Exception:
+            log.warning("Não foi possível gravar o cache de leitura de %s.", digest, exc_info=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove os arquivos usados há mais tempo até o total caber em `max_bytes`."""
+        entries = []
+        for path in self.directory.glob("*.parquet"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+parse_cache = ParseCache()
+
+
+def cached_prepare_report(
+    file_bytes: bytes,
+    file_name: str = "",
+    digest: Optional[str] = None,
+) -> Tuple[pd.DataFrame, pd.Timestamp]:
+    """`prepare_report_dataframe` com cache em disco; passe `digest` se já calculado no upload."""
+    digest = digest or file_digest(file_bytes)
+    cached = parse_cache.get(digest)
+    if cached is not None:
+        return cached
+    df, report_date = prepare_report_dataframe(file_bytes, file_name)
+    df = _uniform_columns(df)
+    parse_cache.put(digest, df, report_date)
+    return df, report_date
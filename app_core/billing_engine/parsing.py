@@ -0,0 +1,195 @@
+"""Leitura e normalização do relatório de terminais."""
+from __future__ import annotations
+
+import io
+import re
+from datetime import datetime
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from app_core.normalizers import (
+    canonical_key,
+    normalize_equipment,
+    normalize_equipment_series,
+    normalize_tipo,
+    safe_float,
+    strip_accents,
+)
+from app_core.spreadsheets import excel_engine, is_spreadsheet, read_csv, read_sheet
+
+MESES_PT = {
+    1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
+    7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro",
+}
+
+REQUIRED_COLUMNS = [
+    "Cliente", "Terminal", "Data Ativação", "Data Desativação", "Dias Ativos Mês",
+    "Suspenso Dias Mes", "Nº Equipamento", "Condição"
+]
+
+DATE_COLUMNS = ["Data Ativação", "Data Desativação"]
+NUMERIC_COLUMNS = ["Dias Ativos Mês", "Suspenso Dias Mes"]
+
+COLUMN_ALIASES = {
+    "equipamento": "Nº Equipamento",
+    "n equipamento": "Nº Equipamento",
+    "nº equipamento": "Nº Equipamento",
+    "numero equipamento": "Nº Equipamento",
+    "número equipamento": "Nº Equipamento",
+    "suspenso dias mes": "Suspenso Dias Mes",
+    "suspenso dias mês": "Suspenso Dias Mes",
+    "dias ativos mes": "Dias Ativos Mês",
+    "dias ativos mês": "Dias Ativos Mês",
+    "data ativacao": "Data Ativação",
+    "data ativação": "Data Ativação",
+    "data desativacao": "Data Desativação",
+    "data desativação": "Data Desativação",
+    "condicao": "Condição",
+    "condição": "Condição",
+    "cliente": "Cliente",
+    "terminal": "Terminal",
+    "placa": "Placa",
+    "modelo": "Modelo",
+}
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    rename = {}
+    seen = set()
+    for col in df.columns:
+        raw = "" if pd.isna(col) else str(col).strip()
+        key = canonical_key(raw)
+        canonical = COLUMN_ALIASES.get(key, raw)
+        if canonical.lower().startswith("unnamed") or canonical == "nan" or canonical == "":
+            canonical = f"Coluna_{len(seen) + 1}"
+        base = canonical
+        counter = 2
+        while canonical in seen:
+            canonical = f"{base}_{counter}"
+            counter += 1
+        rename[col] = canonical
+        seen.add(canonical)
+    return df.rename(columns=rename)
+
+
+def money_br(value) -> str:
+    try:
+        value = float(value)
+    except Exception:
+        value = 0.0
+    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def sanitize_id(name: str) -> str:
+    return str(name).strip().replace("/", "-")
+
+
+def read_raw_report(file_bytes: bytes, file_name: str = "") -> pd.DataFrame:
+    lower_name = (file_name or "").lower()
+    if lower_name.endswith(".csv"):
+        return read_csv(file_bytes)
+    return pd.read_excel(io.BytesIO(file_bytes), header=None, engine=excel_engine(lower_name))
+
+
+def find_header_row(df_raw: pd.DataFrame) -> Optional[int]:
+    max_scan = min(60, len(df_raw))
+    for idx in range(max_scan):
+        values = [canonical_key(v) for v in df_raw.iloc[idx].tolist()]
+        has_cliente = "cliente" in values
+        has_terminal = "terminal" in values
+        has_equip = any(v in {"equipamento", "n equipamento", "numero equipamento", "número equipamento"} for v in values)
+        if has_cliente and has_terminal and has_equip:
+            return idx
+    for idx in range(max_scan):
+        row_text = " ".join(str(v) for v in df_raw.iloc[idx].tolist())
+        key = canonical_key(row_text)
+        if "cliente" in key and "terminal" in key:
+            return idx
+    return None
+
+
+def extract_report_date(df_raw: pd.DataFrame) -> pd.Timestamp:
+    max_scan = min(40, len(df_raw))
+    date_regex = r"(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})"
+
+    for idx in range(max_scan):
+        row_text = " ".join(str(v) for v in df_raw.iloc[idx].tolist() if not pd.isna(v))
+        match = re.search(r"Data\s*Final\s*[:\-]?\s*" + date_regex, row_text, flags=re.IGNORECASE)
+        if match:
+            return pd.to_datetime(match.group(1).replace("-", "/"), dayfirst=True, errors="coerce")
+
+    for idx in range(max_scan):
+        row_text = " ".join(str(v) for v in df_raw.iloc[idx].tolist() if not pd.isna(v))
+        dates = re.findall(date_regex, row_text)
+        if dates:
+            # Quando a célula contém data inicial e final, o período correto para faturamento é a última data.
+            parsed = pd.to_datetime(dates[-1].replace("-", "/"), dayfirst=True, errors="coerce")
+            if pd.notna(parsed):
+                return parsed
+    return pd.NaT
+
+
+def _report_rows(df: pd.DataFrame) -> pd.Series:
+    """Linhas de terminal: descarta linhas vazias e cabeçalhos repetidos."""
+    return (
+        df["Terminal"].notna()
+        & (df["Terminal"].astype(str).str.strip() != "")
+        & (df["Cliente"].astype(str).str.strip().str.lower() != "cliente")
+    )
+
+
+def _typed_report_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    # Filtra e converte cada bloco lido em streaming, para não copiar o relatório inteiro depois.
+    chunk = normalize_columns(chunk)
+    for col in NUMERIC_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+    for col in DATE_COLUMNS:
+        # Só células de data reais: textos seguem para a conversão da coluna inteira (dayfirst).
+        if col in chunk.columns and pd.api.types.infer_dtype(chunk[col], skipna=True) in {"datetime", "datetime64", "date"}:
+            chunk[col] = pd.to_datetime(chunk[col], errors="coerce")
+    if "Terminal" in chunk.columns and "Cliente" in chunk.columns:
+        chunk = chunk[_report_rows(chunk)]
+    return chunk
+
+
+def prepare_report_dataframe(file_bytes: bytes, file_name: str = "") -> Tuple[pd.DataFrame, pd.Timestamp]:
+    if is_spreadsheet(file_name):
+        sheet = read_sheet(file_bytes, file_name, find_header_row, prepare_chunk=_typed_report_chunk)
+        df_raw, header_row_idx, df = sheet.preamble, sheet.header_row, sheet.frame
+    else:
+        df_raw = read_raw_report(file_bytes, file_name)
+        header_row_idx = find_header_row(df_raw)
+        df = None
+    report_date = extract_report_date(df_raw)
+    if header_row_idx is None:
+        raise ValueError("Não foi possível encontrar o cabeçalho do relatório. O arquivo precisa conter as colunas Cliente, Terminal e Equipamento/Nº Equipamento.")
+
+    if df is None:
+        df = df_raw.iloc[header_row_idx + 1:].copy()
+        df.columns = [str(c).strip() for c in df_raw.iloc[header_row_idx].tolist()]
+        df = normalize_columns(df)
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError("Colunas obrigatórias ausentes no relatório: " + ", ".join(missing))
+
+    # Leituras em streaming já chegam filtradas por bloco; só copia se ainda houver linhas a remover.
+    valid = _report_rows(df)
+    if not valid.all():
+        df = df[valid]
+    df["Cliente"] = df["Cliente"].astype(str).str.strip()
+    df["Terminal"] = df["Terminal"].astype(str).str.strip()
+    df["Nº Equipamento"] = normalize_equipment_series(df["Nº Equipamento"])
+
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col], errors="coerce", dayfirst=True)
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+    if pd.isna(report_date):
+        dates = pd.concat([df["Data Ativação"].dropna(), df["Data Desativação"].dropna()])
+        report_date = dates.max() if not dates.empty else pd.Timestamp(datetime.now())
+
+    return df, report_date
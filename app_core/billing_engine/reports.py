@@ -0,0 +1,182 @@
+"""Exportação do faturamento em Excel e PDF."""
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from typing import Dict
+
+import pandas as pd
+from fpdf import FPDF
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from .parsing import money_br
+
+# Resolvido pela raiz do projeto para funcionar também fora do diretório do app (workers, CLI).
+IMGS_DIR = Path(__file__).resolve().parents[2] / "imgs"
+
+
+def _format_excel_sheet(ws):
+    header_fill = PatternFill("solid", fgColor="1F4E78")
+    header_font = Font(color="FFFFFF", bold=True)
+    thin = Side(style="thin", color="D9E2F3")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = ws.dimensions
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        cell.border = border
+    for row in ws.iter_rows(min_row=2):
+        for cell in row:
+            cell.border = border
+            cell.alignment = Alignment(vertical="center", wrap_text=False)
+            if cell.column_letter:
+                header = ws.cell(row=1, column=cell.column).value
+                if header and "Valor" in str(header):
+                    cell.number_format = 'R$ #,##0.00'
+                if header and "Data" in str(header):
+                    cell.number_format = 'DD/MM/YYYY'
+    for col_idx, column_cells in enumerate(ws.columns, start=1):
+        max_len = 0
+        for cell in column_cells:
+            value = "" if cell.value is None else str(cell.value)
+            max_len = max(max_len, min(len(value), 60))
+        ws.column_dimensions[get_column_letter(col_idx)].width = max(12, min(max_len + 2, 45))
+
+
+def clean_export_df(df: pd.DataFrame) -> pd.DataFrame:
+    dropped = {"Faturar", "Coluna_1", "Coluna_2", "Coluna_3"}
+    preferred = [
+        "Cliente", "Terminal", "Nº Equipamento", "Placa", "Modelo", "Tipo", "Condição", "Categoria",
+        "Data Ativação", "Data Desativação", "Dias Ativos Mês", "Dias Ativos Calculado",
+        "Suspenso Dias Mes", "Dias a Faturar", "Valor Unitario", "Valor a Faturar",
+    ]
+    cols = [c for c in preferred if c in df.columns] + [c for c in df.columns if c not in preferred and c not in dropped]
+    # Uma única seleção (uma cópia) em vez de copiar e depois remover coluna a coluna.
+    return df[cols]
+
+
+def to_excel_named_sheets(sheets: Dict[str, pd.DataFrame]) -> bytes:
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            safe_name = name[:31]
+            clean_export_df(df).to_excel(writer, index=False, sheet_name=safe_name)
+        for ws in writer.book.worksheets:
+            _format_excel_sheet(ws)
+    return output.getvalue()
+
+
+def _pdf_bytes(pdf: FPDF) -> bytes:
+    data = pdf.output(dest="S")
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    return str(data).encode("latin-1", errors="replace")
+
+
+class PDF(FPDF):
+    def header(self):
+        try:
+            page_width = self.w - self.l_margin - self.r_margin
+            self.image(str(IMGS_DIR / "header1.png"), x=self.l_margin, y=8, w=page_width)
+        except Exception:
+            self.set_font("Arial", "B", 20)
+            self.cell(0, 10, "Uzzipay Soluções", 0, 1, "L")
+            self.ln(15)
+
+    def footer(self):
+        try:
+            self.set_y(-35)
+            page_width = self.w - self.l_margin - self.r_margin
+            self.image(str(IMGS_DIR / "footer1.png"), x=self.l_margin, y=self.get_y(), w=page_width)
+        except Exception:
+            self.set_y(-15)
+            self.set_font("Arial", "I", 8)
+            self.cell(0, 10, f"Página {self.page_no()}", 0, 0, "C")
+
+
+def create_pdf_report(nome_cliente, periodo, totais, df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados=None):
+    df_ativados_desativados = df_ativados_desativados if df_ativados_desativados is not None else pd.DataFrame()
+    pdf = PDF(orientation="L")
+    pdf.set_margins(10, 40, 10)
+    pdf.set_top_margin(40)
+    pdf.set_auto_page_break(auto=True, margin=35)
+    pdf.add_page()
+
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Resumo do Faturamento", 0, 1, "C")
+    pdf.ln(4)
+    pdf.set_font("Arial", "", 11)
+    pdf.cell(0, 7, f"Cliente: {nome_cliente}", 0, 1, "L")
+    pdf.cell(0, 7, f"Período: {periodo}", 0, 1, "L")
+    pdf.ln(4)
+
+    table_width = pdf.w - pdf.l_margin - pdf.r_margin
+    col_width = table_width / 5
+    pdf.set_font("Arial", "B", 9)
+    for title in ["Nº Fat. Cheio", "Nº Fat. Proporcional", "Nº Suspensos", "Total GPRS", "Total Satelitais"]:
+        pdf.cell(col_width, 8, title, 1, 0, "C")
+    pdf.ln()
+    pdf.set_font("Arial", "", 9)
+    for value in [totais.get("terminais_cheio", 0), totais.get("terminais_proporcional", 0), totais.get("terminais_suspensos", 0), totais.get("terminais_gprs", 0), totais.get("terminais_satelitais", 0)]:
+        pdf.cell(col_width, 8, str(value), 1, 0, "C")
+    pdf.ln(10)
+
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(table_width / 2, 8, "Faturamento Cheio", 1, 0, "C")
+    pdf.cell(table_width / 2, 8, "Faturamento Proporcional", 1, 1, "C")
+    pdf.set_font("Arial", "", 11)
+    pdf.cell(table_width / 2, 8, money_br(totais.get("cheio", 0)), 1, 0, "C")
+    pdf.cell(table_width / 2, 8, money_br(totais.get("proporcional", 0)), 1, 1, "C")
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, f"FATURAMENTO TOTAL: {money_br(totais.get('geral', 0))}", 1, 1, "C")
+    pdf.ln(6)
+
+    def draw_table(title, df, col_widths, available_cols):
+        if df is None or df.empty:
+            return
+        if pdf.get_y() > pdf.h - 65:
+            pdf.add_page()
+        pdf.set_font("Arial", "B", 11)
+        pdf.cell(0, 8, title, 0, 1, "L")
+        cols = [c for c in available_cols if c in df.columns]
+        pdf.set_font("Arial", "B", 7)
+        for col in cols:
+            pdf.cell(col_widths.get(col, 20), 7, col, 1, 0, "C")
+        pdf.ln()
+        pdf.set_font("Arial", "", 6)
+        for _, row in df.iterrows():
+            if pdf.get_y() > pdf.h - 42:
+                pdf.add_page()
+                pdf.set_font("Arial", "B", 7)
+                for col in cols:
+                    pdf.cell(col_widths.get(col, 20), 7, col, 1, 0, "C")
+                pdf.ln()
+                pdf.set_font("Arial", "", 6)
+            for col in cols:
+                value = row.get(col, "")
+                if pd.isna(value):
+                    text = ""
+                elif "Data" in col:
+                    text = pd.to_datetime(value).strftime("%d/%m/%Y") if pd.notna(pd.to_datetime(value, errors="coerce")) else ""
+                elif "Valor" in col:
+                    text = money_br(value)
+                else:
+                    text = str(value)[:38]
+                pdf.cell(col_widths.get(col, 20), 6, text, 1, 0, "C")
+            pdf.ln()
+        pdf.ln(4)
+
+    widths_cheio = {"Terminal": 35, "Nº Equipamento": 34, "Placa": 25, "Modelo": 45, "Tipo": 22, "Dias a Faturar": 24, "Valor Unitario": 28, "Valor a Faturar": 30}
+    cols_cheio = list(widths_cheio.keys())
+    widths_prop = {"Terminal": 24, "Nº Equipamento": 26, "Modelo": 32, "Tipo": 18, "Data Ativação": 24, "Data Desativação": 24, "Dias Ativos Calculado": 25, "Suspenso Dias Mes": 24, "Dias a Faturar": 22, "Valor Unitario": 26, "Valor a Faturar": 28}
+    cols_prop = list(widths_prop.keys())
+    draw_table("Detalhamento do Faturamento Cheio", df_cheio, widths_cheio, cols_cheio)
+    draw_table("Detalhamento Proporcional - Ativações no Mês", df_ativados, widths_prop, cols_prop)
+    draw_table("Detalhamento Proporcional - Desativações no Mês", df_desativados, widths_prop, cols_prop)
+    draw_table("Detalhamento Proporcional - Ativados e Desativados no Mês", df_ativados_desativados, widths_prop, cols_prop)
+    draw_table("Detalhamento dos Terminais Suspensos", df_suspensos, widths_prop, cols_prop)
+
+    return _pdf_bytes(pdf)
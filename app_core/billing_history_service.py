@@ -6,12 +6,11 @@ import math
 import re
 import unicodedata
 from datetime import date, datetime, timezone
-from typing import Any, Iterable
+from typing import Any
 
 
 from mongo_config import db
 
-DB_BATCH_LIMIT = 420
 MONTHS_PT = {
     "janeiro": 1,
     "fevereiro": 2,
@@ -216,10 +215,6 @@ def prepare_history_details(details: list[dict[str, Any]] | None, max_bytes: int
         return safe_details, False
     return [], bool(safe_details)
 
-def _chunks(items: list[Any], size: int = DB_BATCH_LIMIT) -> Iterable[list[Any]]:
-    for start in range(0, len(items), size):
-        yield items[start:start + size]
-
 
 def _snapshot_doc_id(period_key: str, cliente: str, terminal: str, equipamento: str) -> str:
     raw = f"{period_key}|{cliente}|{terminal}|{equipamento}".encode("utf-8")
@@ -339,20 +334,16 @@ def persist_billing_analytics(
         }
         run_ref.set(run_payload)
 
-        for chunk_index, chunk in enumerate(_chunks(normalized_items)):
-            batch = db.batch()
-            offset = chunk_index * DB_BATCH_LIMIT
-            for local_index, item in enumerate(chunk):
-                item_index = offset + local_index
-                item_doc = dict(item)
-                item_doc["item_index"] = item_index
-                ref = run_ref.collection("items").document(f"{item_index:06d}")
-                batch.set(ref, item_doc)
-            batch.commit()
+        batch = db.batch()
+        for item_index, item in enumerate(normalized_items):
+            item_doc = dict(item)
+            item_doc["item_index"] = item_index
+            batch.set(run_ref.collection("items").document(f"{item_index:06d}"), item_doc)
+        batch.commit()
 
     # Snapshot oficial por terminal/mês: reprocessamentos substituem somente a visão vigente,
     # enquanto billing_runs preserva todas as versões.
-    snapshot_records: list[tuple[str, dict[str, Any]]] = []
+    batch = db.batch()
     for item in normalized_items:
         doc_id = _snapshot_doc_id(
             period_key,
@@ -360,13 +351,8 @@ def persist_billing_analytics(
             _safe_text(item.get("terminal")),
             _safe_text(item.get("equipamento")),
         )
-        snapshot_records.append((doc_id, item))
-
-    for chunk in _chunks(snapshot_records):
-        batch = db.batch()
-        for doc_id, item in chunk:
-            batch.set(db.collection("billing_terminal_snapshots").document(doc_id), item, merge=True)
-        batch.commit()
+        batch.set(db.collection("billing_terminal_snapshots").document(doc_id), item, merge=True)
+    batch.commit()
 
     metrics = build_monthly_metrics(
         payload,
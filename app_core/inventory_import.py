@@ -1,12 +1,19 @@
 from __future__ import annotations
 
 import io
-import re
-import unicodedata
 from typing import Any
 
 import pandas as pd
 
+from app_core.normalizers import (
+    canonical_key,
+    canonical_key_series,
+    clean_text_series,
+    normalize_equipment_series,
+    strip_accents,
+)
+from app_core.spreadsheets import excel_engine, is_spreadsheet, read_csv, read_sheet
+
 SUPPORTED_TYPES = ["GPRS", "SATELITE", "CAMERA", "RADIO"]
 
 COLUMN_ALIASES = {
@@ -34,84 +41,19 @@ COLUMN_ALIASES = {
 }
 
 
-def strip_accents(value: Any) -> str:
-    return "".join(
-        char
-        for char in unicodedata.normalize("NFKD", str(value or ""))
-        if not unicodedata.combining(char)
-    )
-
-
-def canonical_key(value: Any) -> str:
-    if value is None:
-        return ""
-    try:
-        if pd.isna(value):
-            return ""
-    except Exception:
-        pass
-
-    text = str(value).strip().replace("\n", " ").replace("\r", " ")
-    text = re.sub(r"\s+", " ", text)
-    text = text.replace("º", "o").replace("ª", "a")
-    return strip_accents(text).lower()
-
-
-def normalize_equipment(value: Any) -> str:
-    if value is None:
-        return ""
-    try:
-        if pd.isna(value):
-            return ""
-    except Exception:
-        pass
-
-    if isinstance(value, bool):
-        return str(value)
-
-    if isinstance(value, int):
-        return str(value)
-
-    if isinstance(value, float) and value.is_integer():
-        return str(int(value))
-
-    text = str(value).strip()
-    text = re.sub(r"\.0$", "", text)
-    return "" if text.lower() in {"nan", "none", "nat"} else text
-
-
 def _read_raw(file_bytes: bytes, file_name: str) -> pd.DataFrame:
     lower_name = str(file_name or "").lower()
 
     if lower_name.endswith(".csv"):
-        last_error = None
-        for encoding in ("utf-8-sig", "utf-8", "latin1"):
-            try:
-                return pd.read_csv(
-                    io.BytesIO(file_bytes),
-                    header=None,
-                    sep=None,
-                    engine="python",
-                    encoding=encoding,
-                    dtype=object,
-                    on_bad_lines="skip",
-                )
-            except Exception as exc:
-                last_error = exc
-        raise ValueError(f"Não foi possível ler o CSV: {last_error}")
-
-    if lower_name.endswith(".xls"):
-        return pd.read_excel(
-            io.BytesIO(file_bytes),
-            header=None,
-            engine="xlrd",
-            dtype=object,
-        )
+        try:
+            return read_csv(file_bytes, dtype=object)
+        except Exception as exc:
+            raise ValueError(f"Não foi possível ler o CSV: {exc}") from exc
 
     return pd.read_excel(
         io.BytesIO(file_bytes),
         header=None,
-        engine="openpyxl",
+        engine=excel_engine(lower_name),
         dtype=object,
     )
 
@@ -166,8 +108,19 @@ def parse_inventory_report(
     file_bytes: bytes,
     file_name: str,
 ) -> tuple[pd.DataFrame, dict[str, Any]]:
-    raw = _read_raw(file_bytes, file_name)
-    header_row = find_header_row(raw)
+    if is_spreadsheet(file_name):
+        sheet = read_sheet(
+            file_bytes,
+            file_name,
+            find_header_row,
+            prepare_chunk=normalize_columns,
+            dtype=object,
+        )
+        header_row, frame = sheet.header_row, sheet.frame
+    else:
+        raw = _read_raw(file_bytes, file_name)
+        header_row = find_header_row(raw)
+        frame = None
 
     if header_row is None:
         raise ValueError(
@@ -175,12 +128,13 @@ def parse_inventory_report(
             "O arquivo deve conter pelo menos as colunas Modelo e Equipamento."
         )
 
-    frame = raw.iloc[header_row + 1 :].copy()
-    frame.columns = [
-        "" if pd.isna(value) else str(value).strip()
-        for value in raw.iloc[header_row].tolist()
-    ]
-    frame = normalize_columns(frame)
+    if frame is None:
+        frame = raw.iloc[header_row + 1 :].copy()
+        frame.columns = [
+            "" if pd.isna(value) else str(value).strip()
+            for value in raw.iloc[header_row].tolist()
+        ]
+        frame = normalize_columns(frame)
 
     required = ["Nº Equipamento", "Modelo"]
     missing = [column for column in required if column not in frame.columns]
@@ -189,8 +143,8 @@ def parse_inventory_report(
             "Colunas obrigatórias ausentes: " + ", ".join(missing)
         )
 
-    frame["Nº Equipamento"] = frame["Nº Equipamento"].apply(normalize_equipment)
-    frame["Modelo"] = frame["Modelo"].fillna("").astype(str).str.strip()
+    frame["Nº Equipamento"] = normalize_equipment_series(frame["Nº Equipamento"])
+    frame["Modelo"] = clean_text_series(frame["Modelo"])
 
     frame = frame[
         (frame["Nº Equipamento"] != "")
@@ -221,11 +175,7 @@ def parse_inventory_report(
     for column in frame.columns:
         if column == "Nº Equipamento":
             continue
-        frame[column] = frame[column].apply(
-            lambda value: ""
-            if pd.isna(value)
-            else str(value).strip()
-        )
+        frame[column] = clean_text_series(frame[column])
 
     before_dedup = len(frame)
     frame = frame.drop_duplicates(
@@ -244,17 +194,25 @@ def parse_inventory_report(
     return frame, metadata
 
 
+SYSTEM_TYPE_ALIASES = {
+    "GPRS": "GPRS",
+    "GSM": "GPRS",
+    "CELULAR": "GPRS",
+    "SATELITE": "SATELITE",
+    "SATELITAL": "SATELITE",
+    "SATELLITE": "SATELITE",
+    "CAMERA": "CAMERA",
+    "CAMERAS": "CAMERA",
+    "RADIO": "RADIO",
+}
+
+
 def normalize_system_type(value: Any) -> str:
-    text = canonical_key(value).upper()
-    if text in {"GPRS", "GSM", "CELULAR"}:
-        return "GPRS"
-    if text in {"SATELITE", "SATELITAL", "SATELLITE"}:
-        return "SATELITE"
-    if text in {"CAMERA", "CAMERAS"}:
-        return "CAMERA"
-    if text in {"RADIO"}:
-        return "RADIO"
-    return ""
+    return SYSTEM_TYPE_ALIASES.get(canonical_key(value).upper(), "")
+
+
+def normalize_system_type_series(values: pd.Series) -> pd.Series:
+    return canonical_key_series(values).str.upper().map(SYSTEM_TYPE_ALIASES).fillna("")
 
 
 def infer_type_from_model(model: Any) -> str:
@@ -299,33 +257,22 @@ def build_model_type_mapping(
         for model, type_value in (existing_model_types or {}).items()
     }
 
+    # Contagem, tipo e rótulo de origem de cada modelo em uma passada pela planilha.
+    counts = frame["Modelo"].value_counts()
+    source_types = pd.Series(dtype=object)
+    if "Tipo" in frame.columns:
+        normalized = normalize_system_type_series(frame["Tipo"])
+        source_types = normalized.where(normalized != "").groupby(frame["Modelo"]).first().fillna("")
+    source_labels = pd.Series(dtype=object)
+    if "Tipo Equipamento Origem" in frame.columns:
+        labels = clean_text_series(frame["Tipo Equipamento Origem"])
+        source_labels = labels.where(labels != "").groupby(frame["Modelo"]).first().fillna("")
+
     rows: list[dict[str, Any]] = []
 
     for model in sorted(frame["Modelo"].dropna().astype(str).str.strip().unique()):
-        model_rows = frame[frame["Modelo"] == model]
-
-        source_type = ""
-        if "Tipo" in model_rows.columns:
-            source_values = [
-                normalize_system_type(value)
-                for value in model_rows["Tipo"].tolist()
-            ]
-            source_type = next(
-                (value for value in source_values if value),
-                "",
-            )
-
-        source_label = ""
-        if "Tipo Equipamento Origem" in model_rows.columns:
-            source_label = next(
-                (
-                    str(value).strip()
-                    for value in model_rows["Tipo Equipamento Origem"].tolist()
-                    if str(value or "").strip()
-                ),
-                "",
-            )
-
+        source_type = source_types.get(model, "")
+        source_label = source_labels.get(model, "")
         current_type = existing.get(model, "")
         inferred_type = infer_type_from_model(model)
 
@@ -343,7 +290,7 @@ def build_model_type_mapping(
         rows.append(
             {
                 "Modelo": model,
-                "Qtd Equipamentos": int(len(model_rows)),
+                "Qtd Equipamentos": int(counts.get(model, 0)),
                 "Tipo origem": source_label,
                 "Tipo": suggested,
                 "Origem da sugestão": origin,
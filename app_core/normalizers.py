@@ -0,0 +1,182 @@
+"""Normalizadores de texto compartilhados pela leitura de relatórios, estoque e faturamento.
+
+Cada regra tem a versão escalar e a versão para colunas inteiras (`*_series`), que usa os
+métodos `.str` do pandas em vez de `apply` linha a linha e devolve o mesmo resultado.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+
+def _accent_table() -> dict[int, str | None]:
+    # Latin-1 e Latin Extended-A/B pela decomposição NFKD; marcas combinantes soltas somem.
+    table: dict[int, str | None] = {code: None for code in range(0x0300, 0x0370)}
+    for code in range(0x00A0, 0x0250):
+        char = chr(code)
+        stripped = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        if stripped != char:
+            table[code] = stripped
+    return table
+
+
+ACCENT_TABLE = str.maketrans(_accent_table())
+SATELLITE_ALIASES = {"SATELITAL": "SATELITE", "SATELLITE": "SATELITE"}
+_MISSING_TEXT = {"nan", "none", "nat"}
+# Todas as combinações de maiúsculas, para comparar sem `.str.lower()` na coluna inteira.
+_MISSING_TEXT_CASES = {
+    "".join(char.upper() if mask >> index & 1 else char for index, char in enumerate(word))
+    for word in _MISSING_TEXT
+    for mask in range(2 ** len(word))
+}
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _is_missing(value: Any) -> bool:
+    if value is None:
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def _on_uniques(text: pd.Series, transform: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    # Colunas de relatório repetem muito (tipo, condição, cliente): a regra roda uma vez por
+    # valor distinto e o resultado é espalhado pelos códigos do factorize.
+    codes, uniques = pd.factorize(text)
+    result = transform(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    return pd.Series(result[codes], index=text.index, dtype=object)
+
+
+def _nfkd_strip(value: str) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFKD", value) if not unicodedata.combining(ch))
+
+
+def strip_accents(value: Any) -> str:
+    text = "" if value is None else str(value)
+    text = text.translate(ACCENT_TABLE)
+    # Fora da tabela (grego, vietnamita, ligaduras) vale a decomposição completa.
+    return text if text.isascii() else _nfkd_strip(text)
+
+
+def _strip_accents_text(text: pd.Series) -> pd.Series:
+    text = text.str.translate(ACCENT_TABLE)
+    rest = ~text.map(str.isascii).astype(bool)
+    if rest.any():
+        text[rest] = text[rest].map(_nfkd_strip)
+    return text
+
+
+def strip_accents_series(values: pd.Series) -> pd.Series:
+    return _on_uniques(values.astype(str), _strip_accents_text)
+
+
+def canonical_key(value: Any) -> str:
+    text = "" if _is_missing(value) else str(value)
+    text = _WHITESPACE.sub(" ", text.strip().replace("\n", " ").replace("\r", " "))
+    text = text.replace("º", "o").replace("ª", "a")
+    return strip_accents(text).lower()
+
+
+def _canonical_text(text: pd.Series) -> pd.Series:
+    text = text.str.strip().str.replace(r"\s+", " ", regex=True)
+    text = text.str.replace("º", "o", regex=False).str.replace("ª", "a", regex=False)
+    return _strip_accents_text(text).str.lower()
+
+
+def canonical_key_series(values: pd.Series) -> pd.Series:
+    return _on_uniques(values.astype(str), _canonical_text).where(values.notna(), "")
+
+
+def clean_text_series(values: pd.Series) -> pd.Series:
+    """Texto sem espaços nas pontas; vazio para nulos."""
+    return _on_uniques(values.astype(str), lambda text: text.str.strip()).where(values.notna(), "")
+
+
+def normalize_equipment(value: Any) -> str:
+    if _is_missing(value):
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return str(int(value))
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    text = re.sub(r"\.0$", "", str(value).strip())
+    return "" if text.lower() in _MISSING_TEXT else text
+
+
+def normalize_equipment_series(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype(str).astype(object)
+    # Números de equipamento quase não se repetem: uma passada só, sem o factorize.
+    text = pd.Series(
+        [item.strip().removesuffix(".0") for item in values.astype(str).to_numpy()],
+        index=values.index,
+        dtype=object,
+    )
+    # Só textos e inteiros saem certos do `astype(str)`; floats (notação científica acima de
+    # 1e16), booleanos e tipos do numpy seguem a regra escalar.
+    if values.dtype == object:
+        special = ~values.map(type).isin((str, int)) & values.notna()
+    elif pd.api.types.is_float_dtype(values.dtype):
+        special = text.str.contains("e", regex=False)
+    else:
+        special = pd.Series(pd.api.types.is_bool_dtype(values.dtype), index=values.index)
+    if special.any():
+        text[special] = values[special].map(normalize_equipment)
+    return text.where(values.notna() & ~text.isin(_MISSING_TEXT_CASES), "")
+
+
+def normalize_tipo(value: Any) -> str:
+    if _is_missing(value):
+        return ""
+    text = _WHITESPACE.sub(" ", strip_accents(str(value).strip().upper()))
+    return SATELLITE_ALIASES.get(text, text)
+
+
+def _tipo_text(text: pd.Series) -> pd.Series:
+    text = _strip_accents_text(text.str.strip().str.upper())
+    return text.str.replace(r"\s+", " ", regex=True).replace(SATELLITE_ALIASES)
+
+
+def normalize_tipo_series(values: pd.Series) -> pd.Series:
+    return _on_uniques(values.astype(str), _tipo_text).where(values.notna(), "")
+
+
+def safe_float(value: Any, default: float = 0.0) -> float:
+    if _is_missing(value):
+        return float(default)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    text = str(value).strip()
+    if not text:
+        return float(default)
+    text = text.replace("R$", "").replace(" ", "")
+    if "," in text and "." in text:
+        text = text.replace(".", "").replace(",", ".")
+    elif "," in text:
+        text = text.replace(",", ".")
+    try:
+        return float(text)
+    except Exception:
+        return float(default)
+
+
+def safe_float_series(values: pd.Series, default: float = 0.0) -> pd.Series:
+    """Valores em reais ("R$ 1.234,56", "59,9", 59.9) como float; o resto vira `default`."""
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        return values.astype(float).fillna(default)
+    text = values.astype(str).str.replace("R$", "", regex=False).str.replace(" ", "", regex=False).str.strip()
+    both = text.str.contains(",", regex=False) & text.str.contains(".", regex=False)
+    text = text.where(~both, text.str.replace(".", "", regex=False)).str.replace(",", ".", regex=False)
+    numbers = pd.to_numeric(text, errors="coerce").astype(float)
+    others = ~values.map(type).eq(str) & values.notna()
+    if others.any():
+        numbers[others] = values[others].map(lambda value: safe_float(value, np.nan))
+    return numbers.where(values.notna()).fillna(default)
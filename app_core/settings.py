@@ -6,11 +6,10 @@ import logging
 from datetime import datetime, timezone
 from typing import Any
 
-import streamlit as st
 from PIL import Image
 
 from app_core.branding import DEFAULT_BRANDING, normalize_branding
-from mongo_config import db
+from mongo_config import cached_read, db
 
 log = logging.getLogger("financeiro_verdio.settings")
 BRANDING_DOCUMENT_PATH = ("settings", "branding")
@@ -19,12 +18,17 @@ MAX_LOGO_WIDTH = 900
 MAX_LOGO_HEIGHT = 360
 
 
-@st.cache_data(ttl=120, show_spinner=False)
+@cached_read(BRANDING_DOCUMENT_PATH[0])
+def _branding_document() -> dict[str, Any] | None:
+    document = db.collection(BRANDING_DOCUMENT_PATH[0]).document(BRANDING_DOCUMENT_PATH[1]).get()
+    return document.to_dict() if document.exists else None
+
+
 def get_branding() -> dict[str, Any]:
     try:
-        document = db.collection(BRANDING_DOCUMENT_PATH[0]).document(BRANDING_DOCUMENT_PATH[1]).get()
-        if document.exists:
-            return normalize_branding(document.to_dict())
+        data = _branding_document()
+        if data is not None:
+            return normalize_branding(data)
     except Exception:
         log.exception("Falha ao carregar identidade visual do MongoDB.")
     return normalize_branding(DEFAULT_BRANDING)
@@ -36,7 +40,6 @@ def save_branding(settings: dict[str, Any]) -> bool:
     payload["updated_at"] = datetime.now(timezone.utc)
     try:
         db.collection(BRANDING_DOCUMENT_PATH[0]).document(BRANDING_DOCUMENT_PATH[1]).set(payload, merge=True)
-        get_branding.clear()
         return True
     except Exception:
         log.exception("Falha ao salvar identidade visual.")
@@ -0,0 +1,230 @@
+"""Leitura de planilhas em streaming (calamine, openpyxl ou xlrd) e de CSV com o engine C."""
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import chain, islice
+from typing import Callable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import xlrd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+
+try:
+    # Leitor em Rust, bem mais rápido que openpyxl/xlrd; opcional.
+    from python_calamine import CalamineWorkbook
+except ImportError:  # pragma: no cover - depende do ambiente
+    CalamineWorkbook = None
+
+log = logging.getLogger("financeiro_verdio.spreadsheets")
+
+# Linhas iniciais guardadas para localizar cabeçalho e data do relatório.
+PREAMBLE_ROWS = 80
+# Linhas de dados convertidas para DataFrame por vez.
+CHUNK_ROWS = 10_000
+# Textos distintos reaproveitados durante a leitura; valores únicos (placa, terminal) não ganham nada.
+STRING_CACHE_SIZE = 4096
+
+# Bytes iniciais usados para detectar codificação, delimitador e número de colunas do CSV.
+CSV_SAMPLE_BYTES = 64 * 1024
+CSV_DELIMITERS = ";,\t|"
+
+# calamine devolve "" para células vazias e de erro.
+_MISSING = frozenset(ERROR_CODES) | {""}
+
+
+@dataclass(slots=True)
+class SheetData:
+    preamble: pd.DataFrame
+    header_row: Optional[int]
+    frame: Optional[pd.DataFrame]
+
+
+def is_spreadsheet(file_name: str) -> bool:
+    return str(file_name or "").lower().endswith((".xlsx", ".xlsm", ".xls"))
+
+
+def excel_engine(file_name: str) -> str:
+    """Engine do `pd.read_excel`: calamine quando instalado, senão openpyxl/xlrd."""
+    if CalamineWorkbook is not None:
+        return "calamine"
+    return "xlrd" if str(file_name or "").lower().endswith(".xls") else "openpyxl"
+
+
+def _clean_value(value, strings: Optional[dict] = None):
+    # Normaliza as células como o read_excel do pandas: vazias/erro viram NaN, números inteiros
+    # viram int e datas (calamine) viram datetime.
+    if value is None or value in _MISSING:
+        return np.nan
+    kind = type(value)
+    if kind is float:
+        return int(value) if value.is_integer() else value
+    if kind is date:
+        return datetime(value.year, value.month, value.day)
+    if strings is not None and kind is str:
+        # Textos repetidos (cliente, condição, datas) passam a compartilhar o mesmo objeto.
+        cached = strings.get(value)
+        if cached is not None:
+            return cached
+        if len(strings) < STRING_CACHE_SIZE:
+            strings[value] = value
+    return value
+
+
+def _calamine_sheet(file_bytes: bytes):
+    if CalamineWorkbook is None:
+        return None
+    try:
+        return CalamineWorkbook.from_filelike(io.BytesIO(file_bytes)).get_sheet_by_index(0)
+    except Exception:
+        log.warning("calamine não abriu a planilha; usando openpyxl/xlrd.", exc_info=True)
+        return None
+
+
+def _openpyxl_rows(file_bytes: bytes) -> Iterator[tuple]:
+    workbook = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True, keep_links=False)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _xlrd_value(cell, datemode: int):
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        return xlrd.xldate_as_datetime(cell.value, datemode)
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    return cell.value
+
+
+def _xlrd_rows(file_bytes: bytes) -> Iterator[tuple]:
+    book = xlrd.open_workbook(file_contents=file_bytes, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            yield tuple(_xlrd_value(cell, book.datemode) for cell in sheet.row(index))
+    finally:
+        book.release_resources()
+
+
+def _iter_rows(file_bytes: bytes, file_name: str) -> Iterator[tuple]:
+    sheet = _calamine_sheet(file_bytes)
+    if sheet is not None:
+        # calamine corta as colunas vazias à esquerda; recoloca para manter as posições.
+        offset = (None,) * (sheet.start[1] if sheet.start else 0)
+        for row in sheet.iter_rows():
+            yield offset + tuple(row) if offset else row
+    elif str(file_name or "").lower().endswith(".xls"):
+        yield from _xlrd_rows(file_bytes)
+    else:
+        yield from _openpyxl_rows(file_bytes)
+
+
+def read_sheet(
+    file_bytes: bytes,
+    file_name: str,
+    find_header_row: Callable[[pd.DataFrame], Optional[int]],
+    *,
+    scan_rows: int = PREAMBLE_ROWS,
+    prepare_chunk: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    dtype: Optional[object] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> SheetData:
+    """Localiza o cabeçalho nas primeiras linhas e lê só as colunas nomeadas abaixo dele.
+
+    `prepare_chunk` recebe cada bloco de linhas já com os nomes do cabeçalho, para normalizar
+    colunas, converter tipos e filtrar linhas antes de juntar os blocos. `dtype` segue o
+    `read_excel` do pandas (por exemplo `object` para manter os valores como lidos).
+    """
+    rows = _iter_rows(file_bytes, file_name)
+    head = list(islice(rows, scan_rows))
+    preamble_width = max((len(row) for row in head), default=0)
+    preamble = pd.DataFrame(
+        [[_clean_value(value) for value in row] + [np.nan] * (preamble_width - len(row)) for row in head]
+    )
+    header_row = find_header_row(preamble) if not preamble.empty else None
+    if header_row is None:
+        rows.close()
+        return SheetData(preamble, None, None)
+
+    header = ["" if pd.isna(value) else str(value).strip() for value in preamble.iloc[header_row].tolist()]
+    positions = [index for index, label in enumerate(header) if label]
+    labels = [header[index] for index in positions]
+    strings: dict = {}
+    chunks = []
+    columns: List[list] = [[] for _ in positions]
+
+    def _flush() -> None:
+        chunk = pd.DataFrame(dict(zip(range(len(labels)), columns)), dtype=dtype)
+        chunk.columns = labels
+        chunks.append(prepare_chunk(chunk) if prepare_chunk is not None else chunk)
+        for values in columns:
+            values.clear()
+
+    # Só as colunas com nome no cabeçalho são lidas, em blocos convertidos à medida que chegam.
+    for row in chain(head[header_row + 1:], rows):
+        size = len(row)
+        for values, position in zip(columns, positions):
+            values.append(_clean_value(row[position], strings) if position < size else np.nan)
+        if columns and len(columns[0]) >= chunk_rows:
+            _flush()
+    if not chunks or (columns and columns[0]):
+        _flush()
+
+    frame = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    return SheetData(preamble, header_row, frame)
+
+
+def _csv_encoding(sample: bytes) -> str:
+    # final=False: a amostra pode terminar no meio de um caractere multibyte.
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def _csv_dialect(text: str, truncated: bool) -> tuple[str, int]:
+    lines = text.splitlines()
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines), delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        # Relatórios com linhas de título antes do cabeçalho confundem o Sniffer.
+        delimiter = max(CSV_DELIMITERS, key=text.count)
+    width = max((len(row) for row in csv.reader(lines, delimiter=delimiter)), default=1)
+    return delimiter, max(width, 1)
+
+
+def read_csv(file_bytes: bytes, *, dtype: Optional[object] = None) -> pd.DataFrame:
+    """Lê um CSV sem cabeçalho com o engine C, detectando codificação e delimitador uma vez.
+
+    O número de colunas vem da amostra inteira, para que linhas de título no topo não
+    descartem as linhas de dados mais largas.
+    """
+    sample = file_bytes[:CSV_SAMPLE_BYTES]
+    encoding = _csv_encoding(sample)
+    delimiter, width = _csv_dialect(sample.decode(encoding, errors="ignore"), len(file_bytes) > len(sample))
+    options = dict(
+        header=None,
+        names=range(width),
+        sep=delimiter,
+        engine="c",
+        dtype=dtype,
+        low_memory=False,
+        on_bad_lines="skip",
+    )
+    try:
+        return pd.read_csv(io.BytesIO(file_bytes), encoding=encoding, **options)
+    except UnicodeDecodeError:
+        # Caracteres inválidos depois da amostra.
+        return pd.read_csv(io.BytesIO(file_bytes), encoding="latin1", **options)
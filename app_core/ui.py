@@ -605,6 +605,38 @@ def render_card(title: str, value: str, copy: str = "") -> None:
     )
 
 
+def pager_state(state_key: str, signature: Any = None) -> dict[str, Any]:
+    """Estado da paginação por cursor; volta à primeira página quando os filtros mudam."""
+    state = st.session_state.get(state_key)
+    if not isinstance(state, dict) or state.get("signature") != signature:
+        state = {"signature": signature, "page": 0, "after": None, "before": None}
+        st.session_state[state_key] = state
+    return state
+
+
+def render_pager(state_key: str, page: dict[str, Any]) -> None:
+    state = st.session_state[state_key]
+    col_prev, col_label, col_next = st.columns([1, 3, 1])
+    if col_prev.button(
+        "⬅️ Página Anterior",
+        key=f"{state_key}_previous",
+        disabled=not page.get("has_previous"),
+    ):
+        state.update(page=max(0, state["page"] - 1), after=None, before=page.get("first_cursor"))
+        st.rerun()
+    col_label.markdown(
+        f"<p style='text-align: center;'>Página {state['page'] + 1}</p>",
+        unsafe_allow_html=True,
+    )
+    if col_next.button(
+        "Próxima Página ➡️",
+        key=f"{state_key}_next",
+        disabled=not page.get("has_next"),
+    ):
+        state.update(page=state["page"] + 1, after=page.get("last_cursor"), before=None)
+        st.rerun()
+
+
 def render_sidebar() -> None:
     branding = normalize_branding(get_branding())
     render_logo(sidebar=True, max_width=200, branding=branding)
@@ -642,6 +674,7 @@ def render_sidebar() -> None:
             st.sidebar.page_link("pages/2_Gerenciar_Usuarios.py", label="Usuários")
             st.sidebar.page_link("pages/90_Identidade_Visual.py", label="Identidade visual")
             st.sidebar.page_link("pages/99_Logs_do_Sistema.py", label="Auditoria e logs")
+            st.sidebar.page_link("pages/98_Desempenho_MongoDB.py", label="Desempenho do MongoDB")
 
             with st.sidebar.expander("Compatibilidade", expanded=False):
                 st.page_link("pages/6_Faturamento_Verdio.py", label="Faturamento Verdio — legado")
@@ -0,0 +1,112 @@
+"""Benchmark de gravação/leitura do histórico de faturamento.
+
+Por padrão usa o backend em memória (`FINANCEIRO_MONGO_BACKEND=memory`), sem
+precisar de cluster. Com `--mongodb`, usa a conexão configurada no ambiente para
+comparar com o MongoDB real (use um banco descartável em FINANCEIRO_MONGO_DB).
+
+    python benchmarks/billing_persistence.py --clients 50 --terminals 400
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+TIMINGS: dict[str, list[float]] = {}
+
+
+@contextmanager
+def timed(label: str):
+    start = time.perf_counter()
+    yield
+    TIMINGS.setdefault(label, []).append(time.perf_counter() - start)
+
+
+def build_items(cliente: str, terminals: int, rng: random.Random) -> list[dict]:
+    categorias = ["Cheio", "Proporcional", "Suspenso"]
+    items = []
+    for index in range(terminals):
+        tipo = rng.choice(["GPRS", "GPRS", "GPRS", "SATELITE"])
+        valor = 59.9 if tipo == "GPRS" else 159.9
+        items.append(
+            {
+                "Terminal": f"{cliente}-T{index:05d}",
+                "Nº Equipamento": f"{rng.randrange(10**8):08d}",
+                "Placa": f"ABC{index % 10000:04d}",
+                "Frota": "",
+                "Modelo": "ST-4315" if tipo == "GPRS" else "SMARTONE",
+                "Tipo": tipo,
+                "Condição": "Ativo",
+                "Categoria": rng.choice(categorias),
+                "Data Ativação": "2025-01-10",
+                "Data Desativação": None,
+                "Dias Ativos Mês": 30,
+                "Dias Ativos Calculado": 30,
+                "Suspenso Dias Mes": 0,
+                "Dias a Faturar": 30,
+                "Valor Unitario": valor,
+                "Valor a Faturar": valor,
+            }
+        )
+    return items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--terminals", type=int, default=300)
+    parser.add_argument("--revisions", type=int, default=2, help="Gravações por cliente (a partir da 2ª, com dados alterados).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongodb", action="store_true", help="Usa o MongoDB configurado em vez do backend em memória.")
+    args = parser.parse_args()
+
+    if not args.mongodb:
+        os.environ["FINANCEIRO_MONGO_BACKEND"] = "memory"
+    import user_management_db as umdb
+
+    rng = random.Random(args.seed)
+    periodo = "Janeiro de 2025"
+    for revision in range(args.revisions):
+        for index in range(args.clients):
+            cliente = f"Cliente {index:04d}"
+            items = build_items(cliente, args.terminals, rng)
+            summary = {
+                "cliente": cliente,
+                "periodo_relatorio": periodo,
+                "valor_total": round(sum(item["Valor a Faturar"] for item in items), 2),
+                "terminais_cheio": sum(item["Categoria"] == "Cheio" for item in items),
+                "terminais_proporcional": sum(item["Categoria"] == "Proporcional" for item in items),
+                "terminais_suspensos": sum(item["Categoria"] == "Suspenso" for item in items),
+            }
+            with timed("log_faturamento"):
+                if not umdb.log_faturamento(summary, items):
+                    raise SystemExit(f"Falha ao salvar {cliente} (revisão {revision + 1}).")
+
+    with timed("get_billing_history_page"):
+        page = umdb.get_billing_history_page(50)
+    run_ids = [run["run_id"] for run in umdb.get_billing_runs(limit=args.clients)]
+    for run_id in run_ids:
+        with timed("get_billing_run_items"):
+            umdb.get_billing_run_items(run_id)
+    with timed("get_billing_period_totals"):
+        umdb.get_billing_period_totals(periodo)
+
+    backend = "mongodb" if args.mongodb else "memory"
+    print(f"backend={backend} clients={args.clients} terminals={args.terminals} revisions={args.revisions}")
+    print(f"{'operação':<28}{'n':>6}{'total (s)':>12}{'média (ms)':>12}{'p95 (ms)':>12}")
+    for label, values in TIMINGS.items():
+        ordered = sorted(values)
+        p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+        print(f"{label:<28}{len(values):>6}{sum(values):>12.3f}{statistics.mean(values) * 1000:>12.1f}{p95 * 1000:>12.1f}")
+    print(f"página do histórico: {len(page['items'])} registro(s)")
+
+
+if __name__ == "__main__":
+    main()
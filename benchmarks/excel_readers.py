@@ -0,0 +1,123 @@
+"""Benchmark dos leitores de planilha (calamine x openpyxl/xlrd) no relatório de faturamento.
+
+Sem `--file`, gera um relatório .xlsx sintético. Arquivos .xls legados podem ser
+passados com `--file` para comparar calamine com xlrd. Requer `python-calamine`.
+
+    python benchmarks/excel_readers.py --rows 50000
+    python benchmarks/excel_readers.py --file relatorio.xls --file relatorio.xlsx
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+TIMINGS: dict[str, list[float]] = {}
+
+
+@contextmanager
+def timed(label: str):
+    start = time.perf_counter()
+    yield
+    TIMINGS.setdefault(label, []).append(time.perf_counter() - start)
+
+
+def build_report(rows: int, rng: random.Random) -> bytes:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Relatório")
+    sheet.append(["Relatório de Terminais"])
+    sheet.append(["Data Inicial: 01/05/2024", None, "Data Final: 31/05/2024"])
+    sheet.append([])
+    sheet.append(
+        [
+            "Cliente",
+            "Terminal",
+            "Placa",
+            "Data Ativação",
+            "Data Desativação",
+            "Dias Ativos Mês",
+            "Suspenso Dias Mes",
+            "Nº Equipamento",
+            "Condição",
+        ]
+    )
+    inicio = datetime(2024, 5, 1)
+    for index in range(rows):
+        ativacao = inicio + timedelta(days=rng.randrange(31)) if rng.random() < 0.1 else None
+        desativacao = inicio + timedelta(days=rng.randrange(31)) if rng.random() < 0.05 else None
+        sheet.append(
+            [
+                f"Cliente {rng.randrange(200):03d}",
+                f"T{index:07d}",
+                f"ABC{index % 10000:04d}",
+                ativacao,
+                desativacao,
+                31,
+                rng.choice([0, 0, 0, 5]),
+                f"{rng.randrange(10**8):08d}",
+                rng.choice(["Ativo", "Ativo", "Suspenso"]),
+            ]
+        )
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000, help="Linhas do relatório gerado quando não há --file.")
+    parser.add_argument("--file", action="append", default=[], help="Planilha real (.xlsx/.xls); pode repetir.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from app_core import spreadsheets
+    from app_core.billing_engine import prepare_report_dataframe
+
+    if spreadsheets.CalamineWorkbook is None:
+        raise SystemExit("python-calamine não está instalado; nada a comparar.")
+    calamine = spreadsheets.CalamineWorkbook
+
+    if args.file:
+        files = [(os.path.basename(path), open(path, "rb").read()) for path in args.file]
+    else:
+        files = [(f"sintetico_{args.rows}.xlsx", build_report(args.rows, random.Random(args.seed)))]
+
+    for name, data in files:
+        fallback = "xlrd" if name.lower().endswith(".xls") else "openpyxl"
+        results = {}
+        for _ in range(args.repeat):
+            for engine in ("calamine", fallback):
+                spreadsheets.CalamineWorkbook = calamine if engine == "calamine" else None
+                try:
+                    with timed(f"{name} prepare/{engine}"):
+                        results[engine] = prepare_report_dataframe(data, name)
+                    with timed(f"{name} read_excel/{engine}"):
+                        pd.read_excel(io.BytesIO(data), header=None, engine=engine)
+                finally:
+                    spreadsheets.CalamineWorkbook = calamine
+        (fast, fast_date), (slow, slow_date) = results["calamine"], results[fallback]
+        pd.testing.assert_frame_equal(fast.reset_index(drop=True), slow.reset_index(drop=True))
+        assert fast_date == slow_date
+        print(f"{name}: {len(fast)} linha(s), resultado idêntico entre calamine e {fallback}")
+
+    print(f"{'operação':<48}{'n':>4}{'média (s)':>12}{'mín (s)':>10}")
+    for label, values in TIMINGS.items():
+        print(f"{label:<48}{len(values):>4}{statistics.mean(values):>12.3f}{min(values):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
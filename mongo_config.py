@@ -1,26 +1,55 @@
 from __future__ import annotations
 
+import atexit
 import base64
+import functools
 import hashlib
 import hmac
+import itertools
 import logging
 import os
+import queue
+import re
 import secrets as pysecrets
+import threading
+import time
 import uuid
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from types import SimpleNamespace
-from typing import Any, Iterable, Iterator
+from typing import Any, Callable, Iterable, Iterator
 
+import bson
 import streamlit as st
-from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo import ASCENDING, DESCENDING, DeleteMany, DeleteOne, MongoClient, ReplaceOne, UpdateMany, UpdateOne
 from pymongo.database import Database
-from pymongo.errors import DuplicateKeyError
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 log = logging.getLogger("financeiro_verdio.mongo")
 DEFAULT_DB_NAME = "financeiro_verdio"
 PASSWORD_SCHEME = "pbkdf2_sha256"
 PASSWORD_ITERATIONS = 600_000
+BULK_WRITE_CHUNK_SIZE = 1000
+GET_ALL_CHUNK_SIZE = 1000
+READ_CACHE_MAX_ENTRIES = 256
+READ_CACHE_TTL_SECONDS = 300
+VERSION_REFRESH_SECONDS = 5
+VERSIONS_COLLECTION = "collection_versions"
+STREAM_BATCH_SIZE = 2000
+SLOW_COMMAND_MS = 500
+COMMAND_SAMPLE_SIZE = 500
+# Tamanho das respostas medido (re-serializando o lote) em 1 de cada N respostas rápidas.
+COMMAND_BYTES_SAMPLE_RATE = 20
+PERF_EVENTS_COLLECTION = "perf_events"
+BUFFERED_WRITE_BATCH_SIZE = 200
+BUFFERED_WRITE_INTERVAL_MS = 500
+BUFFERED_WRITE_QUEUE_SIZE = 5000
+# Incremente ao alterar a lista de _ensure_indexes para reaplicá-la uma única vez.
+INDEX_SCHEMA_VERSION = 1
+# Formato do _id de subcoleções; scripts/migrate_subcollection_ids.py regrava os anteriores.
+SUBCOLLECTION_ID_VERSION = 1
 
 
 def _secret_value(*names: str, default: str = "") -> str:
@@ -49,6 +78,10 @@ def _mongo_uri() -> str:
     return uri
 
 
+def _backend_name() -> str:
+    return _secret_value("FINANCEIRO_MONGO_BACKEND", default="mongodb").lower()
+
+
 def _db_name() -> str:
     return _secret_value("FINANCEIRO_MONGO_DB", default=DEFAULT_DB_NAME)
 
@@ -89,6 +122,17 @@ def _public_document(document: dict[str, Any] | None) -> dict[str, Any]:
     }
 
 
+def _storage_id(document_id: str, parent_id: str | None) -> str:
+    # Subcoleções dividem uma coleção física: o _id leva o pai para não colidir entre pais.
+    return document_id if parent_id is None else f"{parent_id}/{document_id}"
+
+
+def _local_id(raw_id: Any, parent_id: str | None) -> str:
+    text = str(raw_id)
+    prefix = f"{parent_id}/"
+    return text[len(prefix):] if parent_id is not None and text.startswith(prefix) else text
+
+
 def _hash_password(password: str, *, salt: bytes | None = None) -> str:
     if not isinstance(password, str) or len(password) < 8:
         raise ValueError("A senha deve possuir pelo menos 8 caracteres.")
@@ -119,8 +163,336 @@ def _verify_password(password: str, encoded: str) -> bool:
         return False
 
 
+# --- CACHE DE LEITURA VERSIONADO -------------------------------------------
+class CollectionVersions:
+    """Versão de cada coleção, compartilhada entre processos pela coleção `collection_versions`.
+
+    Gravações feitas via MongoDocumentReference/MongoBatch incrementam o contador no banco;
+    os contadores são relidos no máximo a cada `refresh_seconds`, então gravações de outras
+    réplicas e workers invalidam este processo em poucos segundos. Sem banco vinculado (ou
+    com falha ao gravar), vale um contador local.
+    """
+
+    def __init__(self, *, refresh_seconds: float = VERSION_REFRESH_SECONDS) -> None:
+        self.refresh_seconds = float(refresh_seconds)
+        self.database: Database | None = None
+        self._shared: dict[str, int] = {}
+        self._local: dict[str, int] = {}
+        self._refreshed_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def bind(self, database: Database) -> None:
+        self.database = database
+        self._refreshed_at = float("-inf")
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self.database is None or now - self._refreshed_at < self.refresh_seconds:
+            return
+        self._refreshed_at = now
+        try:
+            shared = {
+                str(document["_id"]): int(document.get("version", 0) or 0)
+                for document in self.database[VERSIONS_COLLECTION].find({}, {"version": 1})
+            }
+        except Exception:
+            log.warning("Falha ao ler %s; mantendo as versões anteriores.", VERSIONS_COLLECTION, exc_info=True)
+            return
+        with self._lock:
+            # Nunca volta atrás: um incremento local pode ser mais novo que a leitura.
+            for name, version in shared.items():
+                self._shared[name] = max(version, self._shared.get(name, 0))
+
+    def get(self, name: str) -> tuple[int, int]:
+        self._refresh()
+        name = str(name)
+        return self._shared.get(name, 0), self._local.get(name, 0)
+
+    def bump(self, *names: str) -> None:
+        names = tuple(dict.fromkeys(str(name) for name in names))
+        stored = False
+        if self.database is not None and names:
+            now = datetime.now(timezone.utc)
+            try:
+                self.database[VERSIONS_COLLECTION].bulk_write(
+                    [
+                        UpdateOne({"_id": name}, {"$inc": {"version": 1}, "$set": {"updated_at": now}}, upsert=True)
+                        for name in names
+                    ],
+                    ordered=False,
+                )
+                stored = True
+            except Exception:
+                log.warning("Falha ao gravar versão de %s em %s.", ", ".join(names), VERSIONS_COLLECTION, exc_info=True)
+        with self._lock:
+            counters = self._shared if stored else self._local
+            for name in names:
+                counters[name] = counters.get(name, 0) + 1
+
+
+collection_versions = CollectionVersions()
+
+
+def collection_version(name: str) -> tuple[int, int]:
+    return collection_versions.get(name)
+
+
+def bump_collection_version(*names: str) -> None:
+    collection_versions.bump(*names)
+
+
+class MongoReadCache:
+    """Cache LRU limitado cujas chaves incluem a versão das coleções lidas.
+
+    `ttl_seconds` limita a idade de cada entrada: cobre gravações que não passam pela
+    camada de compatibilidade (scripts, `database[...]` direto).
+    """
+
+    def __init__(self, max_entries: int = READ_CACHE_MAX_ENTRIES, ttl_seconds: float = READ_CACHE_TTL_SECONDS) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Any, collections: Iterable[str], loader: Callable[[], Any]) -> Any:
+        versioned_key = (key, tuple(collection_version(name) for name in collections))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(versioned_key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(versioned_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[versioned_key] = (now, value)
+            self._entries.move_to_end(versioned_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+read_cache = MongoReadCache()
+
+
+def cached_read(*collections: str):
+    """Decora uma leitura para servir da memória até alguma das coleções ser gravada.
+
+    Exceções não são cacheadas. O retorno é o mesmo objeto para todos os chamadores (sem
+    cópia, o estoque tem 100 mil registros): trate-o como somente leitura e copie antes de alterar.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return read_cache.get_or_load(key, collections, lambda: func(*args, **kwargs))
+
+        wrapper.clear = lambda: bump_collection_version(*collections)
+        return wrapper
+
+    return decorator
+
+
+# --- INSTRUMENTAÇÃO DE COMANDOS ---------------------------------------------
+_CURSOR_COMMANDS = {"find", "aggregate", "getMore"}
+_COLLECTION_COMMANDS = {
+    "find", "aggregate", "getMore", "insert", "update", "delete", "findAndModify",
+    "count", "distinct", "createIndexes",
+}
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MongoCommandStats(monitoring.CommandListener):
+    """Latência, documentos e bytes por coleção/operação, com registro de comandos lentos.
+
+    Comandos acima de `slow_ms` vão para `perf_events` por uma thread própria, fora
+    do caminho da consulta original. Os bytes são exatos nos comandos lentos e, nos
+    demais, estimados por amostragem (1 a cada `bytes_sample_rate` respostas).
+    """
+
+    def __init__(
+        self,
+        *,
+        slow_ms: float = SLOW_COMMAND_MS,
+        sample_size: int = COMMAND_SAMPLE_SIZE,
+        bytes_sample_rate: int = COMMAND_BYTES_SAMPLE_RATE,
+    ) -> None:
+        self.slow_ms = float(slow_ms)
+        self.sample_size = max(1, int(sample_size))
+        self.bytes_sample_rate = max(1, int(bytes_sample_rate))
+        self._replies = itertools.count(1)
+        self.database: Database | None = None
+        self._pending: dict[int, tuple[str, str]] = {}
+        self._stats: dict[tuple[str, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._slow_events: queue.Queue = queue.Queue(maxsize=1000)
+        self._writer: threading.Thread | None = None
+
+    def bind(self, database: Database) -> None:
+        self.database = database
+
+    def _target(self, event: monitoring.CommandStartedEvent) -> tuple[str, str] | None:
+        if event.command_name not in _COLLECTION_COMMANDS:
+            return None
+        if self.database is not None and event.database_name != self.database.name:
+            return None
+        key = "collection" if event.command_name == "getMore" else event.command_name
+        collection_name = event.command.get(key)
+        if not isinstance(collection_name, str) or collection_name == PERF_EVENTS_COLLECTION:
+            return None
+        operation = "find" if event.command_name == "getMore" else event.command_name
+        return collection_name, operation
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = self._target(event)
+        if target is not None:
+            with self._lock:
+                self._pending[event.request_id] = target
+
+    def _record(self, event, *, documents: int, size: int, failed: bool) -> None:
+        with self._lock:
+            target = self._pending.pop(event.request_id, None)
+            if target is None:
+                return
+            duration_ms = event.duration_micros / 1000
+            stats = self._stats.get(target)
+            if stats is None:
+                stats = {
+                    "count": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "documents": 0, "bytes": 0, "slow": 0,
+                    "samples": deque(maxlen=self.sample_size),
+                }
+                self._stats[target] = stats
+            stats["count"] += 1
+            stats["failures"] += int(failed)
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["documents"] += documents
+            stats["bytes"] += size
+            stats["samples"].append(duration_ms)
+            slow = duration_ms >= self.slow_ms
+            stats["slow"] += int(slow)
+        if slow:
+            self._enqueue_slow(
+                {
+                    "timestamp": datetime.now(timezone.utc),
+                    "collection": target[0],
+                    "operation": target[1],
+                    "duration_ms": round(duration_ms, 2),
+                    "documents": documents,
+                    "bytes": size,
+                    "failed": failed,
+                }
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        if event.request_id not in self._pending:
+            return
+        reply = event.reply or {}
+        cursor = reply.get("cursor") or {}
+        if event.command_name in _CURSOR_COMMANDS:
+            batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+            documents = len(batch)
+            size = self._reply_size(event, batch)
+        else:
+            documents = int(reply.get("n", 0) or 0)
+            size = 0
+        self._record(event, documents=documents, size=size, failed=False)
+
+    def _reply_size(self, event: monitoring.CommandSucceededEvent, batch: list[Any]) -> int:
+        # Re-serializar toda resposta dobraria o custo das leituras observadas.
+        if not batch:
+            return 0
+        if event.duration_micros / 1000 >= self.slow_ms:
+            return len(bson.encode({"batch": batch}))
+        if next(self._replies) % self.bytes_sample_rate:
+            return 0
+        return len(bson.encode({"batch": batch})) * self.bytes_sample_rate
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._record(event, documents=0, size=0, failed=True)
+
+    def _enqueue_slow(self, payload: dict[str, Any]) -> None:
+        if self.database is None:
+            return
+        try:
+            self._slow_events.put_nowait(payload)
+        except queue.Full:
+            return
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_slow_events, name="mongo-perf-events", daemon=True)
+            self._writer.start()
+
+    def _write_slow_events(self) -> None:
+        while True:
+            try:
+                payload = self._slow_events.get(timeout=5)
+            except queue.Empty:
+                return
+            try:
+                self.database[PERF_EVENTS_COLLECTION].insert_one(payload)
+            except Exception:
+                log.warning("Falha ao registrar comando lento em %s.", PERF_EVENTS_COLLECTION, exc_info=True)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Totais e percentis (p50/p95) por coleção/operação desde o início do processo."""
+        with self._lock:
+            items = [(key, dict(stats), list(stats["samples"])) for key, stats in self._stats.items()]
+        rows = []
+        for (collection_name, operation), stats, samples in items:
+            rows.append(
+                {
+                    "collection": collection_name,
+                    "operation": operation,
+                    "count": stats["count"],
+                    "failures": stats["failures"],
+                    "slow": stats["slow"],
+                    "p50_ms": round(_percentile(samples, 0.50), 2),
+                    "p95_ms": round(_percentile(samples, 0.95), 2),
+                    "max_ms": round(stats["max_ms"], 2),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                    "total_ms": round(stats["total_ms"], 2),
+                    "documents": stats["documents"],
+                    "bytes": stats["bytes"],
+                }
+            )
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+command_stats = MongoCommandStats(
+    slow_ms=float(_secret_value("FINANCEIRO_MONGO_SLOW_MS", default=str(SLOW_COMMAND_MS)))
+)
+
+
 @st.cache_resource(show_spinner="Conectando ao MongoDB financeiro...")
 def get_mongo_client() -> MongoClient:
+    if _backend_name() == "memory":
+        from mongo_memory import MemoryClient
+
+        return MemoryClient(_secret_value("FINANCEIRO_MONGO_MEMORY_PATH") or None)
     client = MongoClient(
         _mongo_uri(),
         serverSelectionTimeoutMS=10_000,
@@ -129,24 +501,89 @@ def get_mongo_client() -> MongoClient:
         retryWrites=True,
         tz_aware=True,
         appname="financeiro-verdio",
+        event_listeners=[command_stats],
     )
-    client.admin.command("ping")
+    # Sem ping aqui: a conexão acontece na primeira operação real.
     return client
 
 
 @st.cache_resource(show_spinner=False)
 def get_mongo_database() -> Database:
     database = get_mongo_client()[_db_name()]
-    _ensure_indexes(database)
+    command_stats.bind(database)
+    collection_versions.bind(database)
+    _apply_index_migration(database)
     return database
 
 
-def _ensure_indexes(database: Database) -> None:
+def _apply_index_migration(database: Database) -> None:
+    """Cria os índices uma vez por versão, registrando o carimbo em schema_migrations."""
+    try:
+        stamp = database["schema_migrations"].find_one({"_id": "indexes"}) or {}
+        if int(stamp.get("version", 0) or 0) >= INDEX_SCHEMA_VERSION:
+            return
+        if not _ensure_indexes(database):
+            return
+        database["schema_migrations"].update_one(
+            {"_id": "indexes"},
+            {"$set": {"version": INDEX_SCHEMA_VERSION, "applied_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        log.info("Índices do MongoDB aplicados (versão %s).", INDEX_SCHEMA_VERSION)
+    except Exception:
+        log.exception("Falha ao aplicar a migração de índices.")
+
+
+def migrate_subcollection_ids(database: Database) -> int:
+    """Regrava com o _id prefixado pelo pai os documentos de subcoleção gravados sem ele.
+
+    Migração avulsa (`scripts/migrate_subcollection_ids.py`), fora da inicialização do app:
+    até ela rodar, as leituras também encontram o _id antigo. Devolve quantos documentos
+    foram regravados; com o carimbo já aplicado, não varre nada.
+    """
+    stamp = database["schema_migrations"].find_one({"_id": "subcollection_ids"}) or {}
+    if int(stamp.get("version", 0) or 0) >= SUBCOLLECTION_ID_VERSION:
+        return 0
+    moved = 0
+    for name in database.list_collection_names():
+        if "__" in name:
+            moved += _migrate_subcollection_ids(database[name])
+    database["schema_migrations"].update_one(
+        {"_id": "subcollection_ids"},
+        {"$set": {"version": SUBCOLLECTION_ID_VERSION, "applied_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    log.info("_id de subcoleções migrados (versão %s, %s documentos).", SUBCOLLECTION_ID_VERSION, moved)
+    return moved
+
+
+def _migrate_subcollection_ids(collection) -> int:
+    operations: list[Any] = []
+    moved = 0
+    for document in collection.find({"__mongo_parent_id": {"$exists": True}}):
+        parent_id = str(document["__mongo_parent_id"])
+        raw_id = document["_id"]
+        if str(raw_id).startswith(f"{parent_id}/"):
+            continue
+        payload = {key: value for key, value in document.items() if key != "_id"}
+        # Se o documento já foi regravado no formato novo, a versão nova prevalece.
+        operations.append(UpdateOne({"_id": _storage_id(str(raw_id), parent_id)}, {"$setOnInsert": payload}, upsert=True))
+        operations.append(DeleteOne({"_id": raw_id}))
+        moved += 1
+        if len(operations) >= BULK_WRITE_CHUNK_SIZE:
+            collection.bulk_write(operations, ordered=True)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=True)
+    return moved
+
+
+def _ensure_indexes(database: Database) -> bool:
     specs = [
-        ("system_logs", [("timestamp", DESCENDING)], {"name": "idx_logs_timestamp"}),
+        ("system_logs", [("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "idx_logs_timestamp_id"}),
         ("billing_history", [("cliente", ASCENDING), ("periodo_relatorio", ASCENDING)], {"unique": True, "name": "uniq_billing_current"}),
-        ("billing_history", [("data_geracao", DESCENDING)], {"name": "idx_billing_history_date"}),
-        ("billing_runs", [("data_geracao", DESCENDING)], {"name": "idx_billing_runs_date"}),
+        ("billing_history", [("data_geracao", DESCENDING), ("_id", DESCENDING)], {"name": "idx_billing_history_date_id"}),
+        ("billing_runs", [("data_geracao", DESCENDING), ("_id", DESCENDING)], {"name": "idx_billing_runs_date_id"}),
         ("billing_runs", [("period_key", ASCENDING), ("cliente", ASCENDING)], {"name": "idx_billing_runs_period_client"}),
         ("billing_runs__items", [("__mongo_parent_id", ASCENDING), ("item_index", ASCENDING)], {"name": "idx_run_items_parent"}),
         ("billing_terminal_snapshots", [("period_key", ASCENDING), ("cliente", ASCENDING)], {"name": "idx_snapshots_period_client"}),
@@ -156,12 +593,16 @@ def _ensure_indexes(database: Database) -> None:
         ("trackers", [("Modelo", ASCENDING)], {"name": "idx_trackers_model"}),
         ("client_contracts", [("cliente", ASCENDING)], {"name": "idx_contracts_client"}),
         ("terminais_parceiros", [("parceiro", ASCENDING)], {"name": "idx_partner_terminals"}),
+        (PERF_EVENTS_COLLECTION, [("timestamp", ASCENDING)], {"name": "ttl_perf_events", "expireAfterSeconds": 30 * 24 * 3600}),
     ]
+    ok = True
     for collection_name, keys, kwargs in specs:
         try:
             database[collection_name].create_index(keys, **kwargs)
         except Exception:
+            ok = False
             log.exception("Falha ao garantir índice %s em %s.", kwargs.get("name"), collection_name)
+    return ok
 
 
 def _ensure_bootstrap_admin(database: Database) -> None:
@@ -195,7 +636,7 @@ def _ensure_bootstrap_admin(database: Database) -> None:
         pass
 
 
-@dataclass
+@dataclass(slots=True)
 class MongoDocumentSnapshot:
     id: str
     reference: "MongoDocumentReference"
@@ -220,6 +661,10 @@ class MongoQuery:
         filters: list[tuple[str, str, Any]] | None = None,
         sorts: list[tuple[str, int]] | None = None,
         limit_value: int | None = None,
+        projection: dict[str, int] | None = None,
+        start_cursor: dict[str, Any] | None = None,
+        end_cursor: dict[str, Any] | None = None,
+        limit_to_last_value: bool = False,
     ) -> None:
         self.database = database
         self.collection_name = collection_name
@@ -228,6 +673,10 @@ class MongoQuery:
         self.filters = list(filters or [])
         self.sorts = list(sorts or [])
         self.limit_value = limit_value
+        self.projection = dict(projection) if projection else None
+        self.start_cursor = start_cursor
+        self.end_cursor = end_cursor
+        self.limit_to_last_value = bool(limit_to_last_value)
 
     def _clone(self, **changes: Any) -> "MongoQuery":
         values = {
@@ -238,6 +687,10 @@ class MongoQuery:
             "filters": self.filters,
             "sorts": self.sorts,
             "limit_value": self.limit_value,
+            "projection": self.projection,
+            "start_cursor": self.start_cursor,
+            "end_cursor": self.end_cursor,
+            "limit_to_last_value": self.limit_to_last_value,
         }
         values.update(changes)
         return MongoQuery(**values)
@@ -254,7 +707,64 @@ class MongoQuery:
         )
 
     def limit(self, count: int) -> "MongoQuery":
-        return self._clone(limit_value=max(0, int(count)))
+        return self._clone(limit_value=max(0, int(count)), limit_to_last_value=False)
+
+    def limit_to_last(self, count: int) -> "MongoQuery":
+        """Mantém os últimos `count` documentos da ordenação (página anterior)."""
+        if not self.sorts:
+            raise ValueError("limit_to_last() exige order_by().")
+        return self._clone(limit_value=max(0, int(count)), limit_to_last_value=True)
+
+    def _cursor_values(self, cursor: Any) -> dict[str, Any]:
+        if not self.sorts:
+            raise ValueError("Cursores de paginação exigem order_by().")
+        if isinstance(cursor, MongoDocumentSnapshot):
+            source = dict(cursor._document or {})
+            source.setdefault("_id", cursor.id)
+        elif isinstance(cursor, dict):
+            source = cursor
+        else:
+            source = dict(zip((field for field, _ in self.sorts), list(cursor)))
+        missing = [field for field, _ in self.sorts if field not in source]
+        if missing:
+            raise ValueError("Cursor sem valores para: " + ", ".join(missing))
+        return {field: _mongo_safe(source[field]) for field, _ in self.sorts}
+
+    def start_after(self, cursor: Any) -> "MongoQuery":
+        """Paginação por chave: começa logo após o snapshot/valores informados.
+
+        Os valores seguem os campos de order_by(); inclua um desempate único
+        (por exemplo `_id`) na ordenação para páginas estáveis.
+        """
+        return self._clone(start_cursor=self._cursor_values(cursor))
+
+    def end_before(self, cursor: Any) -> "MongoQuery":
+        return self._clone(end_cursor=self._cursor_values(cursor))
+
+    def _keyset_filter(self, values: dict[str, Any], *, after: bool) -> dict[str, Any]:
+        clauses = []
+        for index, (field, direction) in enumerate(self.sorts):
+            clause = {previous: values[previous] for previous, _ in self.sorts[:index]}
+            forward = (direction == ASCENDING) == after
+            clause[field] = {"$gt" if forward else "$lt": values[field]}
+            clauses.append(clause)
+        return {"$or": clauses}
+
+    def select(self, *field_paths: str) -> "MongoQuery":
+        """Retorna somente os campos informados (além do _id)."""
+        if self.projection and 0 in self.projection.values():
+            raise ValueError("Não é possível combinar select() e exclude() na mesma consulta.")
+        projection = dict(self.projection or {})
+        projection.update({str(field_path): 1 for field_path in field_paths})
+        return self._clone(projection=projection)
+
+    def exclude(self, *field_paths: str) -> "MongoQuery":
+        """Omite os campos informados, por exemplo arrays grandes de itens."""
+        if self.projection and 1 in self.projection.values():
+            raise ValueError("Não é possível combinar select() e exclude() na mesma consulta.")
+        projection = dict(self.projection or {})
+        projection.update({str(field_path): 0 for field_path in field_paths})
+        return self._clone(projection=projection)
 
     def _mongo_filter(self) -> dict[str, Any]:
         query: dict[str, Any] = {}
@@ -268,18 +778,44 @@ class MongoQuery:
             elif op in op_map:
                 query.setdefault(field, {})
                 query[field][op_map[op]] = value
+            elif op == "contains":
+                query.setdefault(field, {})
+                query[field].update({"$regex": re.escape(str(value)), "$options": "i"})
             else:
                 raise NotImplementedError(f"Operador de consulta não suportado: {op}")
+        cursor_filters = []
+        if self.start_cursor is not None:
+            cursor_filters.append(self._keyset_filter(self.start_cursor, after=True))
+        if self.end_cursor is not None:
+            cursor_filters.append(self._keyset_filter(self.end_cursor, after=False))
+        if cursor_filters:
+            query["$and"] = cursor_filters
         return query
 
+    def _documents(
+        self, projection: dict[str, int] | None = None, batch_size: int | None = None
+    ) -> Iterable[dict[str, Any]]:
+        cursor = self.database[self.collection_name].find(self._mongo_filter(), projection)
+        if batch_size:
+            cursor = cursor.batch_size(int(batch_size))
+        if self.limit_to_last_value:
+            reversed_sorts = [
+                (field, ASCENDING if direction == DESCENDING else DESCENDING)
+                for field, direction in self.sorts
+            ]
+            cursor = cursor.sort(reversed_sorts).limit(self.limit_value or 0)
+            documents: Iterable[dict[str, Any]] = reversed(list(cursor))
+        else:
+            if self.sorts:
+                cursor = cursor.sort(self.sorts)
+            if self.limit_value is not None:
+                cursor = cursor.limit(self.limit_value)
+            documents = cursor
+        return documents
+
     def stream(self) -> Iterator[MongoDocumentSnapshot]:
-        cursor = self.database[self.collection_name].find(self._mongo_filter())
-        if self.sorts:
-            cursor = cursor.sort(self.sorts)
-        if self.limit_value is not None:
-            cursor = cursor.limit(self.limit_value)
-        for document in cursor:
-            doc_id = str(document.get("_id"))
+        for document in self._documents(self.projection):
+            doc_id = _local_id(document.get("_id"), self.parent_id)
             ref = MongoDocumentReference(
                 self.database,
                 self.collection_name,
@@ -292,6 +828,146 @@ class MongoQuery:
     def get(self) -> list[MongoDocumentSnapshot]:
         return list(self.stream())
 
+    def _row_projection(self, include_id: bool) -> dict[str, int] | None:
+        projection = dict(self.projection or {})
+        if self.parent_id is not None and 1 not in projection.values():
+            projection["__mongo_parent_id"] = 0
+            projection["__mongo_parent_collection"] = 0
+        if not include_id:
+            projection["_id"] = 0
+        return projection or None
+
+    def stream_rows(
+        self, *, include_id: bool = True, batch_size: int = STREAM_BATCH_SIZE
+    ) -> Iterator[dict[str, Any]]:
+        """Itera os dicts do cursor sem criar snapshots por documento.
+
+        Os campos internos `__mongo_*` são removidos já na projeção do servidor.
+        """
+        documents = self._documents(self._row_projection(include_id), batch_size)
+        if self.parent_id is None or not include_id:
+            yield from documents
+            return
+        for document in documents:
+            document["_id"] = _local_id(document.get("_id"), self.parent_id)
+            yield document
+
+    def to_frame(
+        self,
+        columns: list[str] | None = None,
+        *,
+        include_id: bool = True,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ):
+        import pandas as pd
+
+        return pd.DataFrame.from_records(
+            self.stream_rows(include_id=include_id, batch_size=batch_size), columns=columns
+        )
+
+    def count(self) -> int:
+        """Conta no servidor os documentos que atendem aos filtros."""
+        options: dict[str, Any] = {}
+        if self.limit_value:
+            options["limit"] = self.limit_value
+        return int(self.database[self.collection_name].count_documents(self._mongo_filter(), **options))
+
+    def update_where(self, data: dict[str, Any]) -> MongoBatchResult:
+        """Aplica `$set` no servidor a todos os documentos da consulta (update_many)."""
+        if self.limit_value is not None or self.start_cursor is not None or self.end_cursor is not None:
+            raise ValueError("update_where() não aceita limit() nem cursores de paginação.")
+        try:
+            raw = self.database[self.collection_name].update_many(
+                self._mongo_filter(), {"$set": _mongo_safe(dict(data or {}))}
+            )
+        finally:
+            bump_collection_version(self.collection_name)
+        return MongoBatchResult(matched_count=int(raw.matched_count), modified_count=int(raw.modified_count))
+
+    def group_by(self, *field_paths: str) -> "MongoGroupBy":
+        return MongoGroupBy(self, [str(field_path) for field_path in field_paths])
+
+    def _match_stages(self) -> list[dict[str, Any]]:
+        query = self._mongo_filter()
+        stages: list[dict[str, Any]] = [{"$match": query}] if query else []
+        if self.sorts:
+            stages.append({"$sort": dict(self.sorts)})
+        if self.limit_value:
+            stages.append({"$limit": self.limit_value})
+        return stages
+
+    def aggregate(self, pipeline: list[dict[str, Any]]) -> "MongoAggregation":
+        """Executa um pipeline bruto após os filtros, ordenação e limite desta consulta."""
+        return MongoAggregation(self, self._match_stages() + list(pipeline or []))
+
+
+AGGREGATION_OPERATORS = {
+    "sum": "$sum",
+    "avg": "$avg",
+    "min": "$min",
+    "max": "$max",
+    "first": "$first",
+    "last": "$last",
+    "unique": "$addToSet",
+}
+
+
+class MongoAggregation:
+    def __init__(self, query: MongoQuery, pipeline: list[dict[str, Any]]) -> None:
+        self.query = query
+        self.pipeline = pipeline
+
+    def order_by(self, field_path: str, direction: Any = "ASCENDING") -> "MongoAggregation":
+        descending = direction in (-1, DESCENDING) or str(direction).upper().endswith("DESCENDING")
+        return MongoAggregation(
+            self.query, self.pipeline + [{"$sort": {str(field_path): DESCENDING if descending else ASCENDING}}]
+        )
+
+    def limit(self, count: int) -> "MongoAggregation":
+        return MongoAggregation(self.query, self.pipeline + [{"$limit": max(1, int(count))}])
+
+    def stream(self) -> Iterator[dict[str, Any]]:
+        cursor = self.query.database[self.query.collection_name].aggregate(self.pipeline, allowDiskUse=True)
+        for row in cursor:
+            yield row
+
+    def get(self) -> list[dict[str, Any]]:
+        return list(self.stream())
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.get())
+
+
+class MongoGroupBy:
+    def __init__(self, query: MongoQuery, fields: list[str]) -> None:
+        self.query = query
+        self.fields = fields
+
+    def agg(self, **named: tuple[str | None, str]) -> MongoAggregation:
+        """Agrupa no servidor, por exemplo agg(total=("valor_total", "sum"), qtd=(None, "count")).
+
+        Cada linha devolvida contém os campos do agrupamento e as colunas nomeadas.
+        """
+        group: dict[str, Any] = {"_id": {f"k{index}": f"${field}" for index, field in enumerate(self.fields)}}
+        for name, (field, function) in named.items():
+            if function == "count":
+                group[name] = {"$sum": 1}
+            elif function in AGGREGATION_OPERATORS:
+                group[name] = {AGGREGATION_OPERATORS[function]: f"${field}"}
+            else:
+                raise NotImplementedError(f"Agregação não suportada: {function}")
+        project: dict[str, Any] = {"_id": 0}
+        for index, field in enumerate(self.fields):
+            project[field] = f"$_id.k{index}"
+        for name in named:
+            project[name] = 1
+        return self.query.aggregate([{"$group": group}, {"$project": project}])
+
+    def count(self) -> MongoAggregation:
+        return self.agg(count=(None, "count"))
+
 
 class MongoCollectionReference(MongoQuery):
     def document(self, document_id: str | None = None) -> "MongoDocumentReference":
@@ -308,8 +984,78 @@ class MongoCollectionReference(MongoQuery):
         ref.set(data)
         return datetime.now(timezone.utc), ref
 
+    def insert_many(self, documents: Iterable[dict[str, Any]]) -> list[str]:
+        """Insere documentos novos (ids gerados) em uma única chamada ao servidor."""
+        payloads = []
+        for data in documents:
+            ref = self.document()
+            payloads.append(ref._set_payload(data, False))
+        if not payloads:
+            return []
+        try:
+            self.database[self.collection_name].insert_many(payloads, ordered=False)
+        finally:
+            bump_collection_version(self.collection_name)
+        return [_local_id(payload["_id"], self.parent_id) for payload in payloads]
+
+    def get_all(
+        self,
+        document_ids: Iterable[Any],
+        *,
+        projection: dict[str, int] | Iterable[str] | None = None,
+        chunk_size: int = GET_ALL_CHUNK_SIZE,
+    ) -> list[MongoDocumentSnapshot]:
+        """Busca vários documentos por id com consultas `$in` em blocos.
+
+        Os snapshots voltam na ordem dos ids informados; ids inexistentes vêm com
+        `exists == False`.
+        """
+        ids = [str(document_id) for document_id in document_ids]
+        unique_ids = list(dict.fromkeys(ids))
+        if projection is not None and not isinstance(projection, dict):
+            projection = {str(field_path): 1 for field_path in projection}
+        projection = projection if projection is not None else self.projection
+        base_filter: dict[str, Any] = {}
+        if self.parent_id is not None:
+            base_filter["__mongo_parent_id"] = self.parent_id
+            base_filter["__mongo_parent_collection"] = self.parent_collection
+
+        found: dict[str, dict[str, Any]] = {}
+        collection = self.database[self.collection_name]
+        size = max(1, int(chunk_size))
+        for start in range(0, len(unique_ids), size):
+            chunk = unique_ids[start:start + size]
+            storage_ids = [_storage_id(document_id, self.parent_id) for document_id in chunk]
+            if self.parent_id is not None:
+                # _id sem prefixo de subcoleções ainda não migradas.
+                storage_ids += chunk
+            query = dict(base_filter)
+            query["_id"] = {"$in": storage_ids}
+            for document in collection.find(query, projection):
+                raw_id = str(document.get("_id"))
+                document_id = _local_id(raw_id, self.parent_id)
+                if document_id not in found or raw_id != document_id:
+                    found[document_id] = document
+
+        return [
+            MongoDocumentSnapshot(
+                document_id,
+                MongoDocumentReference(
+                    self.database,
+                    self.collection_name,
+                    document_id,
+                    parent_id=self.parent_id,
+                    parent_collection=self.parent_collection,
+                ),
+                found.get(document_id),
+            )
+            for document_id in ids
+        ]
+
 
 class MongoDocumentReference:
+    __slots__ = ("database", "collection_name", "id", "parent_id", "parent_collection")
+
     def __init__(
         self,
         database: Database,
@@ -326,35 +1072,68 @@ class MongoDocumentReference:
         self.parent_collection = parent_collection
 
     def _filter(self) -> dict[str, Any]:
-        query: dict[str, Any] = {"_id": self.id}
+        query: dict[str, Any] = {"_id": _storage_id(self.id, self.parent_id)}
         if self.parent_id is not None:
             query["__mongo_parent_id"] = self.parent_id
             query["__mongo_parent_collection"] = self.parent_collection
         return query
 
+    def _any_filter(self) -> dict[str, Any]:
+        """Casa também o _id sem prefixo de subcoleções ainda não migradas."""
+        query = self._filter()
+        if self.parent_id is not None:
+            query["_id"] = {"$in": [query["_id"], self.id]}
+        return query
+
     def get(self) -> MongoDocumentSnapshot:
-        document = self.database[self.collection_name].find_one(self._filter())
+        collection = self.database[self.collection_name]
+        document = collection.find_one(self._filter())
+        if document is None and self.parent_id is not None:
+            document = collection.find_one({**self._filter(), "_id": self.id})
         return MongoDocumentSnapshot(self.id, self, document)
 
-    def set(self, data: dict[str, Any], merge: bool = False) -> None:
+    def _set_payload(self, data: dict[str, Any] | None, merge: bool) -> dict[str, Any]:
         payload = _mongo_safe(dict(data or {}))
         if self.parent_id is not None:
             payload["__mongo_parent_id"] = self.parent_id
             payload["__mongo_parent_collection"] = self.parent_collection
-        collection = self.database[self.collection_name]
+        if not merge:
+            payload["_id"] = _storage_id(self.id, self.parent_id)
+        return payload
+
+    def _write_model(self, operation: str, data: dict[str, Any] | None = None, merge: bool = False):
+        """Operação pymongo equivalente a set/update/delete, usada pelo MongoBatch."""
+        if operation == "delete":
+            return DeleteMany(self._any_filter())
+        if operation == "update":
+            return UpdateMany(self._any_filter(), {"$set": _mongo_safe(dict(data or {}))})
         if merge:
-            collection.update_one(self._filter(), {"$set": payload}, upsert=True)
-        else:
-            payload["_id"] = self.id
-            collection.replace_one(self._filter(), payload, upsert=True)
+            return UpdateOne(self._filter(), {"$set": self._set_payload(data, True)}, upsert=True)
+        return ReplaceOne(self._filter(), self._set_payload(data, False), upsert=True)
+
+    def set(self, data: dict[str, Any], merge: bool = False) -> None:
+        collection = self.database[self.collection_name]
+        try:
+            if merge:
+                collection.update_one(self._filter(), {"$set": self._set_payload(data, True)}, upsert=True)
+            else:
+                collection.replace_one(self._filter(), self._set_payload(data, False), upsert=True)
+        finally:
+            bump_collection_version(self.collection_name)
 
     def update(self, data: dict[str, Any]) -> None:
-        self.database[self.collection_name].update_one(
-            self._filter(), {"$set": _mongo_safe(dict(data or {}))}, upsert=False
-        )
+        try:
+            self.database[self.collection_name].update_many(
+                self._any_filter(), {"$set": _mongo_safe(dict(data or {}))}
+            )
+        finally:
+            bump_collection_version(self.collection_name)
 
     def delete(self) -> None:
-        self.database[self.collection_name].delete_one(self._filter())
+        try:
+            self.database[self.collection_name].delete_many(self._any_filter())
+        finally:
+            bump_collection_version(self.collection_name)
 
     def collection(self, name: str) -> MongoCollectionReference:
         return MongoCollectionReference(
@@ -365,9 +1144,44 @@ class MongoDocumentReference:
         )
 
 
+@dataclass
+class MongoBatchResult:
+    inserted_count: int = 0
+    matched_count: int = 0
+    modified_count: int = 0
+    upserted_count: int = 0
+    deleted_count: int = 0
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def _add_counts(self, raw: dict[str, Any]) -> None:
+        self.inserted_count += int(raw.get("nInserted", 0) or 0)
+        self.matched_count += int(raw.get("nMatched", 0) or 0)
+        self.modified_count += int(raw.get("nModified", 0) or 0)
+        self.upserted_count += int(raw.get("nUpserted", 0) or 0)
+        self.deleted_count += int(raw.get("nRemoved", 0) or 0)
+
+
+class MongoBatchError(RuntimeError):
+    def __init__(self, result: MongoBatchResult) -> None:
+        first = result.errors[0] if result.errors else {}
+        super().__init__(
+            f"{len(result.errors)} operação(ões) do lote falharam; "
+            f"primeira: {first.get('collection')}/{first.get('document_id')}: {first.get('errmsg')}"
+        )
+        self.result = result
+
+
 class MongoBatch:
-    def __init__(self) -> None:
+    """Agrupa set/update/delete por coleção e grava com bulk_write em blocos."""
+
+    def __init__(self, *, chunk_size: int = BULK_WRITE_CHUNK_SIZE, ordered: bool = False) -> None:
         self.operations: list[tuple[str, MongoDocumentReference, dict[str, Any] | None, bool]] = []
+        self.chunk_size = max(1, int(chunk_size))
+        self.ordered = bool(ordered)
 
     def set(self, ref: MongoDocumentReference, data: dict[str, Any], merge: bool = False) -> None:
         self.operations.append(("set", ref, dict(data or {}), bool(merge)))
@@ -378,16 +1192,143 @@ class MongoBatch:
     def delete(self, ref: MongoDocumentReference) -> None:
         self.operations.append(("delete", ref, None, False))
 
-    def commit(self) -> None:
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def commit(self, *, raise_on_error: bool = True) -> MongoBatchResult:
+        grouped: dict[tuple[int, str], tuple[Database, list[tuple[Any, MongoDocumentReference]]]] = {}
         for operation, ref, data, merge in self.operations:
-            if operation == "set":
-                ref.set(data or {}, merge=merge)
-            elif operation == "update":
-                ref.update(data or {})
-            elif operation == "delete":
-                ref.delete()
+            key = (id(ref.database), ref.collection_name)
+            if key not in grouped:
+                grouped[key] = (ref.database, [])
+            grouped[key][1].append((ref._write_model(operation, data, merge), ref))
         self.operations.clear()
 
+        result = MongoBatchResult()
+        try:
+            for (_, collection_name), (database, entries) in grouped.items():
+                collection = database[collection_name]
+                for start in range(0, len(entries), self.chunk_size):
+                    chunk = entries[start:start + self.chunk_size]
+                    try:
+                        bulk = collection.bulk_write([model for model, _ in chunk], ordered=self.ordered)
+                        result._add_counts(bulk.bulk_api_result)
+                    except BulkWriteError as exc:
+                        details = exc.details or {}
+                        result._add_counts(details)
+                        for error in details.get("writeErrors", []):
+                            index = int(error.get("index", 0))
+                            result.errors.append(
+                                {
+                                    "collection": collection_name,
+                                    "document_id": chunk[index][1].id if index < len(chunk) else None,
+                                    "code": error.get("code"),
+                                    "errmsg": error.get("errmsg"),
+                                }
+                            )
+                        if self.ordered:
+                            break
+                # Ordenado: o primeiro erro interrompe também as coleções seguintes.
+                if self.ordered and result.errors:
+                    break
+        finally:
+            bump_collection_version(*(collection_name for _, collection_name in grouped))
+        if result.errors:
+            log.error("Lote MongoDB concluído com %s erro(s).", len(result.errors))
+            if raise_on_error:
+                raise MongoBatchError(result)
+        return result
+
+
+class MongoBufferedWriter:
+    """Acumula documentos novos e grava com insert_many a partir de uma thread própria.
+
+    Um lote sai a cada `interval_ms` ou `batch_size` documentos. Com a fila cheia, a
+    gravação é síncrona; `flush()` esvazia a fila e também roda no encerramento.
+    """
+
+    def __init__(
+        self,
+        collection: Callable[[], MongoCollectionReference],
+        *,
+        batch_size: int = BUFFERED_WRITE_BATCH_SIZE,
+        interval_ms: int = BUFFERED_WRITE_INTERVAL_MS,
+        max_queue: int = BUFFERED_WRITE_QUEUE_SIZE,
+    ) -> None:
+        self._collection = collection
+        self.batch_size = max(1, int(batch_size))
+        self.interval = max(0, int(interval_ms)) / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._flush_requested = threading.Event()
+        self._thread: threading.Thread | None = None
+        atexit.register(self.flush)
+
+    def add(self, data: dict[str, Any]) -> bool:
+        """Enfileira uma cópia do documento; False se a gravação síncrona (fila cheia) falhar.
+
+        A cópia é feita aqui, com `_mongo_safe`, para que alterações posteriores do chamador
+        em dicts ou listas aninhados não mudem o que será gravado.
+        """
+        document = _mongo_safe(dict(data))
+        with self._condition:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(document)
+        except queue.Full:
+            return self._write([document])
+        if self._thread is None or not self._thread.is_alive():
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="mongo-buffered-writer", daemon=True)
+                    self._thread.start()
+        return True
+
+    def _write(self, documents: list[dict[str, Any]]) -> bool:
+        try:
+            self._collection().insert_many(documents)
+            return True
+        except Exception:
+            log.exception("Falha ao gravar lote de %s documento(s) em segundo plano.", len(documents))
+            return False
+        finally:
+            with self._condition:
+                self._pending -= len(documents)
+                self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size and not self._flush_requested.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    # Espera em fatias curtas para atender um flush() sem aguardar o intervalo todo.
+                    batch.append(self._queue.get(timeout=min(remaining, 0.05)))
+                except queue.Empty:
+                    continue
+            self._write(batch)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Grava o que está na fila e espera os lotes em andamento; True se nada ficou pendente."""
+        self._flush_requested.set()
+        drained = []
+        while True:
+            try:
+                drained.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(drained), self.batch_size):
+            self._write(drained[start:start + self.batch_size])
+        try:
+            with self._condition:
+                return self._condition.wait_for(lambda: self._pending <= 0, timeout)
+        finally:
+            self._flush_requested.clear()
+
 
 class MongoDatabaseCompat:
     def __init__(self, database: Database) -> None:
@@ -396,8 +1337,8 @@ class MongoDatabaseCompat:
     def collection(self, name: str) -> MongoCollectionReference:
         return MongoCollectionReference(self.database, str(name))
 
-    def batch(self) -> MongoBatch:
-        return MongoBatch()
+    def batch(self, *, chunk_size: int = BULK_WRITE_CHUNK_SIZE, ordered: bool = False) -> MongoBatch:
+        return MongoBatch(chunk_size=chunk_size, ordered=ordered)
 
 
 class MongoAuthClient:
@@ -495,9 +1436,30 @@ class MongoAuthAdmin:
         return MongoUserRecord(document)
 
 
-db = MongoDatabaseCompat(get_mongo_database())
-auth_client = MongoAuthClient(get_mongo_database())
-_auth_admin = MongoAuthAdmin(get_mongo_database())
+class _LazyResource:
+    """Proxy que só cria o objeto (e conecta ao MongoDB) no primeiro acesso a um atributo."""
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def _resolve(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+
+db: MongoDatabaseCompat = _LazyResource(lambda: MongoDatabaseCompat(get_mongo_database()))
+auth_client: MongoAuthClient = _LazyResource(lambda: MongoAuthClient(get_mongo_database()))
+_auth_admin: MongoAuthAdmin = _LazyResource(lambda: MongoAuthAdmin(get_mongo_database()))
 
 
 def get_auth_admin_client() -> MongoAuthAdmin:
@@ -518,6 +1480,9 @@ def connection_diagnostics() -> dict[str, Any]:
             "database": database.name,
             "users": database["users"].estimated_document_count(),
             "billing_history": database["billing_history"].estimated_document_count(),
+            "slow_command_ms": command_stats.slow_ms,
+            "command_stats": command_stats.snapshot(),
+            "read_cache": read_cache.stats(),
         }
     except Exception as exc:
         return {"ok": False, "error": f"{exc.__class__.__name__}: {exc}"}
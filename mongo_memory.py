@@ -0,0 +1,749 @@
+"""Backend em memória para a camada de compatibilidade do MongoDB.
+
+Implementa o subconjunto do pymongo usado pelo Financeiro (filtros de
+`MongoQuery._mongo_filter`, ordenação, limite, projeção, bulk_write, agregações
+simples e índices únicos) para rodar benchmarks e testes sem cluster. Com
+`path`, o conteúdo é gravado em arquivo (pickle) e recarregado na abertura.
+"""
+
+from __future__ import annotations
+
+import atexit
+import copy
+import os
+import pickle
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+FLUSH_INTERVAL_SECONDS = 2.0
+
+
+# --- VALORES E COMPARAÇÃO -------------------------------------------------
+def _type_rank(value: Any) -> int:
+    # Ordem de tipos do BSON, reduzida aos tipos gravados pelo app.
+    if value is None or value is _MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value: Any) -> tuple[int, Any]:
+    rank = _type_rank(value)
+    if rank == 1:
+        return rank, 0
+    if rank in (4, 5, 10):
+        return rank, repr(value)
+    if rank == 7:
+        return rank, str(value)
+    return rank, value
+
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def _get_path(document: Any, path: str) -> Any:
+    current = document
+    for part in path.split("."):
+        if isinstance(current, dict):
+            current = current.get(part, _MISSING)
+        elif isinstance(current, list) and part.isdigit() and int(part) < len(current):
+            current = current[int(part)]
+        else:
+            return _MISSING
+        if current is _MISSING:
+            return _MISSING
+    return current
+
+
+def _set_path(document: dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    current = document
+    for part in parts[:-1]:
+        current = current.setdefault(part, {})
+    current[parts[-1]] = value
+
+
+def _unset_path(document: dict[str, Any], path: str) -> None:
+    parts = path.split(".")
+    current = document
+    for part in parts[:-1]:
+        current = current.get(part)
+        if not isinstance(current, dict):
+            return
+    current.pop(parts[-1], None)
+
+
+# --- FILTROS ----------------------------------------------------------------
+def _compare(value: Any, target: Any, operator: str) -> bool:
+    if value is _MISSING or _type_rank(value) != _type_rank(target):
+        return False
+    left, right = _sort_key(value), _sort_key(target)
+    if operator == "$gt":
+        return left > right
+    if operator == "$gte":
+        return left >= right
+    if operator == "$lt":
+        return left < right
+    return left <= right
+
+
+def _equals(value: Any, target: Any) -> bool:
+    if value is _MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(_equals(item, target) for item in value)
+    return _type_rank(value) == _type_rank(target) and value == target
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if not (isinstance(condition, dict) and condition and all(str(key).startswith("$") for key in condition)):
+        return _equals(value, condition)
+
+    for operator, target in condition.items():
+        if operator == "$eq":
+            matched = _equals(value, target)
+        elif operator == "$ne":
+            matched = not _equals(value, target)
+        elif operator in {"$gt", "$gte", "$lt", "$lte"}:
+            candidates = value if isinstance(value, list) else [value]
+            matched = any(_compare(item, target, operator) for item in candidates)
+        elif operator == "$in":
+            matched = any(_equals(value, item) for item in target)
+        elif operator == "$nin":
+            matched = not any(_equals(value, item) for item in target)
+        elif operator == "$exists":
+            matched = (value is not _MISSING) == bool(target)
+        elif operator == "$regex":
+            flags = re.IGNORECASE if "i" in str(condition.get("$options", "")) else 0
+            candidates = value if isinstance(value, list) else [value]
+            matched = any(isinstance(item, str) and re.search(target, item, flags) for item in candidates)
+        elif operator == "$options":
+            matched = True
+        elif operator == "$not":
+            matched = not _match_condition(value, target)
+        else:
+            raise NotImplementedError(f"Operador de filtro não suportado no backend em memória: {operator}")
+        if not matched:
+            return False
+    return True
+
+
+def matches(document: dict[str, Any], query: dict[str, Any] | None) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(document, clause) for clause in condition):
+                return False
+        elif not _match_condition(_get_path(document, key), condition):
+            return False
+    return True
+
+
+# --- PROJEÇÃO, ORDENAÇÃO E ATUALIZAÇÃO --------------------------------------
+def _project(document: dict[str, Any], projection: dict[str, Any] | None) -> dict[str, Any]:
+    if not projection:
+        return document
+    include_id = projection.get("_id", 1) not in (0, False)
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    if fields and all(value in (1, True) for value in fields.values()):
+        result: dict[str, Any] = {}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        for path in fields:
+            value = _get_path(document, path)
+            if value is not _MISSING:
+                _set_path(result, path, value)
+        return result
+    result = copy.deepcopy(document) if any("." in path for path in fields) else dict(document)
+    for path, value in fields.items():
+        if value in (0, False):
+            _unset_path(result, path)
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def _normalize_sort(key_or_list: Any, direction: Any = None) -> list[tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else ASCENDING)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(str(field), int(order)) for field, order in key_or_list]
+
+
+def _sort_documents(documents: list[dict[str, Any]], sorts: list[tuple[str, int]]) -> list[dict[str, Any]]:
+    for field, direction in reversed(sorts):
+        documents.sort(key=lambda document: _sort_key(_get_path(document, field)), reverse=direction < 0)
+    return documents
+
+
+def _apply_update(document: dict[str, Any], update: dict[str, Any], *, inserting: bool) -> None:
+    for operator, changes in update.items():
+        if operator == "$set" or (operator == "$setOnInsert" and inserting):
+            for path, value in changes.items():
+                _set_path(document, path, copy.deepcopy(value))
+        elif operator == "$unset":
+            for path in changes:
+                _unset_path(document, path)
+        elif operator == "$inc":
+            for path, amount in changes.items():
+                current = _get_path(document, path)
+                _set_path(document, path, (0 if current is _MISSING else current) + amount)
+        elif operator != "$setOnInsert":
+            raise NotImplementedError(f"Operador de atualização não suportado no backend em memória: {operator}")
+
+
+def _upsert_seed(query: dict[str, Any]) -> dict[str, Any]:
+    seed: dict[str, Any] = {}
+    for key, value in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(value, dict) and any(str(item).startswith("$") for item in value):
+            if "$eq" in value:
+                _set_path(seed, key, copy.deepcopy(value["$eq"]))
+            continue
+        _set_path(seed, key, copy.deepcopy(value))
+    return seed
+
+
+# --- AGREGAÇÃO ----------------------------------------------------------------
+def _to_string(value: Any) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _evaluate(expression: Any, document: dict[str, Any]) -> Any:
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get_path(document, expression[1:])
+    if isinstance(expression, list):
+        return [_evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) == 1 and next(iter(expression)).startswith("$"):
+        operator, arguments = next(iter(expression.items()))
+        values = [_evaluate(item, document) for item in (arguments if isinstance(arguments, list) else [arguments])]
+        values = [None if value is _MISSING else value for value in values]
+        if operator == "$toString":
+            return _to_string(values[0])
+        if operator == "$toUpper":
+            return "" if values[0] is None else str(values[0]).upper()
+        if operator == "$trim":
+            text = (values[0] or {}).get("input")
+            return None if text is None else str(text).strip()
+        if operator == "$ifNull":
+            return next((value for value in values if value is not None), None)
+        if operator == "$cond":
+            return values[1] if values[0] else values[2]
+        if operator == "$add":
+            return sum(value or 0 for value in values)
+        if operator in {"$gt", "$gte", "$lt", "$lte"}:
+            return _compare(values[0], values[1], operator)
+        if operator == "$eq":
+            return _equals(values[0], values[1])
+        if operator == "$ne":
+            return not _equals(values[0], values[1])
+        raise NotImplementedError(f"Expressão não suportada no backend em memória: {operator}")
+    result = {}
+    for key, item in expression.items():
+        value = _evaluate(item, document)
+        if value is not _MISSING:
+            result[key] = value
+    return result
+
+
+def _group(documents: Iterable[dict[str, Any]], spec: dict[str, Any]) -> list[dict[str, Any]]:
+    groups: dict[Any, dict[str, Any]] = {}
+    for document in documents:
+        key_value = _evaluate(spec.get("_id"), document)
+        key_value = None if key_value is _MISSING else key_value
+        state = groups.setdefault(_hashable(key_value), {"_id": key_value, "__values": {}})
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            operator, expression = next(iter(accumulator.items()))
+            value = _evaluate(expression, document)
+            state["__values"].setdefault(name, (operator, []))[1].append(value)
+
+    rows = []
+    for state in groups.values():
+        row = {"_id": state["_id"]}
+        for name, (operator, values) in state["__values"].items():
+            present = [value for value in values if value is not _MISSING]
+            numbers = [value for value in present if isinstance(value, (int, float)) and not isinstance(value, bool)]
+            comparable = [value for value in present if value is not None]
+            if operator == "$sum":
+                row[name] = sum(numbers)
+            elif operator == "$avg":
+                row[name] = sum(numbers) / len(numbers) if numbers else None
+            elif operator == "$min":
+                row[name] = min(comparable, key=_sort_key) if comparable else None
+            elif operator == "$max":
+                row[name] = max(comparable, key=_sort_key) if comparable else None
+            elif operator == "$first":
+                row[name] = None if values[0] is _MISSING else values[0]
+            elif operator == "$last":
+                row[name] = None if values[-1] is _MISSING else values[-1]
+            elif operator == "$push":
+                row[name] = present
+            elif operator == "$addToSet":
+                unique: dict[Any, Any] = {}
+                for value in present:
+                    unique.setdefault(_hashable(value), value)
+                row[name] = list(unique.values())
+            else:
+                raise NotImplementedError(f"Acumulador não suportado no backend em memória: {operator}")
+        rows.append(row)
+    return rows
+
+
+def _project_stage(document: dict[str, Any], spec: dict[str, Any]) -> dict[str, Any]:
+    fields = {key: value for key, value in spec.items() if key != "_id"}
+    if fields and all(value in (0, False) for value in fields.values()):
+        return _project(document, spec)
+    result: dict[str, Any] = {}
+    if spec.get("_id", 1) not in (0, False) and "_id" in document:
+        result["_id"] = document["_id"] if spec.get("_id", 1) in (1, True) else _evaluate(spec["_id"], document)
+    for key, expression in fields.items():
+        value = _get_path(document, key) if expression in (1, True) else _evaluate(expression, document)
+        if value is not _MISSING:
+            _set_path(result, key, value)
+    return result
+
+
+def run_pipeline(documents: list[dict[str, Any]], pipeline: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    rows = documents
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            rows = [row for row in rows if matches(row, spec)]
+        elif name == "$sort":
+            rows = _sort_documents(list(rows), _normalize_sort(spec))
+        elif name == "$limit":
+            rows = rows[: int(spec)]
+        elif name == "$skip":
+            rows = rows[int(spec):]
+        elif name == "$group":
+            rows = _group(rows, spec)
+        elif name == "$project":
+            rows = [_project_stage(row, spec) for row in rows]
+        elif name == "$count":
+            rows = [{spec: len(rows)}] if rows else []
+        else:
+            raise NotImplementedError(f"Estágio não suportado no backend em memória: {name}")
+    return rows
+
+
+# --- CURSOR, COLEÇÃO E BANCO ------------------------------------------------
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", query: dict[str, Any] | None, projection: Any) -> None:
+        self.collection = collection
+        self.query = dict(query or {})
+        if projection is not None and not isinstance(projection, dict):
+            projection = {str(field): 1 for field in projection}
+        self.projection = projection
+        self.sorts: list[tuple[str, int]] = []
+        self.limit_value = 0
+        self.skip_value = 0
+        self._iterator: Iterator[dict[str, Any]] | None = None
+
+    def sort(self, key_or_list: Any, direction: Any = None) -> "MemoryCursor":
+        self.sorts = _normalize_sort(key_or_list, direction)
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self.limit_value = int(count or 0)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self.skip_value = int(count or 0)
+        return self
+
+    def batch_size(self, size: int) -> "MemoryCursor":
+        return self
+
+    def _materialize(self) -> list[dict[str, Any]]:
+        with self.collection.database.client.lock:
+            documents = [document for _, document in self.collection._candidates(self.query) if matches(document, self.query)]
+            if self.sorts:
+                documents = _sort_documents(documents, self.sorts)
+            documents = documents[self.skip_value:]
+            if self.limit_value:
+                documents = documents[: self.limit_value]
+            return [copy.deepcopy(_project(document, self.projection)) for document in documents]
+
+    def __iter__(self) -> "MemoryCursor":
+        return self
+
+    def __next__(self) -> dict[str, Any]:
+        if self._iterator is None:
+            self._iterator = iter(self._materialize())
+        return next(self._iterator)
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str) -> None:
+        self.database = database
+        self.name = name
+        self._documents: dict[Any, dict[str, Any]] = {}
+        self._indexes: dict[str, dict[str, Any]] = {}
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"name": self.name, "documents": self._documents, "indexes": self._indexes}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.database = None
+        self.name = state["name"]
+        self._documents = state["documents"]
+        self._indexes = state["indexes"]
+
+    # Índices ----------------------------------------------------------------
+    def create_index(self, keys: Any, **kwargs: Any) -> str:
+        fields = _normalize_sort(keys)
+        name = str(kwargs.get("name") or "_".join(f"{field}_{direction}" for field, direction in fields))
+        with self.database.client.lock:
+            unique = bool(kwargs.get("unique"))
+            entries: dict[Any, Any] = {}
+            if unique:
+                for document_id, document in self._documents.items():
+                    key = self._index_key(document, fields)
+                    if key in entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error index: {name}", 11000)
+                    entries[key] = document_id
+            # TTL (expireAfterSeconds) é aceito, mas não expira documentos em memória.
+            self._indexes[name] = {"key": fields, "unique": unique, "entries": entries}
+            self.database.client._touch()
+        return name
+
+    def index_information(self) -> dict[str, Any]:
+        info = {"_id_": {"key": [("_id", 1)]}}
+        for name, index in self._indexes.items():
+            info[name] = {"key": index["key"], "unique": index["unique"]}
+        return info
+
+    @staticmethod
+    def _index_key(document: dict[str, Any], fields: list[tuple[str, int]]) -> Any:
+        values = []
+        for field, _ in fields:
+            value = _get_path(document, field)
+            values.append(None if value is _MISSING else _hashable(value))
+        return tuple(values)
+
+    def _check_unique(self, document: dict[str, Any], replacing: Any = _MISSING) -> None:
+        document_id = document["_id"]
+        if replacing is _MISSING and document_id in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+        for name, index in self._indexes.items():
+            if not index["unique"]:
+                continue
+            owner = index["entries"].get(self._index_key(document, index["key"]), _MISSING)
+            if owner is not _MISSING and owner != document_id:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+
+    def _store(self, document: dict[str, Any]) -> None:
+        document_id = document["_id"]
+        previous = self._documents.get(document_id)
+        for index in self._indexes.values():
+            if not index["unique"]:
+                continue
+            if previous is not None:
+                index["entries"].pop(self._index_key(previous, index["key"]), None)
+            index["entries"][self._index_key(document, index["key"])] = document_id
+        self._documents[document_id] = document
+        self.database.client._touch()
+
+    def _remove(self, document_id: Any) -> None:
+        document = self._documents.pop(document_id)
+        for index in self._indexes.values():
+            if index["unique"]:
+                index["entries"].pop(self._index_key(document, index["key"]), None)
+        self.database.client._touch()
+
+    def _candidates(self, query: dict[str, Any] | None) -> Iterable[tuple[Any, dict[str, Any]]]:
+        # Busca por _id (igualdade ou $in) vai direto ao dicionário, como o índice _id_.
+        condition = (query or {}).get("_id", _MISSING)
+        if condition is not _MISSING and not isinstance(condition, dict):
+            keys = [condition]
+        elif isinstance(condition, dict) and set(condition) == {"$in"}:
+            keys = list(dict.fromkeys(condition["$in"]))
+        else:
+            return self._documents.items()
+        return [(key, self._documents[key]) for key in keys if key in self._documents]
+
+    def _matching_ids(self, query: dict[str, Any] | None, *, first: bool = False) -> list[Any]:
+        result = []
+        for document_id, document in self._candidates(query):
+            if matches(document, query):
+                result.append(document_id)
+                if first:
+                    break
+        return result
+
+    # Leitura ----------------------------------------------------------------
+    def find(self, filter: dict[str, Any] | None = None, projection: Any = None) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection)
+
+    def find_one(self, filter: dict[str, Any] | None = None, projection: Any = None) -> dict[str, Any] | None:
+        return next(iter(self.find(filter, projection).limit(1)), None)
+
+    def count_documents(self, filter: dict[str, Any] | None = None, *, limit: int | None = None, skip: int = 0) -> int:
+        with self.database.client.lock:
+            total = max(0, len(self._matching_ids(filter)) - int(skip or 0))
+        return min(total, int(limit)) if limit else total
+
+    def estimated_document_count(self) -> int:
+        return len(self._documents)
+
+    def distinct(self, key: str, filter: dict[str, Any] | None = None) -> list[Any]:
+        unique: dict[Any, Any] = {}
+        for document in self.find(filter):
+            value = _get_path(document, key)
+            for item in value if isinstance(value, list) else [value]:
+                if item is not _MISSING:
+                    unique.setdefault(_hashable(item), item)
+        return list(unique.values())
+
+    def aggregate(self, pipeline: list[dict[str, Any]], **kwargs: Any) -> Iterator[dict[str, Any]]:
+        with self.database.client.lock:
+            documents = [copy.deepcopy(document) for document in self._documents.values()]
+        return iter(run_pipeline(documents, list(pipeline or [])))
+
+    # Escrita ----------------------------------------------------------------
+    def _insert(self, document: dict[str, Any]) -> Any:
+        stored = copy.deepcopy(dict(document))
+        stored.setdefault("_id", ObjectId())
+        self._check_unique(stored)
+        self._store(stored)
+        document.setdefault("_id", stored["_id"])
+        return stored["_id"]
+
+    def insert_one(self, document: dict[str, Any]) -> InsertOneResult:
+        with self.database.client.lock:
+            return InsertOneResult(self._insert(document), True)
+
+    def insert_many(self, documents: Iterable[dict[str, Any]], ordered: bool = True) -> InsertManyResult:
+        documents = list(documents)
+        self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return InsertManyResult([document["_id"] for document in documents], True)
+
+    def _replace(self, query: dict[str, Any], replacement: dict[str, Any], upsert: bool) -> dict[str, Any]:
+        ids = self._matching_ids(query, first=True)
+        if ids:
+            stored = copy.deepcopy(dict(replacement))
+            stored["_id"] = ids[0]
+            self._check_unique(stored, replacing=ids[0])
+            modified = int(self._documents[ids[0]] != stored)
+            self._store(stored)
+            return {"n": 1, "nModified": modified}
+        if not upsert:
+            return {"n": 0, "nModified": 0}
+        stored = _upsert_seed(query)
+        stored.update(copy.deepcopy(dict(replacement)))
+        document_id = self._insert(stored)
+        return {"n": 1, "nModified": 0, "upserted": document_id}
+
+    def _update(self, query: dict[str, Any], update: dict[str, Any], upsert: bool, *, many: bool) -> dict[str, Any]:
+        ids = self._matching_ids(query, first=not many)
+        modified = 0
+        for document_id in ids:
+            current = self._documents[document_id]
+            updated = copy.deepcopy(current)
+            _apply_update(updated, update, inserting=False)
+            if updated != current:
+                self._check_unique(updated, replacing=document_id)
+                self._store(updated)
+                modified += 1
+        if ids or not upsert:
+            return {"n": len(ids), "nModified": modified}
+        stored = _upsert_seed(query)
+        _apply_update(stored, update, inserting=True)
+        document_id = self._insert(stored)
+        return {"n": 1, "nModified": 0, "upserted": document_id}
+
+    def _delete(self, query: dict[str, Any], *, many: bool) -> int:
+        ids = self._matching_ids(query, first=not many)
+        for document_id in ids:
+            self._remove(document_id)
+        return len(ids)
+
+    def replace_one(self, filter: dict[str, Any], replacement: dict[str, Any], upsert: bool = False) -> UpdateResult:
+        with self.database.client.lock:
+            return UpdateResult(self._replace(filter, replacement, upsert), True)
+
+    def update_one(self, filter: dict[str, Any], update: dict[str, Any], upsert: bool = False) -> UpdateResult:
+        with self.database.client.lock:
+            return UpdateResult(self._update(filter, update, upsert, many=False), True)
+
+    def update_many(self, filter: dict[str, Any], update: dict[str, Any], upsert: bool = False) -> UpdateResult:
+        with self.database.client.lock:
+            return UpdateResult(self._update(filter, update, upsert, many=True), True)
+
+    def delete_one(self, filter: dict[str, Any]) -> DeleteResult:
+        with self.database.client.lock:
+            return DeleteResult({"n": self._delete(filter, many=False)}, True)
+
+    def delete_many(self, filter: dict[str, Any]) -> DeleteResult:
+        with self.database.client.lock:
+            return DeleteResult({"n": self._delete(filter, many=True)}, True)
+
+    def bulk_write(self, requests: list[Any], ordered: bool = True, **kwargs: Any) -> BulkWriteResult:
+        result: dict[str, Any] = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+        }
+        with self.database.client.lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result["nInserted"] += 1
+                        continue
+                    if isinstance(request, ReplaceOne):
+                        raw = self._replace(request._filter, request._doc, request._upsert)
+                    elif isinstance(request, (UpdateOne, UpdateMany)):
+                        raw = self._update(request._filter, request._doc, request._upsert, many=isinstance(request, UpdateMany))
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                        continue
+                    else:
+                        raise NotImplementedError(f"Operação não suportada no backend em memória: {request!r}")
+                    if "upserted" in raw:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                    else:
+                        result["nMatched"] += raw["n"]
+                        result["nModified"] += raw["nModified"]
+                except DuplicateKeyError as exc:
+                    result["writeErrors"].append(
+                        {"index": index, "code": 11000, "errmsg": str(exc), "op": getattr(request, "_doc", None)}
+                    )
+                    if ordered:
+                        break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+
+class MemoryDatabase:
+    def __init__(self, client: "MemoryClient", name: str) -> None:
+        self.client = client
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        with self.client.lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = MemoryCollection(self, name)
+                self._collections[name] = collection
+            return collection
+
+    def get_collection(self, name: str) -> MemoryCollection:
+        return self[name]
+
+    def list_collection_names(self) -> list[str]:
+        return sorted(self._collections)
+
+    def drop_collection(self, name: str) -> None:
+        with self.client.lock:
+            self._collections.pop(str(name), None)
+            self.client._touch()
+
+    def command(self, name: Any, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    """Substituto do MongoClient; com `path`, persiste os bancos em arquivo."""
+
+    def __init__(self, path: str | None = None, *, flush_interval: float = FLUSH_INTERVAL_SECONDS) -> None:
+        self.path = path
+        self.flush_interval = float(flush_interval)
+        self.lock = threading.RLock()
+        self._databases: dict[str, MemoryDatabase] = {}
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        if path and os.path.exists(path):
+            self._load()
+        if path:
+            atexit.register(self.flush)
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        with self.lock:
+            database = self._databases.get(name)
+            if database is None:
+                database = MemoryDatabase(self, name)
+                self._databases[name] = database
+            return database
+
+    def get_database(self, name: str) -> MemoryDatabase:
+        return self[name]
+
+    @property
+    def admin(self) -> MemoryDatabase:
+        return self["admin"]
+
+    def _load(self) -> None:
+        with open(self.path, "rb") as handle:
+            stored: dict[str, dict[str, MemoryCollection]] = pickle.load(handle)
+        for database_name, collections in stored.items():
+            database = self[database_name]
+            for collection in collections.values():
+                collection.database = database
+                database._collections[collection.name] = collection
+
+    def _touch(self) -> None:
+        self._dirty = True
+        if self.path and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        with self.lock:
+            snapshot = {name: database._collections for name, database in self._databases.items()}
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "wb") as handle:
+                pickle.dump(snapshot, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.path)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
@@ -71,13 +71,18 @@ def get_terminais_parceiro(nome_parceiro):
         st.error(f"Erro ao buscar terminais do parceiro: {e}")
         return {}
 
-def registrar_terminal_parceiro(terminal, parceiro, data_ativacao):
+def registrar_terminais_parceiro(terminais, parceiro):
+    """Grava os novos terminais da cota em um único lote."""
     try:
-        db.collection("terminais_parceiros").document(terminal).set({
-            "parceiro": parceiro,
-            "data_ativacao": data_ativacao.strftime("%Y-%m-%d"),
-            "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+        batch = db.batch()
+        data_registro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for terminal, data_ativacao in terminais:
+            batch.set(db.collection("terminais_parceiros").document(terminal), {
+                "parceiro": parceiro,
+                "data_ativacao": data_ativacao.strftime("%Y-%m-%d"),
+                "data_registro": data_registro
+            })
+        batch.commit()
     except Exception as e:
         st.error(f"Erro ao registrar terminal no controle de cotas: {e}")
 
@@ -371,8 +376,7 @@ with tab1:
                     
                     if st.button("Gravar Novos Terminais na Cota e Exportar", type="primary"):
                         with st.spinner("Registrando terminais na cota..."):
-                            for terminal, data_ativacao in terminais_novos:
-                                registrar_terminal_parceiro(terminal, filial_selecionada, data_ativacao)
+                            registrar_terminais_parceiro(terminais_novos, filial_selecionada)
                         st.success("Terminais registrados no banco com sucesso! Gerando arquivos...")
                         st.rerun()
                 
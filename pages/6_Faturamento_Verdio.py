@@ -1,494 +1,27 @@
 import sys
 import os
 import re
-import io
-import zipfile
-import unicodedata
-import calendar
-from datetime import datetime
-from typing import Dict, List, Tuple, Optional
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_core.billing_engine import (
+    build_totals,
+    cached_prepare_report,
+    calculate_billing,
+    clean_export_df,
+    create_pdf_report,
+    file_digest,
+    money_br,
+    normalize_tipo,
+    split_categories,
+    to_excel_named_sheets,
+)
 from app_core.ui import apply_branding, render_sidebar
 
 import streamlit as st
 import pandas as pd
-import numpy as np
-from fpdf import FPDF
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
 
 import user_management_db as umdb
 
-MESES_PT = {
-    1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
-    7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro",
-}
-
-REQUIRED_COLUMNS = [
-    "Cliente", "Terminal", "Data Ativação", "Data Desativação", "Dias Ativos Mês",
-    "Suspenso Dias Mes", "Nº Equipamento", "Condição"
-]
-
-COLUMN_ALIASES = {
-    "equipamento": "Nº Equipamento",
-    "n equipamento": "Nº Equipamento",
-    "nº equipamento": "Nº Equipamento",
-    "numero equipamento": "Nº Equipamento",
-    "número equipamento": "Nº Equipamento",
-    "suspenso dias mes": "Suspenso Dias Mes",
-    "suspenso dias mês": "Suspenso Dias Mes",
-    "dias ativos mes": "Dias Ativos Mês",
-    "dias ativos mês": "Dias Ativos Mês",
-    "data ativacao": "Data Ativação",
-    "data ativação": "Data Ativação",
-    "data desativacao": "Data Desativação",
-    "data desativação": "Data Desativação",
-    "condicao": "Condição",
-    "condição": "Condição",
-    "cliente": "Cliente",
-    "terminal": "Terminal",
-    "placa": "Placa",
-    "modelo": "Modelo",
-}
-
-
-def _strip_accents(value: str) -> str:
-    return "".join(ch for ch in unicodedata.normalize("NFKD", value) if not unicodedata.combining(ch))
-
-
-def _canonical_key(value) -> str:
-    value = "" if pd.isna(value) else str(value)
-    value = value.strip().replace("\n", " ").replace("\r", " ")
-    value = re.sub(r"\s+", " ", value)
-    value = value.replace("º", "o").replace("ª", "a")
-    return _strip_accents(value).lower()
-
-
-def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    rename = {}
-    seen = set()
-    for col in df.columns:
-        raw = "" if pd.isna(col) else str(col).strip()
-        key = _canonical_key(raw)
-        canonical = COLUMN_ALIASES.get(key, raw)
-        if canonical.lower().startswith("unnamed") or canonical == "nan" or canonical == "":
-            canonical = f"Coluna_{len(seen) + 1}"
-        base = canonical
-        counter = 2
-        while canonical in seen:
-            canonical = f"{base}_{counter}"
-            counter += 1
-        rename[col] = canonical
-        seen.add(canonical)
-    return df.rename(columns=rename)
-
-
-def _normalize_equipment(value) -> str:
-    if pd.isna(value):
-        return ""
-    if isinstance(value, (int, np.integer)):
-        return str(int(value))
-    if isinstance(value, (float, np.floating)) and float(value).is_integer():
-        return str(int(value))
-    text = str(value).strip()
-    text = re.sub(r"\.0$", "", text)
-    return text
-
-
-def _normalize_tipo(value) -> str:
-    if pd.isna(value):
-        return ""
-    text = _strip_accents(str(value).strip().upper())
-    text = re.sub(r"\s+", " ", text)
-    if text in {"SATELITAL", "SATELLITE", "SATELITE"}:
-        return "SATELITE"
-    return text
-
-
-def _money_br(value) -> str:
-    try:
-        value = float(value)
-    except Exception:
-        value = 0.0
-    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-
-
-def _safe_float(value, default=0.0) -> float:
-    if value is None or pd.isna(value):
-        return float(default)
-    if isinstance(value, (int, float, np.integer, np.floating)):
-        return float(value)
-    text = str(value).strip()
-    if not text:
-        return float(default)
-    text = text.replace("R$", "").replace(" ", "")
-    if "," in text and "." in text:
-        text = text.replace(".", "").replace(",", ".")
-    elif "," in text:
-        text = text.replace(",", ".")
-    try:
-        return float(text)
-    except Exception:
-        return float(default)
-
-
-def sanitize_id(name: str) -> str:
-    return str(name).strip().replace("/", "-")
-
-
-def _read_raw_report(file_bytes: bytes, file_name: str = "") -> pd.DataFrame:
-    lower_name = (file_name or "").lower()
-    if lower_name.endswith(".csv"):
-        for encoding in ("utf-8-sig", "utf-8", "latin1"):
-            try:
-                return pd.read_csv(io.BytesIO(file_bytes), header=None, sep=None, engine="python", encoding=encoding, on_bad_lines="skip")
-            except Exception:
-                continue
-        return pd.read_csv(io.BytesIO(file_bytes), header=None, encoding="latin1", on_bad_lines="skip")
-    if lower_name.endswith(".xls"):
-        return pd.read_excel(io.BytesIO(file_bytes), header=None, engine="xlrd")
-    return pd.read_excel(io.BytesIO(file_bytes), header=None, engine="openpyxl")
-
-
-def _find_header_row(df_raw: pd.DataFrame) -> Optional[int]:
-    max_scan = min(60, len(df_raw))
-    for idx in range(max_scan):
-        values = [_canonical_key(v) for v in df_raw.iloc[idx].tolist()]
-        has_cliente = "cliente" in values
-        has_terminal = "terminal" in values
-        has_equip = any(v in {"equipamento", "n equipamento", "numero equipamento", "número equipamento"} for v in values)
-        if has_cliente and has_terminal and has_equip:
-            return idx
-    for idx in range(max_scan):
-        row_text = " ".join(str(v) for v in df_raw.iloc[idx].tolist())
-        key = _canonical_key(row_text)
-        if "cliente" in key and "terminal" in key:
-            return idx
-    return None
-
-
-def _extract_report_date(df_raw: pd.DataFrame) -> pd.Timestamp:
-    max_scan = min(40, len(df_raw))
-    date_regex = r"(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})"
-
-    for idx in range(max_scan):
-        row_text = " ".join(str(v) for v in df_raw.iloc[idx].tolist() if not pd.isna(v))
-        match = re.search(r"Data\s*Final\s*[:\-]?\s*" + date_regex, row_text, flags=re.IGNORECASE)
-        if match:
-            return pd.to_datetime(match.group(1).replace("-", "/"), dayfirst=True, errors="coerce")
-
-    for idx in range(max_scan):
-        row_text = " ".join(str(v) for v in df_raw.iloc[idx].tolist() if not pd.isna(v))
-        dates = re.findall(date_regex, row_text)
-        if dates:
-            # Quando a célula contém data inicial e final, o período correto para faturamento é a última data.
-            parsed = pd.to_datetime(dates[-1].replace("-", "/"), dayfirst=True, errors="coerce")
-            if pd.notna(parsed):
-                return parsed
-    return pd.NaT
-
-
-def _prepare_report_dataframe(file_bytes: bytes, file_name: str = "") -> Tuple[pd.DataFrame, pd.Timestamp]:
-    df_raw = _read_raw_report(file_bytes, file_name)
-    report_date = _extract_report_date(df_raw)
-    header_row_idx = _find_header_row(df_raw)
-    if header_row_idx is None:
-        raise ValueError("Não foi possível encontrar o cabeçalho do relatório. O arquivo precisa conter as colunas Cliente, Terminal e Equipamento/Nº Equipamento.")
-
-    df = df_raw.iloc[header_row_idx + 1:].copy()
-    df.columns = [str(c).strip() for c in df_raw.iloc[header_row_idx].tolist()]
-    df = _normalize_columns(df)
-
-    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing:
-        raise ValueError("Colunas obrigatórias ausentes no relatório: " + ", ".join(missing))
-
-    df = df.dropna(subset=["Terminal"])
-    df = df[df["Terminal"].astype(str).str.strip() != ""]
-    df = df[df["Cliente"].astype(str).str.strip().str.lower() != "cliente"]
-    df["Cliente"] = df["Cliente"].astype(str).str.strip()
-    df["Terminal"] = df["Terminal"].astype(str).str.strip()
-    df["Nº Equipamento"] = df["Nº Equipamento"].apply(_normalize_equipment)
-
-    for col in ["Data Ativação", "Data Desativação"]:
-        df[col] = pd.to_datetime(df[col], errors="coerce", dayfirst=True)
-    for col in ["Dias Ativos Mês", "Suspenso Dias Mes"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-
-    if pd.isna(report_date):
-        dates = pd.concat([df["Data Ativação"].dropna(), df["Data Desativação"].dropna()])
-        report_date = dates.max() if not dates.empty else pd.Timestamp(datetime.now())
-
-    return df, report_date
-
-
-def _prepare_inventory(tracker_inventory: List[dict]) -> pd.DataFrame:
-    df_inventory = pd.DataFrame(tracker_inventory or [])
-    if df_inventory.empty:
-        raise ValueError("Nenhum dado de estoque de rastreadores encontrado.")
-    df_inventory = _normalize_columns(df_inventory)
-    if "Nº Equipamento" not in df_inventory.columns:
-        raise ValueError("O estoque de rastreadores não possui a coluna 'Nº Equipamento'.")
-    if "Tipo" not in df_inventory.columns:
-        raise ValueError("O estoque de rastreadores não possui a coluna 'Tipo'.")
-    if "Modelo" not in df_inventory.columns:
-        df_inventory["Modelo"] = ""
-    df_inventory["Nº Equipamento"] = df_inventory["Nº Equipamento"].apply(_normalize_equipment)
-    df_inventory["Tipo"] = df_inventory["Tipo"].apply(_normalize_tipo)
-    df_inventory = df_inventory.drop_duplicates(subset=["Nº Equipamento"], keep="last")
-    return df_inventory
-
-
-def _calculate_billing(df: pd.DataFrame, df_inventory: pd.DataFrame, report_date: pd.Timestamp, prices_by_type: Dict[str, float]) -> Tuple[str, pd.DataFrame, List[str]]:
-    report_month = int(report_date.month)
-    report_year = int(report_date.year)
-    dias_no_mes = calendar.monthrange(report_year, report_month)[1]
-    month_start = pd.Timestamp(year=report_year, month=report_month, day=1)
-    month_end = pd.Timestamp(year=report_year, month=report_month, day=dias_no_mes)
-    periodo_relatorio = f"{MESES_PT[report_month]} de {report_year}"
-
-    df_merged = pd.merge(df, df_inventory[["Nº Equipamento", "Modelo", "Tipo"]], on="Nº Equipamento", how="left", suffixes=("", "_Estoque"))
-    if "Modelo_Estoque" in df_merged.columns:
-        df_merged["Modelo"] = df_merged["Modelo"].where(df_merged["Modelo"].notna() & (df_merged["Modelo"].astype(str).str.strip() != ""), df_merged["Modelo_Estoque"])
-        df_merged = df_merged.drop(columns=["Modelo_Estoque"])
-
-    df_merged["Tipo"] = df_merged["Tipo"].apply(_normalize_tipo)
-    not_found = sorted([x for x in df_merged.loc[df_merged["Tipo"].eq(""), "Nº Equipamento"].dropna().unique().tolist() if str(x).strip()])
-
-    normalized_prices = {_normalize_tipo(k): _safe_float(v) for k, v in (prices_by_type or {}).items()}
-    df_merged["Valor Unitario"] = df_merged["Tipo"].map(normalized_prices).fillna(0.0).astype(float)
-
-    ativacao = df_merged["Data Ativação"]
-    desativacao = df_merged["Data Desativação"]
-    condicao = df_merged["Condição"].astype(str).map(lambda x: _strip_accents(x).strip().lower())
-
-    ativado_no_mes = ativacao.notna() & (ativacao.dt.month == report_month) & (ativacao.dt.year == report_year)
-    desativado_no_mes = desativacao.notna() & (desativacao.dt.month == report_month) & (desativacao.dt.year == report_year)
-    suspenso = condicao.str.contains("suspenso", na=False) | (df_merged["Suspenso Dias Mes"] > 0)
-
-    df_merged["Categoria"] = np.select(
-        [ativado_no_mes & desativado_no_mes, desativado_no_mes, ativado_no_mes, suspenso],
-        ["Ativado e Desativado no Mês", "Desativado", "Ativado no Mês", "Suspenso"],
-        default="Cheio",
-    )
-
-    active_start = ativacao.where(ativacao.notna() & (ativacao > month_start), month_start)
-    active_end = desativacao.where(desativacao.notna() & (desativacao < month_end), month_end)
-
-    # Casos fora do mês não devem faturar dias negativos.
-    active_days = (active_end - active_start).dt.days + 1
-    active_days = active_days.where(ativacao.isna() | (ativacao <= month_end), 0)
-    active_days = active_days.where(desativacao.isna() | (desativacao >= month_start), 0)
-    active_days = pd.to_numeric(active_days, errors="coerce").fillna(0).clip(lower=0, upper=dias_no_mes)
-
-    suspended_days = pd.to_numeric(df_merged["Suspenso Dias Mes"], errors="coerce").fillna(0).clip(lower=0, upper=dias_no_mes)
-    df_merged["Dias Ativos Calculado"] = active_days.astype(int)
-    df_merged["Dias a Faturar"] = (active_days - suspended_days).clip(lower=0, upper=dias_no_mes).round(0).astype(int)
-    df_merged["Valor a Faturar"] = ((df_merged["Valor Unitario"] / dias_no_mes) * df_merged["Dias a Faturar"]).round(2)
-
-    # Itens sem tipo/preço devem aparecer para conferência, mas com faturamento zerado para evitar cobrança indevida.
-    df_merged.loc[df_merged["Tipo"].eq(""), "Valor a Faturar"] = 0.0
-
-    return periodo_relatorio, df_merged, not_found
-
-
-def _format_excel_sheet(ws):
-    header_fill = PatternFill("solid", fgColor="1F4E78")
-    header_font = Font(color="FFFFFF", bold=True)
-    thin = Side(style="thin", color="D9E2F3")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    ws.freeze_panes = "A2"
-    ws.auto_filter.ref = ws.dimensions
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        cell.border = border
-    for row in ws.iter_rows(min_row=2):
-        for cell in row:
-            cell.border = border
-            cell.alignment = Alignment(vertical="center", wrap_text=False)
-            if cell.column_letter:
-                header = ws.cell(row=1, column=cell.column).value
-                if header and "Valor" in str(header):
-                    cell.number_format = 'R$ #,##0.00'
-                if header and "Data" in str(header):
-                    cell.number_format = 'DD/MM/YYYY'
-    for col_idx, column_cells in enumerate(ws.columns, start=1):
-        max_len = 0
-        for cell in column_cells:
-            value = "" if cell.value is None else str(cell.value)
-            max_len = max(max_len, min(len(value), 60))
-        ws.column_dimensions[get_column_letter(col_idx)].width = max(12, min(max_len + 2, 45))
-
-
-def _clean_export_df(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    for col in ["Faturar", "Coluna_1", "Coluna_2", "Coluna_3"]:
-        if col in df.columns:
-            df = df.drop(columns=[col])
-    preferred = [
-        "Cliente", "Terminal", "Nº Equipamento", "Placa", "Modelo", "Tipo", "Condição", "Categoria",
-        "Data Ativação", "Data Desativação", "Dias Ativos Mês", "Dias Ativos Calculado",
-        "Suspenso Dias Mes", "Dias a Faturar", "Valor Unitario", "Valor a Faturar",
-    ]
-    cols = [c for c in preferred if c in df.columns] + [c for c in df.columns if c not in preferred]
-    return df[cols]
-
-
-def _to_excel_named_sheets(sheets: Dict[str, pd.DataFrame]) -> bytes:
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        for name, df in sheets.items():
-            safe_name = name[:31]
-            _clean_export_df(df).to_excel(writer, index=False, sheet_name=safe_name)
-        for ws in writer.book.worksheets:
-            _format_excel_sheet(ws)
-    return output.getvalue()
-
-
-def _pdf_bytes(pdf: FPDF) -> bytes:
-    data = pdf.output(dest="S")
-    if isinstance(data, (bytes, bytearray)):
-        return bytes(data)
-    return str(data).encode("latin-1", errors="replace")
-
-
-class PDF(FPDF):
-    def header(self):
-        try:
-            page_width = self.w - self.l_margin - self.r_margin
-            self.image("imgs/header1.png", x=self.l_margin, y=8, w=page_width)
-        except Exception:
-            self.set_font("Arial", "B", 20)
-            self.cell(0, 10, "Uzzipay Soluções", 0, 1, "L")
-            self.ln(15)
-
-    def footer(self):
-        try:
-            self.set_y(-35)
-            page_width = self.w - self.l_margin - self.r_margin
-            self.image("imgs/footer1.png", x=self.l_margin, y=self.get_y(), w=page_width)
-        except Exception:
-            self.set_y(-15)
-            self.set_font("Arial", "I", 8)
-            self.cell(0, 10, f"Página {self.page_no()}", 0, 0, "C")
-
-
-def create_pdf_report(nome_cliente, periodo, totais, df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados=None):
-    df_ativados_desativados = df_ativados_desativados if df_ativados_desativados is not None else pd.DataFrame()
-    pdf = PDF(orientation="L")
-    pdf.set_margins(10, 40, 10)
-    pdf.set_top_margin(40)
-    pdf.set_auto_page_break(auto=True, margin=35)
-    pdf.add_page()
-
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Resumo do Faturamento", 0, 1, "C")
-    pdf.ln(4)
-    pdf.set_font("Arial", "", 11)
-    pdf.cell(0, 7, f"Cliente: {nome_cliente}", 0, 1, "L")
-    pdf.cell(0, 7, f"Período: {periodo}", 0, 1, "L")
-    pdf.ln(4)
-
-    table_width = pdf.w - pdf.l_margin - pdf.r_margin
-    col_width = table_width / 5
-    pdf.set_font("Arial", "B", 9)
-    for title in ["Nº Fat. Cheio", "Nº Fat. Proporcional", "Nº Suspensos", "Total GPRS", "Total Satelitais"]:
-        pdf.cell(col_width, 8, title, 1, 0, "C")
-    pdf.ln()
-    pdf.set_font("Arial", "", 9)
-    for value in [totais.get("terminais_cheio", 0), totais.get("terminais_proporcional", 0), totais.get("terminais_suspensos", 0), totais.get("terminais_gprs", 0), totais.get("terminais_satelitais", 0)]:
-        pdf.cell(col_width, 8, str(value), 1, 0, "C")
-    pdf.ln(10)
-
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(table_width / 2, 8, "Faturamento Cheio", 1, 0, "C")
-    pdf.cell(table_width / 2, 8, "Faturamento Proporcional", 1, 1, "C")
-    pdf.set_font("Arial", "", 11)
-    pdf.cell(table_width / 2, 8, _money_br(totais.get("cheio", 0)), 1, 0, "C")
-    pdf.cell(table_width / 2, 8, _money_br(totais.get("proporcional", 0)), 1, 1, "C")
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, f"FATURAMENTO TOTAL: {_money_br(totais.get('geral', 0))}", 1, 1, "C")
-    pdf.ln(6)
-
-    def draw_table(title, df, col_widths, available_cols):
-        if df is None or df.empty:
-            return
-        if pdf.get_y() > pdf.h - 65:
-            pdf.add_page()
-        pdf.set_font("Arial", "B", 11)
-        pdf.cell(0, 8, title, 0, 1, "L")
-        cols = [c for c in available_cols if c in df.columns]
-        pdf.set_font("Arial", "B", 7)
-        for col in cols:
-            pdf.cell(col_widths.get(col, 20), 7, col, 1, 0, "C")
-        pdf.ln()
-        pdf.set_font("Arial", "", 6)
-        for _, row in df.iterrows():
-            if pdf.get_y() > pdf.h - 42:
-                pdf.add_page()
-                pdf.set_font("Arial", "B", 7)
-                for col in cols:
-                    pdf.cell(col_widths.get(col, 20), 7, col, 1, 0, "C")
-                pdf.ln()
-                pdf.set_font("Arial", "", 6)
-            for col in cols:
-                value = row.get(col, "")
-                if pd.isna(value):
-                    text = ""
-                elif "Data" in col:
-                    text = pd.to_datetime(value).strftime("%d/%m/%Y") if pd.notna(pd.to_datetime(value, errors="coerce")) else ""
-                elif "Valor" in col:
-                    text = _money_br(value)
-                else:
-                    text = str(value)[:38]
-                pdf.cell(col_widths.get(col, 20), 6, text, 1, 0, "C")
-            pdf.ln()
-        pdf.ln(4)
-
-    widths_cheio = {"Terminal": 35, "Nº Equipamento": 34, "Placa": 25, "Modelo": 45, "Tipo": 22, "Dias a Faturar": 24, "Valor Unitario": 28, "Valor a Faturar": 30}
-    cols_cheio = list(widths_cheio.keys())
-    widths_prop = {"Terminal": 24, "Nº Equipamento": 26, "Modelo": 32, "Tipo": 18, "Data Ativação": 24, "Data Desativação": 24, "Dias Ativos Calculado": 25, "Suspenso Dias Mes": 24, "Dias a Faturar": 22, "Valor Unitario": 26, "Valor a Faturar": 28}
-    cols_prop = list(widths_prop.keys())
-    draw_table("Detalhamento do Faturamento Cheio", df_cheio, widths_cheio, cols_cheio)
-    draw_table("Detalhamento Proporcional - Ativações no Mês", df_ativados, widths_prop, cols_prop)
-    draw_table("Detalhamento Proporcional - Desativações no Mês", df_desativados, widths_prop, cols_prop)
-    draw_table("Detalhamento Proporcional - Ativados e Desativados no Mês", df_ativados_desativados, widths_prop, cols_prop)
-    draw_table("Detalhamento dos Terminais Suspensos", df_suspensos, widths_prop, cols_prop)
-
-    return _pdf_bytes(pdf)
-
-
-def split_categories(df_aprovado: pd.DataFrame):
-    df_cheio = df_aprovado[df_aprovado["Categoria"] == "Cheio"].copy()
-    df_ativados = df_aprovado[df_aprovado["Categoria"] == "Ativado no Mês"].copy()
-    df_desativados = df_aprovado[df_aprovado["Categoria"] == "Desativado"].copy()
-    df_ativados_desativados = df_aprovado[df_aprovado["Categoria"] == "Ativado e Desativado no Mês"].copy()
-    df_suspensos = df_aprovado[df_aprovado["Categoria"] == "Suspenso"].copy()
-    return df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados
-
-
-def proportional_categories() -> List[str]:
-    return ["Ativado no Mês", "Desativado", "Ativado e Desativado no Mês", "Suspenso"]
-
-
-def build_totals(df_aprovado: pd.DataFrame) -> dict:
-    df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados = split_categories(df_aprovado)
-    total_cheio = float(df_cheio["Valor a Faturar"].sum())
-    total_prop = float(df_aprovado[df_aprovado["Categoria"].isin(proportional_categories())]["Valor a Faturar"].sum())
-    return {
-        "cheio": total_cheio,
-        "proporcional": total_prop,
-        "geral": total_cheio + total_prop,
-        "terminais_cheio": int(len(df_cheio)),
-        "terminais_proporcional": int(len(df_aprovado[df_aprovado["Categoria"].isin(["Ativado no Mês", "Desativado", "Ativado e Desativado no Mês"])])),
-        "terminais_suspensos": int(len(df_suspensos)),
-        "terminais_gprs": int(len(df_aprovado[df_aprovado["Tipo"] == "GPRS"])),
-        "terminais_satelitais": int(len(df_aprovado[df_aprovado["Tipo"] == "SATELITE"])),
-    }
-
 # --- 1. CONFIGURAÇÃO E AUTENTICAÇÃO ---
 st.set_page_config(layout="wide", page_title="Verdio Faturamento", page_icon="imgs/v-c.png")
 apply_branding()
@@ -500,12 +33,12 @@ render_sidebar()
 
 
 @st.cache_data(show_spinner=False)
-def processar_planilha_faturamento(file_bytes, tracker_inventory, prices, file_name="relatorio.xlsx"):
+def processar_planilha_faturamento(digest, inventory_version, prices, file_name="relatorio.xlsx", _file_bytes=b"", _inventory=None):
+    # Bytes e estoque não entram no hash do st.cache_data: valem o SHA-256 e a versão do estoque.
     try:
-        df, report_date = _prepare_report_dataframe(file_bytes, file_name)
+        df, report_date = cached_prepare_report(_file_bytes, file_name, digest)
         nome_cliente = str(df["Cliente"].dropna().iloc[0]).strip() if not df["Cliente"].dropna().empty else "Cliente não identificado"
-        df_inventory = _prepare_inventory(tracker_inventory)
-        periodo_relatorio, df_final, not_found_equip = _calculate_billing(df, df_inventory, report_date, prices)
+        periodo_relatorio, df_final, not_found_equip = calculate_billing(df, _inventory, report_date, prices)
         return nome_cliente, periodo_relatorio, df_final, not_found_equip, None
     except Exception as e:
         return None, None, None, [], f"Ocorreu um erro ao processar a planilha: {e}"
@@ -519,7 +52,7 @@ def to_excel(df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_de
         "Ativados e Desativados": df_ativados_desativados if df_ativados_desativados is not None else pd.DataFrame(),
         "Suspensos Prop.": df_suspensos,
     }
-    return _to_excel_named_sheets(sheets)
+    return to_excel_named_sheets(sheets)
 
 
 # --- 4. INPUTS DE CONFIGURAÇÃO ---
@@ -534,7 +67,7 @@ for equip_type in sorted(pricing_config.keys()):
     val = default_prices.get(equip_type, 0.0)
     if isinstance(val, dict):
         val = val.get("price1", 0.0)
-    prices[_normalize_tipo(equip_type)] = st.sidebar.number_input(f"Preço {_normalize_tipo(equip_type)}", min_value=0.0, value=float(val), format="%.2f")
+    prices[normalize_tipo(equip_type)] = st.sidebar.number_input(f"Preço {normalize_tipo(equip_type)}", min_value=0.0, value=float(val), format="%.2f")
 
 # --- 5. UPLOAD DO FICHEIRO ---
 st.subheader("Carregamento do Relatório de Terminais")
@@ -544,13 +77,25 @@ st.markdown("---")
 
 # --- 6. ANÁLISE E EXIBIÇÃO ---
 if uploaded_file:
-    tracker_inventory = umdb.get_tracker_inventory()
-    if not tracker_inventory:
+    try:
+        inventory = umdb.get_tracker_inventory_index()
+    except ValueError as exc:
+        st.error(str(exc))
+        st.stop()
+    if inventory is None:
         st.warning("⚠️ Nenhum dado de estoque de rastreadores encontrado.")
         st.stop()
 
+    # SHA-256 calculado uma vez por envio, não a cada reexecução da página.
+    if st.session_state.get("billing_upload_digest", (None,))[0] != uploaded_file.file_id:
+        st.session_state.billing_upload_digest = (uploaded_file.file_id, file_digest(uploaded_file.getvalue()))
     nome_cliente, periodo_relatorio, df_final, not_found, error = processar_planilha_faturamento(
-        uploaded_file.getvalue(), tracker_inventory, prices, uploaded_file.name
+        st.session_state.billing_upload_digest[1],
+        inventory.version,
+        prices,
+        uploaded_file.name,
+        _file_bytes=uploaded_file.getvalue(),
+        _inventory=inventory,
     )
 
     if error:
@@ -566,7 +111,7 @@ if uploaded_file:
                 st.info(f"💡 Encontramos os valores utilizados no último faturamento para **{nome_cliente}**.")
                 cols = st.columns(len(last_prices) + 1)
                 for i, (p_type, p_val) in enumerate(last_prices.items()):
-                    cols[i].metric(f"Último Preço {p_type}", _money_br(p_val))
+                    cols[i].metric(f"Último Preço {p_type}", money_br(p_val))
                 if cols[len(last_prices)].button("Aplicar valores e recalcular"):
                     st.session_state["prices_to_apply"] = last_prices
                     st.rerun()
@@ -600,7 +145,7 @@ if uploaded_file:
             key="editor_revisao_terminais_verdio",
         )
 
-        df_aprovado = edited_df[edited_df["Faturar"] == True].copy()
+        df_aprovado = edited_df[edited_df["Faturar"] == True]
         df_cheio, df_ativados, df_desativados, df_suspensos, df_ativados_desativados = split_categories(df_aprovado)
         totais = build_totals(df_aprovado)
         num_prop = totais["terminais_proporcional"]
@@ -616,15 +161,15 @@ if uploaded_file:
         c4.metric("Total GPRS", totais["terminais_gprs"])
         c5.metric("Total Satelitais", totais["terminais_satelitais"])
         c1, c2, c3 = st.columns(3)
-        c1.success(f"**Faturamento (Cheio):** {_money_br(totais['cheio'])}")
-        c2.warning(f"**Faturamento (Proporcional):** {_money_br(totais['proporcional'])}")
-        c3.info(f"**FATURAMENTO TOTAL:** {_money_br(totais['geral'])}")
+        c1.success(f"**Faturamento (Cheio):** {money_br(totais['cheio'])}")
+        c2.warning(f"**Faturamento (Proporcional):** {money_br(totais['proporcional'])}")
+        c3.info(f"**FATURAMENTO TOTAL:** {money_br(totais['geral'])}")
 
         st.markdown("---")
         st.subheader("Ações Finais")
 
         cols_to_save = ["Terminal", "Nº Equipamento", "Placa", "Frota", "Modelo", "Tipo", "Condição", "Categoria", "Data Ativação", "Data Desativação", "Dias Ativos Mês", "Dias Ativos Calculado", "Suspenso Dias Mes", "Dias a Faturar", "Valor Unitario", "Valor a Faturar"]
-        detalhes_itens = _clean_export_df(df_aprovado)[[c for c in cols_to_save if c in df_aprovado.columns]].to_dict(orient="records")
+        detalhes_itens = clean_export_df(df_aprovado)[[c for c in cols_to_save if c in df_aprovado.columns]].to_dict(orient="records")
         log_data = {
             "cliente": nome_cliente,
             "periodo_relatorio": periodo_relatorio,
@@ -663,14 +208,14 @@ if uploaded_file:
         st.markdown("---")
         cols_to_show = ["Terminal", "Nº Equipamento", "Modelo", "Tipo", "Data Ativação", "Data Desativação", "Dias Ativos Calculado", "Suspenso Dias Mes", "Dias a Faturar", "Valor Unitario", "Valor a Faturar"]
         with st.expander("Detalhamento do Faturamento Cheio"):
-            st.dataframe(_clean_export_df(df_cheio)[[c for c in cols_to_show if c in df_cheio.columns]], use_container_width=True, hide_index=True)
+            st.dataframe(clean_export_df(df_cheio)[[c for c in cols_to_show if c in df_cheio.columns]], use_container_width=True, hide_index=True)
         with st.expander("Detalhamento Proporcional - Ativações no Mês"):
-            st.dataframe(_clean_export_df(df_ativados)[[c for c in cols_to_show if c in df_ativados.columns]], use_container_width=True, hide_index=True)
+            st.dataframe(clean_export_df(df_ativados)[[c for c in cols_to_show if c in df_ativados.columns]], use_container_width=True, hide_index=True)
         with st.expander("Detalhamento Proporcional - Desativações no Mês"):
-            st.dataframe(_clean_export_df(df_desativados)[[c for c in cols_to_show if c in df_desativados.columns]], use_container_width=True, hide_index=True)
+            st.dataframe(clean_export_df(df_desativados)[[c for c in cols_to_show if c in df_desativados.columns]], use_container_width=True, hide_index=True)
         with st.expander("Detalhamento Proporcional - Ativados e Desativados no Mês"):
-            st.dataframe(_clean_export_df(df_ativados_desativados)[[c for c in cols_to_show if c in df_ativados_desativados.columns]], use_container_width=True, hide_index=True)
+            st.dataframe(clean_export_df(df_ativados_desativados)[[c for c in cols_to_show if c in df_ativados_desativados.columns]], use_container_width=True, hide_index=True)
         with st.expander("Detalhamento dos Terminais Suspensos"):
-            st.dataframe(_clean_export_df(df_suspensos)[[c for c in cols_to_show if c in df_suspensos.columns]], use_container_width=True, hide_index=True)
+            st.dataframe(clean_export_df(df_suspensos)[[c for c in cols_to_show if c in df_suspensos.columns]], use_container_width=True, hide_index=True)
 else:
     st.info("Aguardando o carregamento do relatório para iniciar a análise.")
@@ -9,7 +9,7 @@ import streamlit as st
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from app_core.auth import is_admin
-from app_core.ui import apply_branding, render_sidebar
+from app_core.ui import apply_branding, pager_state, render_pager, render_sidebar
 import user_management_db as umdb
 
 st.set_page_config(layout="wide", page_title="Histórico de Faturamento", page_icon="📜")
@@ -83,16 +83,12 @@ def _format_items(items: list[dict]) -> pd.DataFrame:
     return frame[cols] if cols else frame
 
 
-history = umdb.get_billing_history(limit=20000)
-runs = umdb.get_billing_runs(limit=20000)
+overview = umdb.get_billing_history_overview()
 
 metric_1, metric_2, metric_3 = st.columns(3)
-metric_1.metric("Cliente/mês vigentes", len(history))
-metric_2.metric("Revisões imutáveis", len(runs))
-metric_3.metric(
-    "Clientes no histórico",
-    len({str(item.get("cliente") or "").strip() for item in history if str(item.get("cliente") or "").strip()}),
-)
+metric_1.metric("Cliente/mês vigentes", overview["records"])
+metric_2.metric("Revisões imutáveis", overview["runs"])
+metric_3.metric("Clientes no histórico", overview["clients"])
 
 if is_admin():
     with st.expander("Manutenção da base analítica", expanded=False):
@@ -108,9 +104,7 @@ if is_admin():
                     f"legados: {result['legacy']} | falhas: {result['failed']}."
                 )
 
-        historical_periods = sorted(
-            {str(item.get("periodo_relatorio") or "").strip() for item in history if str(item.get("periodo_relatorio") or "").strip()}
-        )
+        historical_periods = overview["periods"]
         if historical_periods:
             st.markdown("#### Confirmar fechamento de mês histórico")
             st.caption(
@@ -128,36 +122,31 @@ if is_admin():
                 "Registrar fechamento histórico",
                 disabled=not selected_close_period or not confirm_close,
             ):
-                period_records = [
-                    item for item in history if str(item.get("periodo_relatorio") or "").strip() == selected_close_period
-                ]
-                total_terminals = 0
-                total_revenue = 0.0
-                for item in period_records:
-                    details = item.get("itens_detalhados")
-                    if isinstance(details, list) and details:
-                        total_terminals += len(details)
-                    else:
-                        total_terminals += int(item.get("terminais_cheio", 0) or 0)
-                        total_terminals += int(item.get("terminais_proporcional", 0) or 0)
-                        total_terminals += int(item.get("terminais_suspensos", 0) or 0)
-                    total_revenue += float(item.get("valor_total", 0) or 0)
-                if umdb.close_billing_month(
+                period_totals = umdb.get_billing_period_totals(selected_close_period)
+                if period_totals is not None and umdb.close_billing_month(
                     selected_close_period,
-                    total_clientes=len(period_records),
-                    total_terminais=total_terminals,
-                    faturamento_total=total_revenue,
+                    total_clientes=period_totals["clientes"],
+                    total_terminais=period_totals["terminais"],
+                    faturamento_total=period_totals["faturamento"],
                 ):
                     st.success(f"{selected_close_period} marcado como fechado para análise comercial.")
 
 st.markdown("---")
 tab_current, tab_runs = st.tabs(["Faturamento vigente", "Revisões imutáveis"])
 
+PAGE_SIZE = 50
+
 with tab_current:
-    if not history:
+    history_pager = pager_state("history_pager")
+    history_page = umdb.get_billing_history_page(
+        PAGE_SIZE,
+        after=history_pager["after"],
+        before=history_pager["before"],
+    )
+    if not history_page["items"]:
         st.info("Nenhum histórico de faturamento encontrado.")
     else:
-        df = pd.DataFrame(history)
+        df = pd.DataFrame(history_page["items"])
         df = _to_datetime_text(df, "data_geracao", "Data Geração")
         if "revision" not in df.columns:
             df["revision"] = 1
@@ -206,13 +195,14 @@ with tab_current:
             hide_index=True,
             selection_mode="single-row",
             on_select="rerun",
-            key="billing_current_table",
+            key=f"billing_current_table_{history_pager['page']}",
         )
+        render_pager("history_pager", history_page)
 
         selected_rows = event.selection.get("rows", [])
         if selected_rows:
             selected_id = df_display.iloc[selected_rows[0]].get("_id")
-            selected = next((item for item in history if item.get("_id") == selected_id), None)
+            selected = umdb.get_billing_history_entry(str(selected_id)) if selected_id else None
             if selected:
                 st.subheader(
                     f"Detalhamento: {selected.get('cliente', '')} — {selected.get('periodo_relatorio', '')}"
@@ -256,13 +246,20 @@ with tab_current:
                     st.warning("Este registro é legado e não possui detalhamento item a item salvo.")
 
 with tab_runs:
-    if not runs:
+    runs_pager = pager_state("runs_pager")
+    runs_page = umdb.get_billing_runs_page(
+        PAGE_SIZE,
+        after=runs_pager["after"],
+        before=runs_pager["before"],
+    )
+    page_runs = runs_page["items"]
+    if not page_runs:
         st.info(
             "Ainda não há revisões imutáveis. Elas serão criadas automaticamente nos próximos "
             "faturamentos diferentes salvos após esta atualização."
         )
     else:
-        df_runs = pd.DataFrame(runs)
+        df_runs = pd.DataFrame(page_runs)
         df_runs = _to_datetime_text(df_runs, "data_geracao", "Data Geração")
         if "revision" not in df_runs.columns:
             df_runs["revision"] = 1
@@ -320,13 +317,14 @@ with tab_runs:
             hide_index=True,
             selection_mode="single-row",
             on_select="rerun",
-            key="billing_runs_table",
+            key=f"billing_runs_table_{runs_pager['page']}",
         )
+        render_pager("runs_pager", runs_page)
 
         selected_rows = event_runs.selection.get("rows", [])
         if selected_rows:
             run_id = df_run_display.iloc[selected_rows[0]].get("run_id")
-            selected = next((item for item in runs if item.get("run_id") == run_id), None)
+            selected = next((item for item in page_runs if item.get("run_id") == run_id), None)
             if selected and run_id:
                 st.subheader(
                     f"Revisão {selected.get('revision', 1)}: {selected.get('cliente', '')} — "
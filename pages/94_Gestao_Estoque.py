@@ -276,7 +276,6 @@ with st.expander("Atualizar Estoque via Planilha", expanded=True):
                     st.success(
                         f"{count} rastreador(es) foram salvos/atualizados."
                     )
-                    st.cache_data.clear()
                     st.rerun()
                 else:
                     st.error("Não foi possível atualizar o estoque.")
@@ -335,15 +334,15 @@ else:
             st.warning("Nenhuma alteração foi realizada.")
         else:
             with st.spinner("Aplicando alterações em massa..."):
-                success, failed = umdb.update_type_for_models(
+                updated, failed = umdb.update_type_for_models(
                     updates_to_perform
                 )
 
-            if success:
+            if updated:
                 st.success(
-                    f"{success} modelo(s) foram atualizados."
+                    f"{len(updated)} modelo(s) foram atualizados "
+                    f"({sum(item['modified'] for item in updated.values())} rastreador(es))."
                 )
-                st.cache_data.clear()
                 st.rerun()
 
             if failed:
@@ -0,0 +1,93 @@
+# pages/98_Desempenho_MongoDB.py
+import sys
+import os
+import pandas as pd
+import streamlit as st
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app_core.ui import apply_branding, render_sidebar
+from mongo_config import command_stats, connection_diagnostics
+import user_management_db as umdb
+
+st.set_page_config(layout="wide", page_title="Desempenho do MongoDB", page_icon="⏱️")
+apply_branding()
+
+# --- VERIFICAÇÃO DE LOGIN E PERMISSÃO ---
+if "user_info" not in st.session_state:
+    st.error("🔒 Acesso Negado! Por favor, faça login para visualizar esta página.")
+    st.stop()
+
+if st.session_state.get("role", "Usuário").lower() != "admin":
+    st.error("🚫 Você não tem permissão para acessar esta página. Apenas Administradores.")
+    st.stop()
+
+# --- BARRA LATERAL PADRONIZADA ---
+render_sidebar()
+
+st.title("⏱️ Desempenho do MongoDB")
+st.markdown(
+    "Latência por coleção e operação medida neste processo desde o último reinício, "
+    "para identificar as consultas que mais pesam no carregamento das páginas."
+)
+
+if st.sidebar.button("🧹 Zerar Estatísticas"):
+    command_stats.reset()
+
+diagnostics = connection_diagnostics()
+if not diagnostics.get("ok"):
+    st.error("Não foi possível acessar o MongoDB.")
+    st.write(diagnostics)
+    st.stop()
+
+stats_df = pd.DataFrame(diagnostics["command_stats"])
+read_cache = diagnostics["read_cache"]
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Comandos Medidos", int(stats_df["count"].sum()) if not stats_df.empty else 0)
+col2.metric("Tempo Total (s)", f"{stats_df['total_ms'].sum() / 1000:.2f}" if not stats_df.empty else "0.00")
+col3.metric(f"Lentos (≥ {diagnostics['slow_command_ms']:.0f} ms)", int(stats_df["slow"].sum()) if not stats_df.empty else 0)
+col4.metric("Cache de Leitura (acertos/falhas)", f"{read_cache['hits']}/{read_cache['misses']}")
+
+st.markdown("---")
+st.subheader("Latência por Operação")
+
+if stats_df.empty:
+    st.info("Nenhum comando registrado ainda neste processo.")
+else:
+    # Estimativa: os comandos rápidos são medidos por amostragem.
+    stats_df["MB"] = stats_df["bytes"] / (1024 * 1024)
+    st.dataframe(
+        stats_df.rename(
+            columns={
+                "collection": "Coleção",
+                "operation": "Operação",
+                "count": "Chamadas",
+                "failures": "Falhas",
+                "slow": "Lentas",
+                "p50_ms": "p50 (ms)",
+                "p95_ms": "p95 (ms)",
+                "max_ms": "Máx (ms)",
+                "avg_ms": "Média (ms)",
+                "total_ms": "Total (ms)",
+                "documents": "Documentos",
+            }
+        ).drop(columns=["bytes"]),
+        column_config={"MB": st.column_config.NumberColumn("MB (estimado)", format="%.2f")},
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    st.markdown("##### p50 e p95 por Operação (ms)")
+    chart_df = stats_df.head(15).copy()
+    chart_df.index = chart_df["collection"] + "." + chart_df["operation"]
+    st.bar_chart(chart_df[["p50_ms", "p95_ms"]])
+
+st.markdown("---")
+st.subheader("Comandos Lentos Recentes")
+
+slow_events = pd.DataFrame(umdb.get_perf_events(limit=100))
+if slow_events.empty:
+    st.info("Nenhum comando lento registrado.")
+else:
+    slow_events["timestamp"] = pd.to_datetime(slow_events["timestamp"], utc=True).dt.tz_convert("America/Manaus")
+    st.dataframe(slow_events, use_container_width=True, hide_index=True)
@@ -8,7 +8,7 @@ import streamlit as st
 import pytz
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app_core.ui import apply_branding, render_sidebar
+from app_core.ui import apply_branding, pager_state, render_pager, render_sidebar
 import user_management_db as umdb
 
 st.set_page_config(layout="wide", page_title="Logs do Sistema", page_icon="📋")
@@ -28,9 +28,14 @@ render_sidebar()
 
 # --- FUNÇÕES AUXILIARES ---
 @st.cache_data(ttl=300)
-def carregar_logs():
-    """Busca e cacheia os logs do sistema."""
-    return umdb.get_system_logs()
+def carregar_opcoes_filtro():
+    """Níveis e usuários existentes, agrupados no MongoDB."""
+    return umdb.get_system_logs_filter_options()
+
+@st.cache_data(ttl=300)
+def carregar_resumo(filters):
+    """Totais por nível/usuário dos logs filtrados, calculados no MongoDB."""
+    return umdb.get_system_logs_stats(**dict(filters))
 
 def to_csv(df):
     """Converte DataFrame para CSV para download."""
@@ -41,22 +46,17 @@ st.title("📋 Logs do Sistema")
 st.markdown("Registro detalhado de todas as ações importantes realizadas na plataforma.")
 
 if st.sidebar.button("🔄 Atualizar Logs"):
-    st.cache_data.clear()
+    carregar_opcoes_filtro.clear()
+    carregar_resumo.clear()
 
-logs_data = carregar_logs()
+filter_options = carregar_opcoes_filtro()
 
-if not logs_data:
+if not filter_options["levels"]:
     st.info("Nenhum log encontrado no sistema.")
     st.stop()
 
-df_logs = pd.DataFrame(logs_data)
-# Converte a coluna de timestamp para datetime com fuso horário correto (America/Manaus para RO)
-try:
-    ro_timezone = pytz.timezone('America/Manaus')
-    df_logs['timestamp'] = pd.to_datetime(df_logs['timestamp']).dt.tz_convert(ro_timezone)
-except Exception:
-    # Fallback caso a conversão de fuso falhe
-    df_logs['timestamp'] = pd.to_datetime(df_logs['timestamp'])
+# Fuso horário de exibição (America/Manaus para RO)
+ro_timezone = pytz.timezone('America/Manaus')
 
 
 # --- BARRA LATERAL DE FILTROS ---
@@ -71,49 +71,48 @@ end_date = st.sidebar.date_input("Data de Fim", today)
 search_term = st.sidebar.text_input("Buscar na Mensagem:")
 
 # 3. Filtros por Nível e Usuário
-levels = sorted(df_logs['level'].unique())
+levels = filter_options["levels"]
 selected_levels = st.sidebar.multiselect("Nível do Log", options=levels, default=list(levels))
 
-users = sorted(df_logs['user'].unique())
+users = filter_options["users"]
 selected_users = st.sidebar.multiselect("Usuário", options=users, default=list(users))
 
 # --- LÓGICA DE FILTRAGEM ---
-filtered_df = df_logs[
-    (df_logs['timestamp'].dt.date >= start_date) &
-    (df_logs['timestamp'].dt.date <= end_date) &
-    (df_logs['level'].isin(selected_levels)) &
-    (df_logs['user'].isin(selected_users))
-]
-
-if search_term:
-    filtered_df = filtered_df[filtered_df['message'].str.contains(search_term, case=False, na=False)]
+# Os filtros são aplicados no MongoDB; a página só recebe totais e a página exibida.
+period_start = ro_timezone.localize(datetime.combine(start_date, datetime.min.time()))
+period_end = ro_timezone.localize(datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+log_filters = {
+    "start": period_start,
+    "end": period_end,
+    "levels": list(selected_levels),
+    "users": list(selected_users),
+    "search": search_term or None,
+}
+log_stats = carregar_resumo(tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in log_filters.items()))
 
 st.markdown("---")
 
 # --- PAINEL DE RESUMO (DASHBOARD) ---
 st.subheader("Análise Rápida do Período")
 
-if not filtered_df.empty:
+if log_stats["total"]:
     col1, col2, col3 = st.columns(3)
     
     # Total de logs no período
-    col1.metric("Total de Logs Filtrados", len(filtered_df))
+    col1.metric("Total de Logs Filtrados", log_stats["total"])
 
     # Erros nas últimas 24h
     twenty_four_hours_ago = datetime.now(ro_timezone) - timedelta(hours=24)
-    errors_last_24h = df_logs[
-        (df_logs['level'] == 'ERROR') & 
-        (df_logs['timestamp'] > twenty_four_hours_ago)
-    ].shape[0]
+    errors_last_24h = umdb.count_system_logs(start=twenty_four_hours_ago, levels=['ERROR'])
     col2.metric("Erros (últimas 24h)", errors_last_24h)
     
     # Usuário mais ativo
-    most_active_user = filtered_df['user'].mode()[0] if not filtered_df['user'].empty else "N/A"
+    most_active_user = next(iter(log_stats["by_user"]), "N/A")
     col3.metric("Usuário Mais Ativo", most_active_user)
     
     # Gráfico de logs por nível
     st.markdown("##### Distribuição de Logs por Nível")
-    log_level_counts = filtered_df['level'].value_counts()
+    log_level_counts = pd.Series(log_stats["by_level"], name="count")
     st.bar_chart(log_level_counts)
 
 else:
@@ -123,35 +122,29 @@ else:
 st.markdown("---")
 
 # --- PAGINAÇÃO ---
+# Cada página é buscada no MongoDB por cursor (timestamp, _id), com os mesmos filtros.
 st.subheader("Registros Detalhados")
-if 'log_page' not in st.session_state:
-    st.session_state.log_page = 0
 
 ITEMS_PER_PAGE = 25
-start_idx = st.session_state.log_page * ITEMS_PER_PAGE
-end_idx = start_idx + ITEMS_PER_PAGE
-total_pages = (len(filtered_df) - 1) // ITEMS_PER_PAGE + 1
-
-paginated_df = filtered_df.iloc[start_idx:end_idx]
-
-col_a, col_b, col_c = st.columns([1, 3, 1])
-
-if col_a.button("⬅️ Página Anterior", disabled=(st.session_state.log_page == 0)):
-    st.session_state.log_page -= 1
-    st.rerun()
-
-col_b.markdown(f"<p style='text-align: center;'>Página {st.session_state.log_page + 1} de {total_pages}</p>", unsafe_allow_html=True)
-
-if col_c.button("Próxima Página ➡️", disabled=(st.session_state.log_page >= total_pages - 1)):
-    st.session_state.log_page += 1
-    st.rerun()
-
+total_pages = (log_stats["total"] - 1) // ITEMS_PER_PAGE + 1
+log_pager = pager_state(
+    "log_pager",
+    (start_date, end_date, tuple(selected_levels), tuple(selected_users), search_term),
+)
+log_page = umdb.get_system_logs_page(
+    ITEMS_PER_PAGE,
+    after=log_pager["after"],
+    before=log_pager["before"],
+    **log_filters,
+)
+render_pager("log_pager", log_page)
+st.caption(f"{total_pages} página(s) no total.")
 
-# --- EXIBIÇÃO DOS LOGS COM DETALHES EXPANSÍVEIS ---
-if paginated_df.empty and len(filtered_df) > 0:
-    st.warning("Página inválida. Retornando para a primeira página.")
-    st.session_state.log_page = 0
-    st.rerun()
+paginated_df = pd.DataFrame(log_page["items"])
+if paginated_df.empty:
+    st.info("Nenhum log encontrado nesta página.")
+else:
+    paginated_df['timestamp'] = pd.to_datetime(paginated_df['timestamp'], utc=True).dt.tz_convert(ro_timezone)
 
 for index, row in paginated_df.iterrows():
     st.markdown("---")
@@ -177,10 +170,18 @@ for index, row in paginated_df.iterrows():
             st.caption("Sem detalhes")
 
 # --- AÇÃO DE DOWNLOAD ---
+# O CSV só é montado quando solicitado, para não buscar todos os logs a cada interação.
 st.sidebar.markdown("---")
-st.sidebar.download_button(
-    label="📥 Baixar Logs Filtrados (CSV)",
-    data=to_csv(filtered_df),
-    file_name=f"logs_{start_date}_a_{end_date}.csv",
-    mime="text/csv",
-)
+if st.sidebar.button("📄 Preparar CSV dos Logs Filtrados"):
+    st.session_state.log_csv = (
+        log_pager["signature"],
+        to_csv(pd.DataFrame(umdb.get_system_logs(limit=10000, **log_filters))),
+    )
+prepared_csv = st.session_state.get("log_csv")
+if prepared_csv and prepared_csv[0] == log_pager["signature"]:
+    st.sidebar.download_button(
+        label="📥 Baixar Logs Filtrados (CSV)",
+        data=prepared_csv[1],
+        file_name=f"logs_{start_date}_a_{end_date}.csv",
+        mime="text/csv",
+    )
@@ -0,0 +1,29 @@
+"""Regrava os documentos de subcoleção com o _id prefixado pelo pai (`<pai>/<id>`).
+
+Rode uma vez após o deploy que introduziu o formato novo, com a mesma configuração
+de conexão do app (Secrets ou variáveis FINANCEIRO_MONGO_*):
+
+    python scripts/migrate_subcollection_ids.py
+
+Pode ser repetido: com o carimbo em `schema_migrations/subcollection_ids`, não varre nada.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    from mongo_config import get_mongo_database, migrate_subcollection_ids
+
+    moved = migrate_subcollection_ids(get_mongo_database())
+    print(f"{moved} documento(s) de subcoleção regravados.")
+
+
+if __name__ == "__main__":
+    main()
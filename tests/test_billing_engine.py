@@ -0,0 +1,147 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_core.billing_engine import (
+    InventoryIndex,
+    ParseCache,
+    bill_reports,
+    build_totals,
+    calculate_billing,
+    compute_totals,
+    concat_billing_frames,
+    frame_digest,
+    prepare_inventory,
+    zip_client_pdfs,
+)
+from app_core.billing_engine import parse_cache
+
+
+@pytest.fixture(autouse=True)
+def _local_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, "parse_cache", ParseCache(tmp_path))
+
+
+def _report():
+    return pd.DataFrame(
+        {
+            "Cliente": ["B", "A", "B", "A"],
+            "Terminal": ["t1", "t2", "t3", "t4"],
+            "Nº Equipamento": ["1", "2", "3", "9"],
+            "Data Ativação": pd.to_datetime([None, "2024-05-11", None, None]),
+            "Data Desativação": pd.to_datetime([None, None, "2024-05-15", None]),
+            "Condição": ["Ativo", "Ativo", "Ativo", "Ativo"],
+            "Suspenso Dias Mes": [0, 0, 0, 0],
+        }
+    )
+
+
+def _inventory():
+    return prepare_inventory(
+        [
+            {"Nº Equipamento": "1", "Modelo": "ST-310", "Tipo": "GPRS"},
+            {"Nº Equipamento": "2", "Modelo": "SmartOne", "Tipo": "Satelital"},
+            {"Nº Equipamento": "3", "Modelo": "ST-310", "Tipo": "GPRS"},
+        ]
+    )
+
+
+def test_calculate_billing_single_price_map():
+    periodo, frame, not_found = calculate_billing(_report(), _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    assert periodo == "Maio de 2024"
+    assert not_found == ["9"]
+    assert frame["Categoria"].tolist() == ["Cheio", "Ativado no Mês", "Desativado", "Cheio"]
+    assert frame["Valor a Faturar"].tolist() == [31.0, 0.0, 15.0, 0.0]
+    assert isinstance(frame["Categoria"].dtype, pd.CategoricalDtype)
+    assert frame["Dias a Faturar"].dtype == "int8"
+
+
+def test_calculate_billing_prices_by_client():
+    _, frame, _ = calculate_billing(
+        _report(),
+        _inventory(),
+        pd.Timestamp("2024-05-31"),
+        prices_by_client={"A": {"satelite": "62,00"}, "B": {"GPRS": 31}},
+    )
+    assert frame["Valor Unitario"].tolist() == [31.0, 62.0, 31.0, 0.0]
+    totals = build_totals(frame[frame["Cliente"] == "A"])
+    assert totals["geral"] == 42.0
+    assert totals["terminais_satelitais"] == 1
+
+
+def test_compute_totals_matches_build_totals_per_client():
+    _, frame, _ = calculate_billing(_report(), _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31, "SATELITE": 62})
+    totals = compute_totals(frame)
+    for cliente, df_cliente in frame.groupby("Cliente", observed=True):
+        assert totals.loc[cliente].to_dict() == pytest.approx(build_totals(df_cliente))
+    assert build_totals(frame.iloc[:0])["geral"] == 0.0
+
+
+def test_concat_billing_frames_keeps_categories():
+    _, first, _ = calculate_billing(_report().iloc[:2], _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    _, second, _ = calculate_billing(_report().iloc[2:], _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    combined = concat_billing_frames([first, second])
+    assert isinstance(combined["Cliente"].dtype, pd.CategoricalDtype)
+    assert combined["Categoria"].tolist() == ["Cheio", "Ativado no Mês", "Desativado", "Cheio"]
+
+
+def test_zip_of_multi_file_period_lists_clients_alphabetically():
+    report = _report().assign(Cliente=["Zeta", "Alpha", "Zeta", "Alpha"])
+    _, first, _ = calculate_billing(report.iloc[[0, 2]], _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    _, second, _ = calculate_billing(report.iloc[[1, 3]], _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    combined = concat_billing_frames([first, second])
+    assert first["Cliente"].cat.categories.tolist() == ["Zeta"]
+
+    names = zipfile.ZipFile(io.BytesIO(zip_client_pdfs(combined, "Maio de 2024"))).namelist()
+    assert names == ["Faturamento_Alpha.pdf", "Faturamento_Zeta.pdf"]
+
+
+def test_frame_digest_follows_rows_not_index():
+    _, frame, _ = calculate_billing(_report(), _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    assert frame_digest(frame) == frame_digest(frame.set_axis(range(10, 10 + len(frame))))
+    assert frame_digest(frame) != frame_digest(frame.iloc[1:])
+
+
+def test_inventory_index_lookup_keeps_report_order():
+    index = InventoryIndex.from_frame(_inventory(), version=3)
+    models, types = index.lookup(pd.Series(["3", "9", "1"]))
+    assert index.version == 3 and len(index) == 3
+    assert models[[0, 2]].tolist() == ["ST-310", "ST-310"] and pd.isna(models[1])
+    assert types.tolist()[::2] == ["GPRS", "GPRS"] and pd.isna(types[1])
+
+
+def test_bill_reports_reports_each_file():
+    csv = (
+        "Data Final: 31/05/2024;;;;;;;\n"
+        "Cliente;Terminal;Data Ativação;Data Desativação;Dias Ativos Mês;Suspenso Dias Mes;Nº Equipamento;Condição\n"
+        "A;t1;;;31;0;1;Ativo\n"
+    ).encode("utf-8")
+    files = [("vazio.csv", b""), ("maio.csv", csv)]
+    results = sorted(bill_reports(files, _inventory(), {"A": {"GPRS": 31}}, max_workers=1), key=lambda r: r.index)
+    assert results[0].error
+    assert results[1].periodo == "Maio de 2024"
+    assert results[1].frame["Valor a Faturar"].tolist() == [31.0]
+
+
+def test_zip_client_pdfs_reports_progress():
+    _, frame, _ = calculate_billing(_report(), _inventory(), pd.Timestamp("2024-05-31"), {"GPRS": 31})
+    progress = []
+    data = zip_client_pdfs(frame, "Maio de 2024", on_progress=lambda done, total, _: progress.append((done, total)))
+    names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+    assert names == [f"Faturamento_{c}.pdf" for c in sorted(frame["Cliente"].unique())]
+    assert progress[-1] == (len(names), len(names))
+
+
+def test_parse_cache_round_trip_and_eviction(tmp_path):
+    cache = ParseCache(tmp_path, max_mb=1)
+    frame = pd.DataFrame({"Placa": ["ABC1234", np.nan], "Dias Ativos Mês": [31.0, 2.0]})
+    cache.put("a" * 64, frame, pd.Timestamp("2024-05-31"))
+    cached, report_date = cache.get("a" * 64)
+    pd.testing.assert_frame_equal(cached, frame)
+    assert report_date == pd.Timestamp("2024-05-31")
+    cache.max_bytes = 1
+    cache.evict()
+    assert not list(cache.directory.glob("*.parquet"))
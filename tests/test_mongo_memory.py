@@ -0,0 +1,227 @@
+import pytest
+
+from mongo_config import (
+    CollectionVersions,
+    MongoBatchError,
+    MongoBufferedWriter,
+    MongoDatabaseCompat,
+    MongoReadCache,
+    migrate_subcollection_ids,
+)
+from mongo_memory import MemoryClient
+
+
+def _db(client=None):
+    return MongoDatabaseCompat((client or MemoryClient())["financeiro_teste"])
+
+
+def test_query_filters_sort_limit_and_projection():
+    db = _db()
+    for index in range(10):
+        db.collection("logs").document(f"log{index}").set({"level": "ERROR" if index % 3 == 0 else "INFO", "seq": index})
+
+    rows = list(
+        db.collection("logs")
+        .where("level", "in", ["ERROR"])
+        .where("seq", ">=", 3)
+        .order_by("seq", "DESCENDING")
+        .limit(2)
+        .select("seq")
+        .stream_rows()
+    )
+    assert rows == [{"_id": "log9", "seq": 9}, {"_id": "log6", "seq": 6}]
+    assert db.collection("logs").where("level", "!=", "ERROR").count() == 6
+
+
+def test_keyset_pages_cover_collection_once():
+    db = _db()
+    for index in range(25):
+        db.collection("history").document(f"h{index:02d}").set({"day": index // 4})
+
+    query = db.collection("history").order_by("day").order_by("_id")
+    seen, page = [], query.limit(10).get()
+    while page:
+        seen.extend(snapshot.id for snapshot in page)
+        page = query.start_after(page[-1]).limit(10).get()
+    assert seen == [f"h{index:02d}" for index in range(25)]
+
+
+def test_batch_respects_unique_index():
+    client = MemoryClient()
+    client["financeiro_teste"]["billing_history"].create_index(
+        [("cliente", 1), ("periodo_relatorio", 1)], unique=True, name="uniq_billing_current"
+    )
+    db = _db(client)
+    batch = db.batch()
+    batch.set(db.collection("billing_history").document("a"), {"cliente": "X", "periodo_relatorio": "Jan"})
+    batch.set(db.collection("billing_history").document("b"), {"cliente": "X", "periodo_relatorio": "Jan"})
+    with pytest.raises(MongoBatchError) as error:
+        batch.commit()
+    assert error.value.result.errors[0]["document_id"] == "b"
+    assert db.collection("billing_history").count() == 1
+
+
+def test_ordered_batch_stops_before_next_collection():
+    client = MemoryClient()
+    client["financeiro_teste"]["billing_history"].create_index([("cliente", 1)], unique=True, name="uniq_cliente")
+    db = _db(client)
+    batch = db.batch(ordered=True)
+    batch.set(db.collection("billing_history").document("a"), {"cliente": "X"})
+    batch.set(db.collection("billing_history").document("b"), {"cliente": "X"})
+    batch.set(db.collection("billing_runs").document("r"), {"cliente": "X"})
+    with pytest.raises(MongoBatchError):
+        batch.commit()
+    assert db.collection("billing_runs").count() == 0
+
+
+def test_collection_versions_are_shared_between_processes():
+    database = MemoryClient()["financeiro_teste"]
+    writer, reader = CollectionVersions(refresh_seconds=0), CollectionVersions(refresh_seconds=0)
+    writer.bind(database)
+    reader.bind(database)
+    before = reader.get("trackers")
+    writer.bump("trackers")
+    assert reader.get("trackers") != before
+    assert reader.get("settings") == (0, 0)
+
+
+def test_read_cache_expires_after_ttl():
+    loads = []
+    cache = MongoReadCache(ttl_seconds=0)
+    cache.get_or_load("k", [], lambda: loads.append(1) or [])
+    cache.get_or_load("k", [], lambda: loads.append(1) or [])
+    assert len(loads) == 2
+
+
+def test_subcollection_ids_do_not_collide_between_parents():
+    db = _db()
+    for run_id in ("run1", "run2"):
+        items = db.collection("billing_runs").document(run_id).collection("items")
+        items.document("000000").set({"item_index": 0, "run": run_id})
+
+    items = db.collection("billing_runs").document("run2").collection("items")
+    assert [snapshot.id for snapshot in items.stream()] == ["000000"]
+    assert items.document("000000").get().to_dict() == {"item_index": 0, "run": "run2"}
+
+
+def test_legacy_subcollection_ids_are_found_and_migrated():
+    db = _db()
+    raw = db.database["billing_runs__items"]
+    raw.insert_one({"_id": "000000", "item_index": 0, "__mongo_parent_id": "run1", "__mongo_parent_collection": "billing_runs"})
+    item = db.collection("billing_runs").document("run1").collection("items").document("000000")
+
+    assert item.get().to_dict() == {"item_index": 0}
+    item.update({"item_index": 1})
+    assert item.get().to_dict() == {"item_index": 1}
+
+    assert migrate_subcollection_ids(db.database) == 1
+    assert [document["_id"] for document in raw.find()] == ["run1/000000"]
+    assert item.get().to_dict() == {"item_index": 1}
+    assert migrate_subcollection_ids(db.database) == 0
+    assert db.database["schema_migrations"].find_one({"_id": "subcollection_ids"})["version"] == 1
+
+
+def test_group_by_aggregates():
+    db = _db()
+    for index, (model, kind) in enumerate([("ST-1", "GPRS"), ("ST-1", "GPRS"), ("SMART", "SATELITE")]):
+        db.collection("trackers").document(str(index)).set({"Modelo": model, "Tipo": kind, "valor": 10})
+
+    rows = db.collection("trackers").group_by("Modelo").agg(qtd=(None, "count"), total=("valor", "sum")).get()
+    assert sorted((row["Modelo"], row["qtd"], row["total"]) for row in rows) == [("SMART", 1, 10), ("ST-1", 2, 20)]
+
+
+def test_file_persistence_round_trip(tmp_path):
+    path = str(tmp_path / "store.pickle")
+    client = MemoryClient(path)
+    _db(client).collection("settings").document("pricing").set({"GPRS": 59.9})
+    client.flush()
+
+    reopened = _db(MemoryClient(path))
+    assert reopened.collection("settings").document("pricing").get().to_dict() == {"GPRS": 59.9}
+
+
+def test_buffered_writer_flushes_pending_documents():
+    db = _db()
+    writer = MongoBufferedWriter(lambda: db.collection("system_logs"), batch_size=50, interval_ms=10_000, max_queue=10)
+    for index in range(25):
+        writer.add({"message": f"evento {index}"})
+
+    assert writer.flush(timeout=5)
+    assert db.collection("system_logs").count() == 25
+
+
+def test_buffered_writer_copies_nested_details_on_add():
+    db = _db()
+    writer = MongoBufferedWriter(lambda: db.collection("system_logs"), interval_ms=10_000)
+    details = {"itens": [1, 2], "contexto": {"pagina": "5"}}
+    assert writer.add({"message": "evento", "details": details})
+    details["itens"].append(3)
+    details["contexto"]["pagina"] = "6"
+
+    assert writer.flush(timeout=5)
+    [row] = db.collection("system_logs").stream_rows(include_id=False)
+    assert row["details"] == {"itens": [1, 2], "contexto": {"pagina": "5"}}
+
+
+def test_unique_models_and_types_trims_and_keeps_first_tracker(monkeypatch):
+    import user_management_db
+
+    db = _db()
+    monkeypatch.setattr(user_management_db, "db", db)
+    rows = [(" ST-1", "gprs "), ("ST-1", "SATELITE"), ("SMART", None), (None, "GPRS")]
+    for index, (model, kind) in enumerate(rows):
+        db.collection("trackers").document(f"{index:03d}").set({"Modelo": model, "Tipo": kind})
+
+    assert user_management_db._unique_models_and_types.__wrapped__() == {"SMART": "", "ST-1": "GPRS"}
+
+
+def test_update_type_for_models_reports_server_counts(monkeypatch):
+    import user_management_db
+
+    db = _db()
+    monkeypatch.setattr(user_management_db, "db", db)
+    for index, model in enumerate(["ST-1", "ST-1", "SMART"]):
+        db.collection("trackers").document(f"{index:03d}").set({"Modelo": model, "Tipo": "GPRS"})
+
+    counts, failed = user_management_db.update_type_for_models({"ST-1": "satelite", "J16": "GPRS"})
+    assert counts == {"ST-1": {"matched": 2, "modified": 2}}
+    assert failed == ["J16"]
+    assert db.collection("trackers").where("Tipo", "==", "SATELITE").count() == 2
+
+
+def test_tracker_inventory_index_expires_after_ttl(monkeypatch):
+    import user_management_db
+
+    db = _db()
+    monkeypatch.setattr(user_management_db, "db", db)
+    monkeypatch.setattr(user_management_db, "_inventory_index", None)
+    db.collection("trackers").document("100").set({"Modelo": "ST-1", "Tipo": "GPRS"})
+
+    index = user_management_db.get_tracker_inventory_index()
+    assert list(index.equipment) == ["100"]
+    assert user_management_db.get_tracker_inventory_index() is index
+
+    # Gravação fora dos wrappers: só o prazo renova o índice.
+    db.database["trackers"].insert_one({"_id": "200", "Modelo": "SMART", "Tipo": "SATELITE"})
+    assert user_management_db.get_tracker_inventory_index() is index
+    monkeypatch.setattr(user_management_db, "READ_CACHE_TTL_SECONDS", 0)
+    assert sorted(user_management_db.get_tracker_inventory_index().equipment) == ["100", "200"]
+
+
+def test_get_all_keeps_input_order_and_marks_missing_ids():
+    db = _db()
+    for name in ("c1", "c2", "c3"):
+        db.collection("client_contracts").document(name).set({"cliente": name.upper(), "ativo": True})
+
+    snapshots = db.collection("client_contracts").get_all(["c3", "x", "c1", "c3", "c2"], projection=["cliente"], chunk_size=2)
+    assert [(snapshot.id, snapshot.exists) for snapshot in snapshots] == [
+        ("c3", True), ("x", False), ("c1", True), ("c3", True), ("c2", True)
+    ]
+    assert snapshots[0].to_dict() == {"cliente": "C3"}
+
+    items = db.collection("billing_runs").document("run1").collection("items")
+    items.document("000000").set({"item_index": 0})
+    db.database["billing_runs__items"].insert_one(
+        {"_id": "000001", "item_index": 1, "__mongo_parent_id": "run1", "__mongo_parent_collection": "billing_runs"}
+    )
+    assert [snapshot.to_dict() for snapshot in items.get_all(["000001", "000000"])] == [{"item_index": 1}, {"item_index": 0}]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from app_core.normalizers import (
+    canonical_key,
+    canonical_key_series,
+    normalize_equipment,
+    normalize_equipment_series,
+    normalize_tipo,
+    normalize_tipo_series,
+    safe_float,
+    safe_float_series,
+    strip_accents,
+    strip_accents_series,
+)
+
+
+def test_series_normalizers_match_scalar_rules():
+    values = pd.Series(
+        [None, np.nan, "", " 123.0 ", 123, 45.0, 1e16, 2.5, True, "nan", " Satélite ", "Nº  Equipamento", "Ελλάδα"],
+        dtype=object,
+    )
+    for scalar, vectorized in [
+        (normalize_equipment, normalize_equipment_series),
+        (normalize_tipo, normalize_tipo_series),
+        (canonical_key, canonical_key_series),
+    ]:
+        assert vectorized(values).tolist() == [scalar(value) for value in values]
+    text = values.dropna().astype(str)
+    assert strip_accents_series(text).tolist() == [strip_accents(value) for value in text]
+
+
+def test_safe_float_series_reads_brazilian_money():
+    values = pd.Series(["R$ 1.234,56", "59,9", 59.9, None, "abc", 7], dtype=object)
+    assert safe_float_series(values).tolist() == [1234.56, 59.9, 59.9, 0.0, 0.0, 7.0]
+    assert safe_float_series(values).tolist() == [safe_float(value) for value in values]
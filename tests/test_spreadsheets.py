@@ -0,0 +1,52 @@
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+
+from app_core import spreadsheets
+from app_core.spreadsheets import read_csv, read_sheet
+
+
+def _workbook_bytes(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_read_sheet_streams_named_columns_in_chunks():
+    data = _workbook_bytes(
+        [
+            ["Relatório de 01/05/2024 a 31/05/2024"],
+            ["Cliente", None, "Terminal"],
+            ["A", "x", "t1"],
+            [None, "x", "#N/A"],
+            ["B", "x", "t3"],
+        ]
+    )
+    sheet = read_sheet(data, "relatorio.xlsx", lambda raw: 1, chunk_rows=2)
+    assert sheet.header_row == 1
+    assert sheet.preamble.iloc[0, 0].startswith("Relatório")
+    assert list(sheet.frame.columns) == ["Cliente", "Terminal"]
+    assert sheet.frame["Cliente"].tolist()[::2] == ["A", "B"]
+    assert sheet.frame[["Cliente", "Terminal"]].iloc[1].isna().all()
+    assert isinstance(sheet.frame, pd.DataFrame) and len(sheet.frame) == 3
+
+
+def test_read_csv_detects_latin1_and_delimiter_past_title_lines():
+    data = "Relatório de terminais\nCliente;Terminal;Condição\nA;t1;Ação\nB;t2;Ativo\n".encode("latin1")
+    frame = read_csv(data, dtype=object)
+    assert frame.shape == (4, 3)
+    assert frame.iloc[1].tolist() == ["Cliente", "Terminal", "Condição"]
+    assert frame.iloc[2, 2] == "Ação"
+
+
+def test_read_sheet_falls_back_to_openpyxl(monkeypatch):
+    data = _workbook_bytes([[None, "Cliente", "Dias"], [None, "A", 31.0], [None, "B", 1.5]])
+    fast = read_sheet(data, "relatorio.xlsx", lambda raw: 0).frame
+    monkeypatch.setattr(spreadsheets, "CalamineWorkbook", None)
+    slow = read_sheet(data, "relatorio.xlsx", lambda raw: 0).frame
+    pd.testing.assert_frame_equal(fast, slow)
+    assert slow["Dias"].tolist() == [31, 1.5]
@@ -1,30 +1,83 @@
 from __future__ import annotations
 
 import logging
+import threading
+import time
 from datetime import datetime, timezone
-from typing import Any, Iterable
+from typing import Any, Iterator
 
 import pandas as pd
 import streamlit as st
-from mongo_config import db
+from app_core.billing_engine import InventoryIndex
+from mongo_config import READ_CACHE_TTL_SECONDS, MongoBufferedWriter, cached_read, collection_version, db
 
 log = logging.getLogger("financeiro_verdio.database")
-DB_BATCH_LIMIT = 450
+PAGE_SIZE_LIMIT = 200
 
 
 def _current_user_email() -> str:
     return str(st.session_state.get("user_info", {}).get("email", "sistema") or "sistema").strip().lower()
 
 
-def _chunks(items: list[Any], size: int = DB_BATCH_LIMIT) -> Iterable[list[Any]]:
-    for start in range(0, len(items), size):
-        yield items[start:start + size]
+def _page_cursor(data: dict[str, Any], query: Any) -> dict[str, Any]:
+    return {field: data.get(field) for field, _ in query.sorts}
+
+
+def _fetch_page(
+    query: Any,
+    page_size: int,
+    *,
+    after: dict[str, Any] | None = None,
+    before: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Busca uma página por chave (keyset) e devolve cursores para a anterior/próxima.
+
+    A consulta deve terminar com `_id` na ordenação para que os cursores sejam únicos.
+    """
+    size = max(1, min(int(page_size), PAGE_SIZE_LIMIT))
+    if before is not None:
+        documents = query.end_before(before).limit_to_last(size + 1).get()
+        has_previous = len(documents) > size
+        documents = documents[-size:]
+        has_next = True
+    else:
+        if after is not None:
+            query = query.start_after(after)
+        documents = query.limit(size + 1).get()
+        has_next = len(documents) > size
+        documents = documents[:size]
+        has_previous = after is not None
+
+    items: list[dict[str, Any]] = []
+    for document in documents:
+        data = document.to_dict() or {}
+        data["_id"] = document.id
+        items.append(data)
+    return {
+        "items": items,
+        "first_cursor": _page_cursor(items[0], query) if items else None,
+        "last_cursor": _page_cursor(items[-1], query) if items else None,
+        "has_previous": has_previous,
+        "has_next": has_next,
+    }
+
+
+def _empty_page() -> dict[str, Any]:
+    return {"items": [], "first_cursor": None, "last_cursor": None, "has_previous": False, "has_next": False}
 
 
 # --- LOGS E AUDITORIA -----------------------------------------------------
+# Auditoria gravada em lotes por uma thread; leituras de logs chamam flush() antes.
+_log_writer = MongoBufferedWriter(lambda: db.collection("system_logs"))
+
+
 def log_action(level: str, user: str, message: str, details: Any = None) -> bool:
+    """Enfileira o registro de auditoria; True significa enfileirado, não gravado.
+
+    A gravação acontece em segundo plano; `_system_logs_query` esvazia a fila antes de ler.
+    """
     try:
-        db.collection("system_logs").add(
+        return _log_writer.add(
             {
                 "timestamp": datetime.now(timezone.utc),
                 "level": str(level or "INFO").upper(),
@@ -33,17 +86,39 @@ def log_action(level: str, user: str, message: str, details: Any = None) -> bool
                 "details": details if details is not None else {},
             }
         )
-        return True
     except Exception:
         log.exception("Não foi possível registrar log de auditoria.")
         return False
 
 
-def get_system_logs(limit: int = 2000) -> list[dict[str, Any]]:
+def _system_logs_query(
+    *,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    levels: list[str] | None = None,
+    users: list[str] | None = None,
+    search: str | None = None,
+) -> Any:
+    _log_writer.flush()
+    query = db.collection("system_logs")
+    if start is not None:
+        query = query.where("timestamp", ">=", start)
+    if end is not None:
+        query = query.where("timestamp", "<", end)
+    if levels is not None:
+        query = query.where("level", "in", list(levels))
+    if users is not None:
+        query = query.where("user", "in", list(users))
+    if search:
+        query = query.where("message", "contains", str(search))
+    return query
+
+
+def get_system_logs(limit: int = 2000, **filters: Any) -> list[dict[str, Any]]:
     try:
         safe_limit = max(1, min(int(limit), 10000))
         query = (
-            db.collection("system_logs")
+            _system_logs_query(**filters)
             .order_by("timestamp", direction="DESCENDING")
             .limit(safe_limit)
         )
@@ -59,8 +134,71 @@ def get_system_logs(limit: int = 2000) -> list[dict[str, Any]]:
         return []
 
 
+def get_system_logs_page(
+    page_size: int = 25,
+    *,
+    after: dict[str, Any] | None = None,
+    before: dict[str, Any] | None = None,
+    **filters: Any,
+) -> dict[str, Any]:
+    """Página de logs filtrada no servidor, ordenada do mais recente para o mais antigo."""
+    try:
+        query = (
+            _system_logs_query(**filters)
+            .order_by("timestamp", direction="DESCENDING")
+            .order_by("_id", direction="DESCENDING")
+        )
+        return _fetch_page(query, page_size, after=after, before=before)
+    except Exception:
+        log.exception("Erro ao buscar página de logs do sistema.")
+        st.error("Não foi possível carregar os logs do sistema.")
+        return _empty_page()
+
+
+def get_system_logs_filter_options() -> dict[str, list[str]]:
+    """Níveis e usuários existentes em system_logs, agrupados no servidor."""
+    try:
+        query = _system_logs_query()
+        return {
+            "levels": sorted(str(row.get("level") or "") for row in query.group_by("level").count().get()),
+            "users": sorted(str(row.get("user") or "") for row in query.group_by("user").count().get()),
+        }
+    except Exception:
+        log.exception("Erro ao buscar opções de filtro dos logs.")
+        return {"levels": [], "users": []}
+
+
+def get_system_logs_stats(**filters: Any) -> dict[str, Any]:
+    """Totais por nível e por usuário dos logs filtrados, calculados no servidor."""
+    try:
+        query = _system_logs_query(**filters)
+        by_level = {
+            str(row.get("level") or ""): int(row.get("count") or 0)
+            for row in query.group_by("level").count().order_by("count", "DESCENDING").get()
+        }
+        by_user = {
+            str(row.get("user") or ""): int(row.get("count") or 0)
+            for row in query.group_by("user").count().order_by("count", "DESCENDING").get()
+        }
+        return {"total": sum(by_level.values()), "by_level": by_level, "by_user": by_user}
+    except Exception:
+        log.exception("Erro ao calcular resumo dos logs.")
+        return {"total": 0, "by_level": {}, "by_user": {}}
+
+
+def count_system_logs(**filters: Any) -> int:
+    try:
+        return _system_logs_query(**filters).count()
+    except Exception:
+        log.exception("Erro ao contar logs do sistema.")
+        return 0
+
+
 # --- FATURAMENTO E HISTÓRICO ---------------------------------------------
-def get_billing_history(limit: int = 5000) -> list[dict[str, Any]]:
+HISTORY_ITEM_FIELDS = ("itens_detalhados",)
+
+
+def get_billing_history(limit: int = 5000, *, include_items: bool = True) -> list[dict[str, Any]]:
     try:
         safe_limit = max(1, min(int(limit), 20000))
         query = (
@@ -68,6 +206,8 @@ def get_billing_history(limit: int = 5000) -> list[dict[str, Any]]:
             .order_by("data_geracao", direction="DESCENDING")
             .limit(safe_limit)
         )
+        if not include_items:
+            query = query.exclude(*HISTORY_ITEM_FIELDS)
         history: list[dict[str, Any]] = []
         for document in query.stream():
             data = document.to_dict()
@@ -80,8 +220,116 @@ def get_billing_history(limit: int = 5000) -> list[dict[str, Any]]:
         return []
 
 
+def get_billing_history_summary(limit: int = 5000) -> list[dict[str, Any]]:
+    """Histórico vigente sem os arrays de itens, para tabelas e métricas."""
+    return get_billing_history(limit=limit, include_items=False)
+
+
+def get_billing_history_entry(history_id: str) -> dict[str, Any] | None:
+    """Documento completo (com itens) de um registro do histórico."""
+    try:
+        document = db.collection("billing_history").document(str(history_id)).get()
+        if not document.exists:
+            return None
+        data = document.to_dict()
+        data["_id"] = document.id
+        return data
+    except Exception:
+        log.exception("Erro ao buscar registro de histórico %s", history_id)
+        return None
+
+
+def get_billing_history_page(
+    page_size: int = 50,
+    *,
+    after: dict[str, Any] | None = None,
+    before: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    try:
+        query = (
+            db.collection("billing_history")
+            .exclude(*HISTORY_ITEM_FIELDS)
+            .order_by("data_geracao", direction="DESCENDING")
+            .order_by("_id", direction="DESCENDING")
+        )
+        return _fetch_page(query, page_size, after=after, before=before)
+    except Exception:
+        log.exception("Erro ao buscar página do histórico de faturamento.")
+        st.error("Não foi possível carregar o histórico de faturamento.")
+        return _empty_page()
+
+
+def get_billing_history_overview() -> dict[str, Any]:
+    """Contagens do histórico vigente e das revisões sem trafegar os documentos."""
+    try:
+        history = db.collection("billing_history")
+        clients = {str(row.get("cliente") or "").strip() for row in history.group_by("cliente").count().get()}
+        periods = {
+            str(row.get("periodo_relatorio") or "").strip()
+            for row in history.group_by("periodo_relatorio").count().get()
+        }
+        return {
+            "records": history.count(),
+            "runs": db.collection("billing_runs").count(),
+            "clients": len(clients - {""}),
+            "periods": sorted(periods - {""}),
+        }
+    except Exception:
+        log.exception("Erro ao resumir histórico de faturamento.")
+        return {"records": 0, "runs": 0, "clients": 0, "periods": []}
+
+
+def get_billing_period_totals(periodo_relatorio: str) -> dict[str, Any] | None:
+    """Clientes, terminais e receita de um período, somados no servidor."""
+    try:
+        return _billing_period_totals(periodo_relatorio)
+    except Exception:
+        log.exception("Erro ao totalizar o período %s.", periodo_relatorio)
+        st.error("Não foi possível totalizar o período selecionado.")
+        return None
+
+
+def _billing_period_totals(periodo_relatorio: str) -> dict[str, Any]:
+    terminals = {
+        "$cond": [
+            {"$gt": [{"$ifNull": ["$itens_detalhados_count", 0]}, 0]},
+            "$itens_detalhados_count",
+            {
+                "$add": [
+                    {"$ifNull": ["$terminais_cheio", 0]},
+                    {"$ifNull": ["$terminais_proporcional", 0]},
+                    {"$ifNull": ["$terminais_suspensos", 0]},
+                ]
+            },
+        ]
+    }
+    rows = (
+        db.collection("billing_history")
+        .where("periodo_relatorio", "==", str(periodo_relatorio))
+        .aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": None,
+                        "clientes": {"$sum": 1},
+                        "terminais": {"$sum": terminals},
+                        "faturamento": {"$sum": {"$ifNull": ["$valor_total", 0]}},
+                    }
+                }
+            ]
+        )
+        .get()
+    )
+    row = rows[0] if rows else {}
+    return {
+        "clientes": int(row.get("clientes") or 0),
+        "terminais": int(row.get("terminais") or 0),
+        "faturamento": float(row.get("faturamento") or 0.0),
+    }
+
+
 def get_recent_billing(limit: int = 6) -> list[dict[str, Any]]:
-    return get_billing_history(limit=max(1, min(int(limit), 20)))
+    return get_billing_history_summary(limit=max(1, min(int(limit), 20)))
 
 
 def get_last_billing_for_client(client_name: str) -> dict[str, Any] | None:
@@ -91,6 +339,7 @@ def get_last_billing_for_client(client_name: str) -> dict[str, Any] | None:
             .where("cliente", "==", str(client_name))
             .order_by("data_geracao", direction="DESCENDING")
             .limit(1)
+            .exclude(*HISTORY_ITEM_FIELDS)
         )
         for document in query.stream():
             data = document.to_dict()
@@ -229,6 +478,27 @@ def get_billing_runs(limit: int = 5000) -> list[dict[str, Any]]:
         return []
 
 
+def get_billing_runs_page(
+    page_size: int = 50,
+    *,
+    after: dict[str, Any] | None = None,
+    before: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    try:
+        query = (
+            db.collection("billing_runs")
+            .order_by("data_geracao", direction="DESCENDING")
+            .order_by("_id", direction="DESCENDING")
+        )
+        page = _fetch_page(query, page_size, after=after, before=before)
+        for data in page["items"]:
+            data.setdefault("run_id", data["_id"])
+        return page
+    except Exception:
+        log.exception("Erro ao buscar página de revisões de faturamento.")
+        return _empty_page()
+
+
 def get_billing_run_items(run_id: str, limit: int = 20000) -> list[dict[str, Any]]:
     try:
         safe_limit = max(1, min(int(limit), 50000))
@@ -239,12 +509,7 @@ def get_billing_run_items(run_id: str, limit: int = 20000) -> list[dict[str, Any
             .order_by("item_index", direction="ASCENDING")
             .limit(safe_limit)
         )
-        items: list[dict[str, Any]] = []
-        for document in query.stream():
-            data = document.to_dict() or {}
-            data["_id"] = document.id
-            items.append(data)
-        return items
+        return list(query.stream_rows())
     except Exception:
         log.exception("Erro ao buscar itens da revisão %s.", run_id)
         return []
@@ -315,22 +580,76 @@ def delete_billing_history(history_id: str) -> bool:
         return False
 
 
+def get_perf_events(limit: int = 100) -> list[dict[str, Any]]:
+    """Comandos MongoDB mais recentes que passaram do limite de lentidão."""
+    try:
+        safe_limit = max(1, min(int(limit), 1000))
+        query = (
+            db.collection("perf_events")
+            .order_by("timestamp", direction="DESCENDING")
+            .limit(safe_limit)
+        )
+        return list(query.stream_rows(include_id=False))
+    except Exception:
+        log.exception("Erro ao buscar eventos de desempenho.")
+        st.error("Não foi possível carregar os comandos lentos.")
+        return []
+
+
 # --- ESTOQUE E PREÇOS -----------------------------------------------------
-@st.cache_data(ttl=600, show_spinner=False)
+def _tracker_rows() -> Iterator[dict[str, Any]]:
+    for data in db.collection("trackers").stream_rows():
+        data.setdefault("Nº Equipamento", str(data.pop("_id")))
+        yield data
+
+
+@cached_read("trackers")
+def _tracker_inventory() -> list[dict[str, Any]]:
+    return list(_tracker_rows())
+
+
 def get_tracker_inventory() -> list[dict[str, Any]]:
     try:
-        result = []
-        for document in db.collection("trackers").stream():
-            data = document.to_dict()
-            data.setdefault("Nº Equipamento", document.id)
-            result.append(data)
-        return result
+        return _tracker_inventory()
     except Exception:
         log.exception("Erro ao buscar inventário de rastreadores.")
         st.error("Não foi possível carregar o inventário de rastreadores.")
         return []
 
 
+_inventory_index: InventoryIndex | None = None
+_inventory_index_built_at = 0.0
+_inventory_index_lock = threading.Lock()
+
+
+def get_tracker_inventory_index() -> InventoryIndex | None:
+    """Índice do estoque, remontado quando `trackers` muda ou após READ_CACHE_TTL_SECONDS.
+
+    Lê a coleção direto do cursor, sem passar pelo `cached_read`: a lista bruta não fica
+    em memória ao lado do índice. A versão vem de `collection_versions`, compartilhada
+    entre processos; o prazo cobre gravações feitas fora destes wrappers.
+    Levanta ValueError se o estoque não tiver as colunas necessárias.
+    """
+    global _inventory_index, _inventory_index_built_at
+    version = collection_version("trackers")
+    with _inventory_index_lock:
+        fresh = time.monotonic() - _inventory_index_built_at < READ_CACHE_TTL_SECONDS
+        if _inventory_index is not None and _inventory_index.version[0] == version and fresh:
+            return _inventory_index
+        try:
+            records = list(_tracker_rows())
+        except Exception:
+            log.exception("Erro ao buscar inventário de rastreadores.")
+            st.error("Não foi possível carregar o inventário de rastreadores.")
+            return None
+        if not records:
+            return None
+        # O horário da montagem entra na versão para renovar as chaves de cache após o prazo.
+        _inventory_index = InventoryIndex.from_records(records, (version, time.time()))
+        _inventory_index_built_at = time.monotonic()
+        return _inventory_index
+
+
 def update_tracker_inventory(
     df: pd.DataFrame,
     source_file: str | None = None,
@@ -383,17 +702,13 @@ def update_tracker_inventory(
 
             records.append((serial_number, data))
 
-        for chunk in _chunks(records):
-            batch = db.batch()
-            for serial_number, data in chunk:
-                reference = db.collection("trackers").document(
-                    serial_number
-                )
-                batch.set(reference, data, merge=True)
-            batch.commit()
-
-        get_tracker_inventory.clear()
-        get_unique_models_and_types.clear()
+        batch = db.batch()
+        for serial_number, data in records:
+            reference = db.collection("trackers").document(
+                serial_number
+            )
+            batch.set(reference, data, merge=True)
+        batch.commit()
 
         log_action(
             "INFO",
@@ -414,62 +729,71 @@ def update_tracker_inventory(
         return None
 
 
-@st.cache_data(ttl=600, show_spinner=False)
+@cached_read("trackers")
+def _unique_models_and_types() -> dict[str, str]:
+    # Normaliza antes de agrupar e ordena por _id: o Tipo de cada modelo é o do primeiro
+    # rastreador cadastrado, igual em toda leitura.
+    rows = db.collection("trackers").aggregate(
+        [
+            {
+                "$project": {
+                    "Modelo": {"$trim": {"input": {"$ifNull": [{"$toString": "$Modelo"}, ""]}}},
+                    "Tipo": {"$toUpper": {"$trim": {"input": {"$ifNull": [{"$toString": "$Tipo"}, ""]}}}},
+                }
+            },
+            {"$match": {"Modelo": {"$ne": ""}}},
+            {"$sort": {"Modelo": 1, "_id": 1}},
+            {"$group": {"_id": "$Modelo", "Tipo": {"$first": "$Tipo"}}},
+            {"$sort": {"_id": 1}},
+        ]
+    ).get()
+    return {str(row["_id"]): str(row.get("Tipo") or "") for row in rows}
+
+
 def get_unique_models_and_types() -> dict[str, str]:
     try:
-        trackers = get_tracker_inventory()
-        if not trackers:
-            return {}
-        frame = pd.DataFrame(trackers)
-        if "Modelo" not in frame.columns or "Tipo" not in frame.columns:
-            return {}
-        frame["Modelo"] = frame["Modelo"].fillna("").astype(str).str.strip()
-        frame["Tipo"] = frame["Tipo"].fillna("").astype(str).str.upper().str.strip()
-        frame = frame[frame["Modelo"] != ""]
-        return frame.groupby("Modelo")["Tipo"].first().to_dict()
+        return _unique_models_and_types()
     except Exception:
         log.exception("Erro ao buscar modelos únicos.")
         return {}
 
 
-def update_type_for_models(updates: dict[str, str]) -> tuple[int, list[str]]:
-    success_count = 0
-    failed_models: list[str] = []
+def update_type_for_models(updates: dict[str, str]) -> tuple[dict[str, dict[str, int]], list[str]]:
+    """Retipa todos os rastreadores de cada modelo com um update_many por modelo.
 
+    Retorna as contagens informadas pelo servidor por modelo atualizado e a lista de
+    modelos sem rastreadores ou com falha.
+    """
+    trackers = db.collection("trackers")
+    now = datetime.now(timezone.utc)
+    counts: dict[str, dict[str, int]] = {}
+    failed: list[str] = []
     for model, new_type in updates.items():
         try:
-            documents = list(db.collection("trackers").where("Modelo", "==", model).stream())
-            if not documents:
-                failed_models.append(model)
-                continue
-
-            for chunk in _chunks(documents):
-                batch = db.batch()
-                for document in chunk:
-                    batch.update(
-                        document.reference,
-                        {
-                            "Tipo": str(new_type or "").upper().strip(),
-                            "updated_at": datetime.now(timezone.utc),
-                        },
-                    )
-                batch.commit()
-            success_count += 1
+            result = trackers.where("Modelo", "==", model).update_where(
+                {"Tipo": str(new_type or "").upper().strip(), "updated_at": now}
+            )
         except Exception:
             log.exception("Erro ao atualizar tipo do modelo %s", model)
-            failed_models.append(model)
+            failed.append(model)
+            continue
+        if result.matched_count:
+            counts[model] = {"matched": result.matched_count, "modified": result.modified_count}
+        else:
+            failed.append(model)
+    return counts, failed
+
 
-    get_tracker_inventory.clear()
-    get_unique_models_and_types.clear()
-    return success_count, failed_models
+@cached_read("settings")
+def _pricing_document() -> dict[str, Any]:
+    document = db.collection("settings").document("pricing").get()
+    return document.to_dict() if document.exists else {}
 
 
-@st.cache_data(ttl=900, show_spinner=False)
 def get_pricing_config() -> dict[str, Any]:
     defaults = {"GPRS": 59.90, "SATELITE": 159.90, "CAMERA": 0.0, "RADIO": 0.0}
     try:
-        document = db.collection("settings").document("pricing").get()
-        data = document.to_dict() if document.exists else {}
+        data = _pricing_document()
     except Exception:
         log.exception("Erro ao buscar configurações de preço.")
         data = {}
@@ -499,7 +823,6 @@ def update_pricing_config(new_prices: dict[str, Any]) -> bool:
         payload = dict(new_prices or {})
         payload["updated_at"] = datetime.now(timezone.utc)
         db.collection("settings").document("pricing").set(payload, merge=True)
-        get_pricing_config.clear()
         log_action("INFO", _current_user_email(), "Tabelas de preços atualizadas.")
         return True
     except Exception: